@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+CPU cost per response of the API's serialization, before and after the fast path.
+
+"default" is what FastAPI does for a plain return value: validate pydantic
+models, run jsonable_encoder, then json.dumps. "fast" is main.py's path:
+model_construct + serialization.dumps (orjson). Documents come from
+synthetic_candidates.py, so runs are comparable. No database is needed.
+
+Usage:
+  python bench_serialization.py
+  python bench_serialization.py --page-size 50 --iterations 2000
+"""
+
+import argparse
+import gzip
+import os
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import serialization
+from models import CandidateShort, ExperienceShort
+from synthetic_candidates import candidate_object_id, generate_candidate
+
+
+def print_section(title):
+    """Print a formatted section header"""
+    print("\n" + "=" * 70)
+    print(f"  {title}")
+    print("=" * 70)
+
+
+def _short(doc, construct: bool):
+    pi = doc["personal_info"]
+    build = CandidateShort.model_construct if construct else CandidateShort
+    exp_build = ExperienceShort.model_construct if construct else ExperienceShort
+    return build(
+        id=doc["id"], name=pi["full_name"], summary=pi["summary"], skills=doc["skills"]["technical"],
+        experience=[exp_build(job_title=e["job_title"], company=e["company"]) for e in doc["experience"]],
+    )
+
+
+def default_page(docs):
+    return JSONResponse(jsonable_encoder({"results": [_short(d, construct=False) for d in docs]})).body
+
+
+def fast_page(docs):
+    return serialization.dumps({"results": [_short(d, construct=True) for d in docs]})
+
+
+def msgpack_page(docs):
+    return serialization.dumps_msgpack({"results": [_short(d, construct=True) for d in docs]})
+
+
+def default_document(doc):
+    return JSONResponse(jsonable_encoder(doc)).body
+
+
+def fast_document(doc):
+    return serialization.dumps(doc)
+
+
+def msgpack_document(doc):
+    return serialization.dumps_msgpack(doc)
+
+
+def measure(fn, arg, iterations):
+    """(CPU µs per call, encoded size in bytes)."""
+    body = fn(arg)
+    started = time.process_time()
+    for _ in range(iterations):
+        fn(arg)
+    return (time.process_time() - started) / iterations * 1e6, len(body)
+
+
+def report(title, variants, arg, iterations, gzip_level):
+    print_section(title)
+    print(f"{'encoder':<10} {'CPU µs/resp':>12} {'bytes':>9} {'gzip bytes':>11} {'+gzip µs':>9} {'speedup':>8}")
+    print("-" * 64)
+    baseline = None
+    for name, fn in variants:
+        cpu, size = measure(fn, arg, iterations)
+        body = fn(arg)
+        gz_started = time.process_time()
+        for _ in range(max(iterations // 10, 1)):
+            compressed = gzip.compress(body, compresslevel=gzip_level)
+        gz_cpu = (time.process_time() - gz_started) / max(iterations // 10, 1) * 1e6
+        baseline = baseline or cpu
+        print(f"{name:<10} {cpu:>12,.1f} {size:>9,} {len(compressed):>11,} {gz_cpu:>9,.1f} {baseline / cpu:>7.1f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark API response serialization.")
+    parser.add_argument("--page-size", type=int, default=20, help="results per /chatbot/query page")
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+    gzip_level = int(os.getenv("GZIP_LEVEL", "5"))
+
+    docs = []
+    for i in range(args.page_size):
+        doc = generate_candidate(args.seed, i)
+        doc["id"] = str(candidate_object_id(args.seed, i))
+        docs.append(doc)
+
+    print(f"JSON encoder: {'orjson' if serialization.orjson else 'json (install orjson for the fast path)'}")
+    print(f"MessagePack:  {'available' if serialization.msgpack else 'not installed (pip install msgpack)'}")
+
+    page_variants = [("default", default_page), ("fast", fast_page)]
+    doc_variants = [("default", default_document), ("fast", fast_document)]
+    if serialization.msgpack:
+        page_variants.append(("msgpack", msgpack_page))
+        doc_variants.append(("msgpack", msgpack_document))
+
+    report(f"/chatbot/query PAGE ({args.page_size} results)", page_variants, docs, args.iterations, gzip_level)
+    report("/candidates/{id} FULL DOCUMENT", doc_variants, docs[0], args.iterations, gzip_level)
+    print(f"\nResponses under GZIP_MIN_SIZE={os.getenv('GZIP_MIN_SIZE', '1024')} bytes are sent uncompressed; "
+          f"gzip level {gzip_level}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Request-path latency of the two storage backends on the same corpus.
+
+Times what a request spends in storage, per operation: a document lookup
+(GET /candidates/{id}), a vector search (query already encoded, so model
+time is left out), hydrating a page of results, and search plus hydration
+(/chatbot/query without encoding and serialization). "remote" goes to
+MongoDB and PostgreSQL over the network, "local" reads the SQLite + NumPy
+store (storage.py); the difference is what the two remote databases add.
+
+Load the same synthetic corpus into both first:
+  python synthetic_candidates.py --count 10000 --seed 42 --mongo --postgres --local ./local_store
+
+Usage:
+  python bench_storage.py --count 10000
+  python bench_storage.py --count 10000 --backends local --path ./local_store --iterations 500
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from embedding_utils import encode
+from storage import LOCAL_STORE_PATH, LocalRepository, RemoteRepository
+from synthetic_candidates import candidate_object_id
+
+QUERIES = [
+    "senior python backend engineer with postgres",
+    "react frontend developer",
+    "data scientist machine learning pytorch",
+    "devops kubernetes aws terraform",
+    "product manager agile roadmap",
+]
+
+
+def print_section(title):
+    """Print a formatted section header"""
+    print("\n" + "=" * 70)
+    print(f"  {title}")
+    print("=" * 70)
+
+
+def measure(fn, iterations: int) -> list:
+    """Milliseconds per call; the first (warm-up) call isn't counted."""
+    fn(0)
+    timings = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def open_backend(name: str, path: str):
+    if name == "local":
+        store = LocalRepository(path)
+        return store, store.spaces.get()
+    from db import get_engine, get_mongo_client, MONGO_CANDIDATES_COLLECTION, MONGO_DB
+    from embedding_index import SpaceCache
+    client = get_mongo_client()
+    store = RemoteRepository(client, client[MONGO_DB][MONGO_CANDIDATES_COLLECTION], None)
+    return store, SpaceCache(get_engine()).get()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark storage backends on the request path.")
+    parser.add_argument("--backends", default="remote,local", help="comma-separated: remote, local")
+    parser.add_argument("--path", default=LOCAL_STORE_PATH, help="local store directory")
+    parser.add_argument("--count", type=int, default=1000, help="candidates loaded with synthetic_candidates.py")
+    parser.add_argument("--seed", type=int, default=42, help="corpus seed used when loading")
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    ids = [str(candidate_object_id(args.seed, rng.randrange(args.count))) for _ in range(args.iterations + 1)]
+    rows = []
+    for name in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        store, (spec, dim) = open_backend(name, args.path)
+        queries = encode(QUERIES, model_name=spec)
+        page = [str(row[0]) for row in store.search(spec, dim, queries[0], args.top_k)]
+        if not page:
+            print(f"⚠ {name}: no candidates for {spec}; load the corpus first")
+            continue
+
+        def search_and_hydrate(i):
+            hits = store.search(spec, dim, queries[i % len(queries)], args.top_k)
+            return list(store.iter_documents([str(row[0]) for row in hits]))
+
+        operations = {
+            "get document": lambda i: store.get(ids[i]),
+            f"search top {args.top_k}": lambda i: store.search(spec, dim, queries[i % len(queries)], args.top_k),
+            f"hydrate {len(page)}": lambda i: list(store.iter_documents(page)),
+            "search + hydrate": search_and_hydrate,
+        }
+        for op, fn in operations.items():
+            timings = measure(fn, args.iterations)
+            rows.append((name, op, np.percentile(timings, 50), np.percentile(timings, 95), np.mean(timings)))
+
+    print_section(f"STORAGE LATENCY ({args.iterations} calls per operation, {args.count:,} candidates)")
+    print(f"{'backend':<8} {'operation':<18} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9}")
+    print("-" * 57)
+    for name, op, p50, p95, mean in rows:
+        print(f"{name:<8} {op:<18} {p50:>9,.2f} {p95:>9,.2f} {mean:>9,.2f}")
+
+
+if __name__ == "__main__":
+    main()
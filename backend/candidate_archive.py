@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Cold-tier archiving of stale candidates.
+
+A candidate is stale once its activity is older than ARCHIVE_AFTER_DAYS.
+Activity is, per ARCHIVE_BY:
+
+  updated   when it was first indexed: `indexed_at` (re-indexing keeps it),
+            or the ObjectId's creation time for rows from before that column
+  matched   when a search or job shortlist last returned it, else `updated`
+  activity  the later of the two (default)
+
+Archiving flips the candidate's rows to tier 'cold'. With
+CANDIDATE_PARTITIONS=tenant,tier that moves them into the tenant's cold
+partition, out of the hot partition and its HNSW index that every search
+reads; searches pass include_archived to read both. Archived candidates'
+section rows are dropped (section search covers hot candidates only).
+Archived candidates that were matched again since (through include_archived
+searches) are restored by the next run; re-indexing a candidate (a merge,
+a reindex) keeps its tier.
+
+Search hits are recorded by ActivityTracker in memory and written to
+`candidate_activity` every ACTIVITY_FLUSH_INTERVAL seconds.
+
+  python candidate_archive.py --status
+  python candidate_archive.py --run --dry-run
+  python candidate_archive.py --run --older-than-days 365 --tenant acme
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from embedding_index import (
+    CANDIDATES_TABLE,
+    COLD_TIER,
+    HOT_TIER,
+    TIERS,
+    document_tenant,
+    ensure_tenant_partitions,
+    partition_name,
+    read_spaces,
+    sql_literal,
+    table_layout,
+    validate_tenant,
+)
+from section_index import SECTION_INDEX, SECTIONS_TABLE, delete_sections, sync_sections
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
+
+ACTIVITY_TABLE = "candidate_activity"
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "730"))
+ARCHIVE_BY = os.getenv("ARCHIVE_BY", "activity")
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+ACTIVITY_TRACKING = os.getenv("ACTIVITY_TRACKING", "1") == "1"
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "30"))
+
+if ARCHIVE_BY not in ("updated", "matched", "activity"):
+    raise ValueError(f"Unknown ARCHIVE_BY={ARCHIVE_BY!r} (expected 'updated', 'matched' or 'activity')")
+
+# Rows indexed before `indexed_at` existed are dated by their ObjectId
+_UPDATED_SQL = """COALESCE(c.indexed_at, CASE WHEN c.candidate_id ~ '^[0-9a-f]{24}$'
+        THEN to_timestamp(('x' || substr(c.candidate_id, 1, 8))::bit(32)::bigint) END)"""
+_AGE_SQL = {
+    "updated": "MAX(updated_at)",
+    "matched": "COALESCE(MAX(a.last_matched_at), MAX(updated_at))",
+    "activity": "GREATEST(MAX(updated_at), MAX(a.last_matched_at))",
+}
+
+
+# --- Schema ---
+def ensure_activity_table(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {ACTIVITY_TABLE} (
+            tenant_id TEXT NOT NULL,
+            candidate_id TEXT NOT NULL,
+            last_matched_at TIMESTAMPTZ NOT NULL,
+            PRIMARY KEY (tenant_id, candidate_id)
+        )
+    """))
+
+
+def prepare_archive(engine):
+    """Idempotent schema setup; call after embedding_index.prepare_index()."""
+    with engine.begin() as conn:
+        ensure_activity_table(conn)
+
+
+# --- Activity ---
+def touch(conn, tenant: str, candidate_ids: Iterable[str]):
+    """Record that `candidate_ids` of a tenant were matched now."""
+    ids = sorted(set(candidate_ids))
+    if not ids:
+        return
+    conn.execute(text(f"""
+        INSERT INTO {ACTIVITY_TABLE} (tenant_id, candidate_id, last_matched_at)
+        SELECT tenant_id, candidate_id, now() FROM unnest(CAST(:tenants AS text[]), CAST(:ids AS text[]))
+            AS hits (tenant_id, candidate_id)
+        ON CONFLICT (tenant_id, candidate_id) DO UPDATE SET last_matched_at = EXCLUDED.last_matched_at
+    """), {"tenants": [tenant] * len(ids), "ids": ids})
+
+
+class ActivityTracker:
+    """
+    Collects matched candidates in memory and writes them to ACTIVITY_TABLE
+    on a background thread, so searches don't wait on a write. Hits not yet
+    flushed when the process dies are lost; ages are counted in days, so
+    that is harmless.
+    """
+
+    def __init__(self, engine, flush_interval: float = ACTIVITY_FLUSH_INTERVAL):
+        self.engine = engine
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, tenant: str, candidate_ids: Iterable[str]):
+        with self._lock:
+            self._pending.setdefault(tenant, set()).update(candidate_ids)
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        with self.engine.begin() as conn:
+            for tenant, ids in sorted(pending.items()):
+                touch(conn, tenant, ids)
+        return sum(len(ids) for ids in pending.values())
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="activity-tracker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.flush()
+
+    def run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Failed to record candidate activity: {e}", exc_info=True)
+
+
+# --- Tiers ---
+def _ages_sql(tier: str, tenant: Optional[str], stale: bool) -> str:
+    scope = "AND c.tenant_id = :tenant" if tenant is not None else ""
+    return f"""
+        SELECT c.tenant_id, c.candidate_id
+        FROM (
+            SELECT c.tenant_id, c.candidate_id, {_UPDATED_SQL} AS updated_at
+            FROM {CANDIDATES_TABLE} c
+            WHERE c.tier = :tier {scope}
+        ) c
+        LEFT JOIN {ACTIVITY_TABLE} a ON a.tenant_id = c.tenant_id AND a.candidate_id = c.candidate_id
+        GROUP BY c.tenant_id, c.candidate_id
+        HAVING {_AGE_SQL[ARCHIVE_BY]} {"<" if stale else ">="} now() - make_interval(secs => :max_age)
+    """
+
+
+def _set_tier(conn, tier: str, pairs: List[Tuple[str, str]]) -> int:
+    """Move candidates' rows (of every model) to `tier`; returns the rows moved."""
+    return conn.execute(text(f"""
+        UPDATE {CANDIDATES_TABLE} c SET tier = :tier
+        FROM unnest(CAST(:tenants AS text[]), CAST(:ids AS text[])) AS moved (tenant_id, candidate_id)
+        WHERE c.tenant_id = moved.tenant_id AND c.candidate_id = moved.candidate_id AND c.tier <> :tier
+    """), {"tier": tier, "tenants": [t for t, _ in pairs], "ids": [cid for _, cid in pairs]}).rowcount
+
+
+def archive(engine, candidates_col=None, older_than_days: float = ARCHIVE_AFTER_DAYS,
+            tenant: Optional[str] = None, batch_size: int = ARCHIVE_BATCH_SIZE, dry_run: bool = False) -> dict:
+    """
+    Archive stale hot candidates and restore archived ones active again, in
+    transactions of batch_size candidates (only `tenant`'s if given).
+    Restored candidates get their section rows back from `candidates_col`.
+    Returns counts and the tenants touched.
+    """
+    params = {"tenant": validate_tenant(tenant) if tenant is not None else None, "max_age": older_than_days * 86400}
+    counts = {"archived": 0, "restored": 0, "rows_moved": 0, "tenants": set()}
+    for source, target, stale in ((HOT_TIER, COLD_TIER, True), (COLD_TIER, HOT_TIER, False)):
+        key = "archived" if stale else "restored"
+        # The candidates to move are aggregated once and streamed; re-running the aggregation per
+        # batch would scan the whole source tier for every batch
+        with engine.connect() as reader:
+            result = reader.execution_options(stream_results=True, yield_per=batch_size).execute(
+                text(_ages_sql(source, tenant, stale)), {**params, "tier": source})
+            for rows in result.partitions(batch_size):
+                pairs = [(row[0], row[1]) for row in rows]
+                counts[key] += len(pairs)
+                if dry_run:
+                    continue
+                with engine.begin() as conn:
+                    counts["rows_moved"] += _set_tier(conn, target, pairs)
+                    if SECTION_INDEX and stale:
+                        delete_sections(conn, [cid for _, cid in pairs])
+                if SECTION_INDEX and not stale and candidates_col is not None:
+                    _restore_sections(engine, candidates_col, [cid for _, cid in pairs])
+                counts["tenants"].update(t for t, _ in pairs)
+                logging.info(f"{key} {counts[key]} candidates")
+    return counts
+
+
+def _restore_sections(engine, candidates_col, candidate_ids: List[str]):
+    keys = [ObjectId(cid) if ObjectId.is_valid(cid) else cid for cid in candidate_ids]
+    docs = {str(doc["_id"]): doc for doc in candidates_col.find({"_id": {"$in": keys}})}
+    if not docs:
+        return
+    with engine.begin() as conn:
+        ensure_tenant_partitions(conn, {document_tenant(doc) for doc in docs.values()}, SECTIONS_TABLE)
+    with engine.begin() as conn:
+        sync_sections(conn, docs, {spec for spec, _ in read_spaces(conn).values()})
+
+
+def vacuum_tiers(engine, tenants: Iterable[str]):
+    """VACUUM (ANALYZE) the tier partitions of `tenants`: drops moved rows from the hot index, refreshes estimates."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if table_layout(conn) != "tenant,tier":
+            conn.execute(text(f"VACUUM (ANALYZE) {CANDIDATES_TABLE}"))
+            return
+        for tenant in sorted(tenants):
+            for tier in TIERS:
+                conn.execute(text(f"VACUUM (ANALYZE) {partition_name(CANDIDATES_TABLE, tenant, tier)}"))
+
+
+def archived_ids(conn, tenant: str, candidate_ids: List[str]) -> Set[str]:
+    """The ids among `candidate_ids` that are archived in a tenant."""
+    return set(conn.execute(text(f"""
+        SELECT DISTINCT candidate_id FROM {CANDIDATES_TABLE}
+        WHERE tenant_id = :tenant AND tier = :tier AND candidate_id = ANY(:ids)
+    """), {"tenant": tenant, "tier": COLD_TIER, "ids": list(candidate_ids)}).scalars().all())
+
+
+def tier_sizes(conn, exact: bool = False) -> dict:
+    """
+    Hot and cold size of `candidates`: rows (planner estimates unless exact,
+    which also counts distinct candidates) and bytes, tables plus indexes.
+    Bytes are split by tier only with tier partitions; otherwise `total_bytes`
+    is the whole table.
+    """
+    layout = table_layout(conn)
+    tiered = layout == "tenant,tier"
+    sizes = {"layout": layout, **{tier: {"rows": 0, "bytes": 0 if tiered else None} for tier in TIERS}}
+    if layout is None:
+        return sizes
+    total = 0
+    for bound, tuples, size in conn.execute(text("""
+        SELECT pg_get_expr(c.relpartbound, c.oid), GREATEST(c.reltuples, 0)::bigint, pg_total_relation_size(c.oid)
+        FROM pg_partition_tree(CAST(:table AS regclass)) t JOIN pg_class c ON c.oid = t.relid
+        WHERE t.isleaf
+    """), {"table": CANDIDATES_TABLE}):
+        total += size
+        if tiered:
+            tier = COLD_TIER if sql_literal(COLD_TIER) in (bound or "") else HOT_TIER
+            sizes[tier]["rows"] += tuples
+            sizes[tier]["bytes"] += size
+    if exact or not tiered:
+        counted = {row[0]: (row[1], row[2]) for row in conn.execute(text(f"""
+            SELECT tier, COUNT(*), COUNT(DISTINCT candidate_id) FROM {CANDIDATES_TABLE} GROUP BY tier
+        """))}
+        for tier in TIERS:
+            sizes[tier]["rows"], sizes[tier]["candidates"] = counted.get(tier, (0, 0))
+    if not tiered:
+        sizes["total_bytes"] = total
+    return sizes
+
+
+def _mb(size: Optional[int]) -> str:
+    return "n/a" if size is None else f"{size / 1048576:,.1f} MB"
+
+
+def main(argv=None):
+    from db import get_engine, get_mongo_db
+    from embedding_index import prepare_index
+
+    parser = argparse.ArgumentParser(description="Archive stale candidates to the cold tier.")
+    parser.add_argument("--run", action="store_true", help="archive stale candidates, restore active archived ones")
+    parser.add_argument("--status", action="store_true", help="hot and cold sizes")
+    parser.add_argument("--older-than-days", type=float, default=ARCHIVE_AFTER_DAYS,
+                        help=f"archive after this many days without activity (default {ARCHIVE_AFTER_DAYS:g})")
+    parser.add_argument("--tenant", default=None, help="only this tenant's candidates (default: every tenant)")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="candidates per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="count what --run would move")
+    args = parser.parse_args(argv)
+    if not (args.run or args.status):
+        parser.error("nothing to do (use --run or --status)")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    engine = get_engine(statement_timeout_ms=0)
+    prepare_index(engine)
+    prepare_archive(engine)
+    if args.run:
+        with engine.connect() as conn:
+            layout = table_layout(conn)
+        if layout != "tenant,tier":
+            print(f"⚠ {CANDIDATES_TABLE} has no tier partitions (layout: {layout}); archived rows stay in the "
+                  f"hot index until `python tenant_partitions.py --migrate` with CANDIDATE_PARTITIONS=tenant,tier")
+        started = time.perf_counter()
+        candidates_col = get_mongo_db()[os.getenv("MONGO_CANDIDATES_COLLECTION", "resumes")] if SECTION_INDEX else None
+        counts = archive(engine, candidates_col, args.older_than_days, args.tenant, args.batch_size, args.dry_run)
+        verb = "Would archive" if args.dry_run else "Archived"
+        print(f"✓ {verb} {counts['archived']:,} and restore {counts['restored']:,} candidate(s) "
+              f"(no activity for {args.older_than_days:g} days, by {ARCHIVE_BY}) "
+              f"in {time.perf_counter() - started:,.1f}s")
+        if counts["tenants"] and not args.dry_run:
+            vacuum_tiers(engine, counts["tenants"])
+            print(f"  {counts['rows_moved']:,} rows moved; vacuumed {len(counts['tenants'])} tenant(s)")
+    if args.status:
+        with engine.connect() as conn:
+            sizes = tier_sizes(conn, exact=True)
+        print(f"✓ {CANDIDATES_TABLE} (layout: {sizes['layout']})")
+        for tier in TIERS:
+            s = sizes[tier]
+            print(f"  {tier:<5} {s.get('candidates', 0):>10,} candidates {s['rows']:>10,} rows  {_mb(s['bytes'])}")
+        if "total_bytes" in sizes:
+            print(f"  total {_mb(sizes['total_bytes'])} (sizes are split by tier with tier partitions only)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Duplicate resume detection at ingest.
+
+Exact duplicates share an identity key: email, phone number or a profile URL
+(LinkedIn, GitHub, portfolio), normalized. Each document stores its keys in
+`dedup_keys`, which has a unique multikey index, so one `$in` query checks a
+whole batch and concurrent inserts of the same person can't both succeed.
+Keys are per tenant: those of a tenant other than DEFAULT_TENANT are prefixed
+with it, and near duplicates are only looked for within the tenant.
+
+Near duplicates (the same resume re-sent with small edits, or under another
+email) are caught by the embedding worker once the new candidate is embedded:
+its nearest neighbour in the default space is looked up through the vector
+index and compared against DEDUP_SIMILARITY.
+
+DEDUP_POLICY decides what happens to a duplicate:
+  skip   keep the existing candidate: an exact duplicate upload isn't stored,
+         a near duplicate is kept in MongoDB flagged with `duplicate_of` but
+         not made searchable (default)
+  merge  the new resume replaces the existing candidate's fields and the
+         existing candidate is re-embedded; the new document is dropped
+  off    no duplicate checks
+
+Existing documents predate `dedup_keys`; add the keys and the index with:
+  python candidate_dedup.py --backfill
+"""
+
+import argparse
+import logging
+import math
+import os
+import re
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from sqlalchemy import text
+
+from embedding_index import CANDIDATES_TABLE, DEFAULT_TENANT, document_tenant, split_model_spec
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
+
+DEDUP_POLICY = os.getenv("DEDUP_POLICY", "skip").lower()
+# Cosine similarity at or above which two resumes are near duplicates; 0 disables the check
+DEDUP_SIMILARITY = float(os.getenv("DEDUP_SIMILARITY", "0.97"))
+DEDUP_INDEX = "dedup_keys_unique"
+
+if DEDUP_POLICY not in ("skip", "merge", "off"):
+    raise ValueError(f"Unknown DEDUP_POLICY: {DEDUP_POLICY!r} (expected 'skip', 'merge' or 'off')")
+
+_URL_PREFIX_RE = re.compile(r"^(?:https?://)?(?:www\.)?")
+
+
+def _normalize_url(url: str) -> str:
+    url = _URL_PREFIX_RE.sub("", url.strip().lower())
+    return url.split("?", 1)[0].split("#", 1)[0].rstrip("/")
+
+
+def dedup_keys(candidate: dict) -> List[str]:
+    """
+    Normalized identity keys, e.g. ['email:ann@x.com', 'phone:15551234567', 'url:github.com/ann'];
+    'acme|email:ann@x.com' for a candidate of tenant 'acme'.
+    """
+    pi = candidate.get("personal_info") or {}
+    keys = []
+    email = (pi.get("email") or "").strip().lower()
+    if "@" in email:
+        keys.append(f"email:{email}")
+    phone = re.sub(r"\D", "", pi.get("phone") or "")
+    if len(phone) >= 7:
+        keys.append(f"phone:{phone}")
+    for field in ("linkedin", "github", "portfolio"):
+        url = _normalize_url(pi.get(field) or "")
+        if "/" in url or "." in url:
+            keys.append(f"url:{url}")
+    tenant = document_tenant(candidate)
+    if tenant != DEFAULT_TENANT:
+        keys = [f"{tenant}|{key}" for key in keys]
+    return sorted(set(keys))
+
+
+def with_dedup_keys(candidate: dict) -> dict:
+    """Copy of the candidate with `dedup_keys` set (left out when there are none, to stay out of the index)."""
+    candidate = dict(candidate)
+    keys = dedup_keys(candidate)
+    if keys:
+        candidate["dedup_keys"] = keys
+    else:
+        candidate.pop("dedup_keys", None)
+    return candidate
+
+
+def ensure_dedup_index(candidates_col) -> bool:
+    """
+    Unique index over `dedup_keys`. Collections that already hold exact
+    duplicates get a plain index and a warning instead. Returns True if unique.
+    """
+    try:
+        candidates_col.create_index([("dedup_keys", ASCENDING)], name=DEDUP_INDEX, unique=True,
+                                    partialFilterExpression={"dedup_keys": {"$exists": True}})
+        return True
+    except OperationFailure as e:
+        if e.code != 11000:
+            raise
+        candidates_col.create_index([("dedup_keys", ASCENDING)], name="dedup_keys")
+        logging.warning("Candidates share dedup keys; run `python candidate_dedup.py --backfill` to list them")
+        return False
+
+
+def find_exact_duplicates(candidates_col, candidates: List[dict]) -> List[Optional[Tuple[str, Optional[str]]]]:
+    """
+    Check a batch against stored documents with one query.
+
+    Returns, per candidate, None or (matching key, existing id). The id is
+    None when the match is an earlier candidate of the same batch.
+    """
+    batch_keys = [dedup_keys(c) for c in candidates]
+    wanted = sorted({k for keys in batch_keys for k in keys})
+    owner: Dict[str, str] = {}
+    if wanted:
+        for doc in candidates_col.find({"dedup_keys": {"$in": wanted}}, {"dedup_keys": 1}):
+            for key in doc.get("dedup_keys", []):
+                owner.setdefault(key, str(doc["_id"]))
+
+    results: List[Optional[Tuple[str, Optional[str]]]] = []
+    seen = set()
+    for keys in batch_keys:
+        match = next(((k, owner[k]) for k in keys if k in owner), None)
+        if match is None:
+            match = next(((k, None) for k in keys if k in seen), None)
+        results.append(match)
+        seen.update(keys)
+    return results
+
+
+def merge_into(candidates_col, existing_id: str, candidate: dict):
+    """
+    The newer resume wins: replace the existing document's fields, keep its id
+    and all identity keys. Keys of the new resume that belong to a third
+    document (matched on email, but the phone is someone else's) aren't taken
+    over: the unique index allows each key on one document only.
+    """
+    key = ObjectId(existing_id) if ObjectId.is_valid(existing_id) else existing_id
+    fields = {k: v for k, v in candidate.items() if k not in ("_id", "dedup_keys", "duplicate_of")}
+    update = {"$set": fields}
+    keys = candidate.get("dedup_keys") or []
+    if keys:
+        owned = {k for doc in candidates_col.find({"dedup_keys": {"$in": keys}, "_id": {"$ne": key}}, {"dedup_keys": 1})
+                 for k in doc.get("dedup_keys", [])}
+        keys = [k for k in keys if k not in owned]
+    if keys:
+        update["$addToSet"] = {"dedup_keys": {"$each": keys}}
+    try:
+        candidates_col.update_one({"_id": key}, update)
+    except DuplicateKeyError:
+        # A concurrent upload claimed one of the keys since the check; merge the fields alone
+        candidates_col.update_one({"_id": key}, {"$set": fields})
+
+
+def near_duplicates(conn, candidate_ids: List[str], spec: str, dim: int,
+                    min_similarity: float = DEDUP_SIMILARITY) -> Dict[str, Tuple[str, float]]:
+    """
+    {candidate_id: (nearest other candidate, cosine similarity)} for the given
+    candidates whose nearest neighbour in the same tenant is at least
+    `min_similarity` similar. Of two near duplicates in the same batch, the
+    lower id is kept as the original. Uses each model's HNSW index; the vectors
+    are unit length, so cosine similarity is 1 - L2² / 2.
+    """
+    if not candidate_ids or min_similarity <= 0:
+        return {}
+    name, revision = split_model_spec(spec)
+    dim = int(dim)
+    rows = conn.execute(text(f"""
+        SELECT n.candidate_id, nb.candidate_id, nb.distance
+        FROM {CANDIDATES_TABLE} n
+        CROSS JOIN LATERAL (
+            SELECT o.candidate_id, o.embedding::vector({dim}) <-> n.embedding::vector({dim}) AS distance
+            FROM {CANDIDATES_TABLE} o
+            WHERE o.model_name = :model_name AND o.model_revision = :model_revision
+              AND o.tenant_id = n.tenant_id AND o.candidate_id <> n.candidate_id
+            ORDER BY o.embedding::vector({dim}) <-> n.embedding::vector({dim})
+            LIMIT 1
+        ) nb
+        WHERE n.model_name = :model_name AND n.model_revision = :model_revision
+          AND n.candidate_id = ANY(:ids)
+    """), {"model_name": name, "model_revision": revision, "ids": list(candidate_ids)}).fetchall()
+    max_distance = math.sqrt(2 * (1 - min_similarity))
+    batch = set(candidate_ids)
+    return {cid: (other, round(1 - distance ** 2 / 2, 4)) for cid, other, distance in rows
+            if distance <= max_distance and not (other in batch and other > cid)}
+
+
+def backfill(candidates_col, batch_size: int = 1000) -> Tuple[int, Dict[str, List[str]]]:
+    """Set `dedup_keys` on documents that lack it; returns (updated, {key: ids sharing it})."""
+    def write(ops):
+        try:
+            return candidates_col.bulk_write(ops, ordered=False).modified_count
+        except BulkWriteError as e:
+            # With the unique index in place, documents duplicating an indexed one keep no keys
+            logging.warning(f"{len(e.details.get('writeErrors', []))} documents duplicate an indexed candidate")
+            return e.details.get("nModified", 0)
+
+    updated = 0
+    ops = []
+    for doc in candidates_col.find({"dedup_keys": {"$exists": False}}, {"personal_info": 1, "tenant_id": 1}).batch_size(batch_size):
+        keys = dedup_keys(doc)
+        if keys:
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"dedup_keys": keys}}))
+        if len(ops) >= batch_size:
+            updated += write(ops)
+            ops = []
+    if ops:
+        updated += write(ops)
+
+    shared = {}
+    for row in candidates_col.aggregate([
+        {"$match": {"dedup_keys": {"$exists": True}, "duplicate_of": {"$exists": False}}},
+        {"$unwind": "$dedup_keys"},
+        {"$group": {"_id": "$dedup_keys", "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+        {"$match": {"n": {"$gt": 1}}},
+    ], allowDiskUse=True):
+        shared[row["_id"]] = [str(i) for i in row["ids"]]
+    return updated, shared
+
+
+def main(argv=None):
+    from db import get_mongo_db
+
+    parser = argparse.ArgumentParser(description="Duplicate resume keys for MongoDB candidates.")
+    parser.add_argument("--backfill", action="store_true", help="add dedup_keys to existing documents")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+    if not args.backfill:
+        parser.error("nothing to do (use --backfill)")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    candidates_col = get_mongo_db()[os.getenv("MONGO_CANDIDATES_COLLECTION", "resumes")]
+    updated, shared = backfill(candidates_col, args.batch_size)
+    print(f"✓ Added dedup keys to {updated} documents")
+    if shared:
+        print(f"⚠ {len(shared)} keys are shared by more than one document:")
+        for key, ids in sorted(shared.items())[:50]:
+            print(f"    {key}: {', '.join(ids)}")
+        print("  Remove or merge these, then re-run to add the unique index")
+    if ensure_dedup_index(candidates_col):
+        print("✓ Unique index on dedup_keys in place")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+Offline nearest-neighbour graph and talent pools over the candidate vectors.
+
+A background job (cron, or after a large load) computes, for one model:
+
+  candidate_neighbors   each candidate's k nearest other candidates, ranked
+  candidate_clusters    each candidate's talent pool and distance to its centroid
+  talent_pools          one row per pool: size, centroid and a label built from
+                        the skills its members have more often than the corpus
+
+The API serves "related candidates" and pool membership from these tables
+with one primary-key lookup instead of a live vector search.
+
+Neighbours are exact for corpora up to KNN_EXACT_MAX vectors: blocks of
+GRAPH_BATCH_SIZE candidates are scored against the whole matrix, one matrix
+multiply per block. Larger corpora use the HNSW index, one LATERAL
+nearest-neighbour scan per candidate and a batch of candidates per statement.
+Pools are k-means (k-means++ seeding) fitted on a sample of at most
+KMEANS_SAMPLE vectors; every candidate is then assigned to its nearest
+centroid. The model's vectors are held in memory (n x dim x 4 bytes).
+
+Graphs and pools are per tenant: a candidate's neighbours and pool only ever
+include candidates of its own tenant, whose vectors are read from the
+tenant's (hot) partition; archived candidates are left out of both. Each tenant's rows are replaced in one transaction, so
+readers see the previous graph until the new one is complete.
+
+  python candidate_graph.py                       # default space, every tenant, auto pool count
+  python candidate_graph.py --space batch --neighbors 20 --pools 40
+  python candidate_graph.py --tenant acme         # one tenant
+"""
+
+import argparse
+import logging
+import math
+import os
+import sys
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from db import Vector
+from embedding_index import (
+    CANDIDATES_TABLE,
+    DEFAULT_TENANT,
+    HOT_TIER,
+    STATE_TABLE,
+    default_space,
+    has_column,
+    iter_model_vectors,
+    model_filter,
+    read_spaces,
+    split_model_spec,
+    sql_literal,
+    tenant_query,
+)
+from job_matching import top_k_matches
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
+
+NEIGHBORS_TABLE = "candidate_neighbors"
+CLUSTERS_TABLE = "candidate_clusters"
+POOLS_TABLE = "talent_pools"
+KNN_NEIGHBORS = int(os.getenv("KNN_NEIGHBORS", "10"))
+# Exact blocked matrix multiplies up to this many vectors, the HNSW index above it
+KNN_EXACT_MAX = int(os.getenv("KNN_EXACT_MAX", "50000"))
+GRAPH_BATCH_SIZE = int(os.getenv("GRAPH_BATCH_SIZE", "1024"))
+# Talent pools per build; 0 picks about sqrt(n / 2)
+TALENT_POOLS = int(os.getenv("TALENT_POOLS", "0"))
+KMEANS_SAMPLE = int(os.getenv("KMEANS_SAMPLE", "50000"))
+_HNSW_EF_SEARCH_DEFAULT = 40
+_MAX_AUTO_POOLS = 200
+
+
+# --- Schema ---
+def ensure_graph_tables(conn):
+    tenant_column = f"tenant_id TEXT NOT NULL DEFAULT {sql_literal(DEFAULT_TENANT)}"
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {NEIGHBORS_TABLE} (
+            model_name TEXT NOT NULL,
+            model_revision TEXT NOT NULL DEFAULT '',
+            candidate_id TEXT NOT NULL,
+            rank INTEGER NOT NULL,
+            neighbor_id TEXT NOT NULL,
+            distance DOUBLE PRECISION NOT NULL,
+            {tenant_column},
+            PRIMARY KEY (model_name, model_revision, candidate_id, rank)
+        )
+    """))
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {POOLS_TABLE} (
+            model_name TEXT NOT NULL,
+            model_revision TEXT NOT NULL DEFAULT '',
+            pool_id INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            label TEXT NOT NULL,
+            top_skills TEXT[] NOT NULL,
+            centroid vector NOT NULL,
+            computed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            {tenant_column},
+            PRIMARY KEY (model_name, model_revision, tenant_id, pool_id)
+        )
+    """))
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {CLUSTERS_TABLE} (
+            model_name TEXT NOT NULL,
+            model_revision TEXT NOT NULL DEFAULT '',
+            candidate_id TEXT NOT NULL,
+            pool_id INTEGER NOT NULL,
+            distance DOUBLE PRECISION NOT NULL,
+            {tenant_column},
+            PRIMARY KEY (model_name, model_revision, candidate_id)
+        )
+    """))
+    # Tables from before tenants: pool ids are only unique within a tenant
+    for table in (NEIGHBORS_TABLE, CLUSTERS_TABLE, POOLS_TABLE):
+        if not has_column(conn, "tenant_id", table):
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {tenant_column}"))
+            if table == POOLS_TABLE:
+                conn.execute(text(f"""
+                    ALTER TABLE {POOLS_TABLE} DROP CONSTRAINT {POOLS_TABLE}_pkey,
+                    ADD PRIMARY KEY (model_name, model_revision, tenant_id, pool_id)
+                """))
+    conn.execute(text(f"DROP INDEX IF EXISTS {CLUSTERS_TABLE}_pool_idx"))
+    conn.execute(text(f"""
+        CREATE INDEX IF NOT EXISTS {CLUSTERS_TABLE}_tenant_pool_idx
+        ON {CLUSTERS_TABLE} (model_name, model_revision, tenant_id, pool_id, distance)
+    """))
+
+
+def prepare_graph(engine):
+    """Idempotent schema setup."""
+    with engine.begin() as conn:
+        ensure_graph_tables(conn)
+
+
+# --- Neighbours ---
+def load_vectors(conn, spec: str, chunk_size: int = 8192,
+                 tenant: Optional[str] = None) -> Tuple[List[str], np.ndarray]:
+    ids, blocks = [], []
+    for chunk_ids, chunk in iter_model_vectors(conn, spec, chunk_size=chunk_size, tenant=tenant, tier=HOT_TIER):
+        ids.extend(chunk_ids)
+        blocks.append(chunk)
+    return ids, (np.concatenate(blocks) if blocks else np.zeros((0, 0), dtype=np.float32))
+
+
+def exact_neighbors(ids: List[str], matrix: np.ndarray, k: int, batch_size: int = GRAPH_BATCH_SIZE):
+    """Yield (candidate_id, [(neighbor_id, distance), ...]) from blocked matrix multiplies over the full matrix."""
+    def columns():
+        for start in range(0, len(ids), 8192):
+            yield ids[start:start + 8192], matrix[start:start + 8192]
+
+    for start in range(0, len(ids), batch_size):
+        block_ids = ids[start:start + batch_size]
+        # k + 1: each candidate is its own nearest neighbour
+        for cid, matches in zip(block_ids, top_k_matches(matrix[start:start + batch_size], columns(), k + 1)):
+            yield cid, [(nid, d) for nid, d in matches if nid != cid][:k]
+
+
+def index_neighbors_sql(dim: int, spec: str, tenant: str = DEFAULT_TENANT) -> str:
+    """The `k` nearest other hot candidates of each candidate in :ids (of one tenant), through the model's HNSW index."""
+    return f"""
+        SELECT src.candidate_id, hit.candidate_id, hit.distance
+        FROM {CANDIDATES_TABLE} src
+        CROSS JOIN LATERAL (
+            SELECT candidate_id, embedding::vector({int(dim)}) <-> src.embedding::vector({int(dim)}) AS distance
+            FROM {CANDIDATES_TABLE}
+            WHERE {model_filter(spec, tenant=tenant, tier=HOT_TIER)} AND candidate_id <> src.candidate_id
+            ORDER BY distance
+            LIMIT :k
+        ) hit
+        WHERE {model_filter(spec, alias="src", tenant=tenant, tier=HOT_TIER)} AND src.candidate_id = ANY(:ids)
+        ORDER BY src.candidate_id, hit.distance
+    """
+
+
+def index_neighbors(engine, ids: List[str], spec: str, dim: int, k: int, batch_size: int = GRAPH_BATCH_SIZE,
+                    tenant: str = DEFAULT_TENANT):
+    """Yield (candidate_id, [(neighbor_id, distance), ...]) with HNSW scans, batch_size candidates per statement."""
+    sql = text(index_neighbors_sql(dim, spec, tenant))
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        grouped: Dict[str, list] = {cid: [] for cid in batch}
+        with engine.begin() as conn:
+            if k > _HNSW_EF_SEARCH_DEFAULT:
+                conn.execute(text(f"SET LOCAL hnsw.ef_search = {int(min(k, 1000))}"))
+            for cid, nid, distance in conn.execute(sql, {"ids": batch, "k": k}):
+                grouped[cid].append((nid, float(distance)))
+        yield from grouped.items()
+
+
+# --- Talent pools ---
+def _assign(data: np.ndarray, centroids: np.ndarray, block: int = 8192) -> Tuple[np.ndarray, np.ndarray]:
+    """Nearest centroid and L2 distance of every row, in blocks to bound memory."""
+    labels = np.empty(len(data), dtype=np.int64)
+    distances = np.empty(len(data), dtype=np.float32)
+    c_sq = np.einsum("ij,ij->i", centroids, centroids)
+    for start in range(0, len(data), block):
+        rows = data[start:start + block]
+        d2 = np.einsum("ij,ij->i", rows, rows)[:, None] - 2.0 * (rows @ centroids.T) + c_sq[None, :]
+        labels[start:start + block] = d2.argmin(axis=1)
+        distances[start:start + block] = np.sqrt(np.maximum(d2.min(axis=1), 0.0))
+    return labels, distances
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int = 25, seed: int = 0, tol: float = 1e-4) -> np.ndarray:
+    """Lloyd's k-means with k-means++ seeding; returns the (k, dim) centroids."""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = np.empty((k, data.shape[1]), dtype=np.float32)
+    x_sq = np.einsum("ij,ij->i", data, data)
+    centroids[0] = data[rng.integers(len(data))]
+    d2 = np.maximum(x_sq - 2.0 * (data @ centroids[0]) + x_sq.dtype.type(centroids[0] @ centroids[0]), 0.0)
+    for i in range(1, k):
+        weights = d2.astype(np.float64)
+        total = weights.sum()
+        idx = rng.choice(len(data), p=weights / total) if total > 0 else rng.integers(len(data))
+        centroids[i] = data[idx]
+        d2 = np.minimum(d2, np.maximum(x_sq - 2.0 * (data @ centroids[i]) + x_sq[idx], 0.0))
+
+    for _ in range(iterations):
+        labels, _ = _assign(data, centroids)
+        counts = np.bincount(labels, minlength=k)
+        order = np.argsort(labels, kind="stable")
+        filled = counts > 0
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+        updated = centroids.copy()
+        updated[filled] = np.add.reduceat(data[order], starts, axis=0) / counts[filled, None]
+        shift = float(np.abs(updated - centroids).max())
+        centroids = updated
+        if shift < tol:
+            break
+    return centroids
+
+
+def pool_labels(skills: Dict[str, List[str]], members: Dict[int, List[str]], top: int = 3) -> Dict[int, List[str]]:
+    """
+    The skills most characteristic of each pool: frequent among its members and
+    rare in the corpus (count in pool x log(candidates / candidates with it)).
+    """
+    corpus = Counter(s for values in skills.values() for s in set(values))
+    n = max(len(skills), 1)
+    labels = {}
+    for pool_id, cids in members.items():
+        counts = Counter(s for cid in cids for s in set(skills.get(cid, ())))
+        ranked = sorted(counts, key=lambda s: (-counts[s] * math.log(n / corpus[s] + 1), s))
+        labels[pool_id] = ranked[:top]
+    return labels
+
+
+def candidate_skills(candidates_col, ids: List[str], tenant: Optional[str] = None) -> Dict[str, List[str]]:
+    """{candidate_id: technical skills} from MongoDB (one tenant's documents), read in one pass with a projection."""
+    wanted = set(ids)
+    skills = {}
+    query = tenant_query(tenant) if tenant is not None else {}
+    for doc in candidates_col.find(query, {"skills.technical": 1}).batch_size(5000):
+        cid = str(doc["_id"])
+        if cid in wanted:
+            skills[cid] = [s for s in ((doc.get("skills") or {}).get("technical") or []) if s]
+    return skills
+
+
+# --- Build ---
+def build_graph(engine, candidates_col=None, space: Optional[str] = None, k: int = KNN_NEIGHBORS,
+                pools: int = TALENT_POOLS, method: str = "auto", batch_size: int = GRAPH_BATCH_SIZE,
+                tenant: Optional[str] = None) -> dict:
+    """
+    Compute and store the neighbour graph and talent pools of one space's
+    model, for `tenant` or every tenant with vectors. Returns counts and timings.
+    """
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        spec, dim = read_spaces(conn)[space or default_space()]
+        tenants = [tenant] if tenant is not None else conn.execute(text(f"""
+            SELECT DISTINCT tenant_id FROM {CANDIDATES_TABLE} WHERE {model_filter(spec)} ORDER BY tenant_id
+        """)).scalars().all()
+    stats = {"model": spec, "tenants": len(tenants), "candidates": 0, "neighbors": k, "edges": 0, "pools": 0,
+             "neighbors_ms": 0.0}
+    methods = set()
+    for graph_tenant in tenants:
+        tenant_stats = build_tenant_graph(engine, candidates_col, spec, dim, graph_tenant, k, pools, method, batch_size)
+        for key in ("candidates", "edges", "pools", "neighbors_ms"):
+            stats[key] += tenant_stats[key]
+        methods.add(tenant_stats["method"])
+    stats["method"] = "/".join(sorted(methods)) or method
+    stats["neighbors_ms"] = round(stats["neighbors_ms"], 1)
+    stats["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return stats
+
+
+def build_tenant_graph(engine, candidates_col, spec: str, dim: int, tenant: str, k: int = KNN_NEIGHBORS,
+                       pools: int = TALENT_POOLS, method: str = "auto", batch_size: int = GRAPH_BATCH_SIZE) -> dict:
+    """The neighbour graph and talent pools of one tenant's candidates, replaced in one transaction."""
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        ids, matrix = load_vectors(conn, spec, tenant=tenant)
+        conn.rollback()
+    n = len(ids)
+    if method == "auto":
+        method = "exact" if n <= KNN_EXACT_MAX else "index"
+    logging.info(f"{n:,} {spec} vectors of tenant {tenant} loaded; neighbours by {method}")
+
+    name, revision = split_model_spec(spec)
+    model = {"model_name": name, "model_revision": revision, "tenant": tenant}
+    stats = {"model": spec, "candidates": n, "neighbors": k, "method": method}
+    with engine.begin() as conn:
+        for table in (NEIGHBORS_TABLE, CLUSTERS_TABLE, POOLS_TABLE):
+            conn.execute(text(f"""
+                DELETE FROM {table}
+                WHERE model_name = :model_name AND model_revision = :model_revision AND tenant_id = :tenant
+            """), model)
+
+        edges = exact_neighbors(ids, matrix, k, batch_size) if method == "exact" else \
+            index_neighbors(engine, ids, spec, dim, k, batch_size, tenant)
+        rows, written = [], 0
+        for cid, matches in edges:
+            rows.extend({"cid": cid, "rank": rank, "nid": nid, "distance": distance, **model}
+                        for rank, (nid, distance) in enumerate(matches))
+            if len(rows) >= 10000:
+                written += _insert_neighbors(conn, rows)
+                rows = []
+        written += _insert_neighbors(conn, rows)
+        stats["edges"] = written
+        stats["neighbors_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        n_pools = pools or min(max(int(round(math.sqrt(n / 2))), 1), _MAX_AUTO_POOLS)
+        if n:
+            sample = matrix if n <= KMEANS_SAMPLE else \
+                matrix[np.random.default_rng(0).choice(n, KMEANS_SAMPLE, replace=False)]
+            centroids = kmeans(sample, n_pools)
+            labels, distances = _assign(matrix, centroids)
+            members = {int(p): [] for p in range(len(centroids))}
+            for cid, label in zip(ids, labels):
+                members[int(label)].append(cid)
+            skills = candidate_skills(candidates_col, ids, tenant) if candidates_col is not None else {}
+            top_skills = pool_labels(skills, members)
+            conn.execute(text(f"""
+                INSERT INTO {POOLS_TABLE}
+                    (model_name, model_revision, tenant_id, pool_id, size, label, top_skills, centroid)
+                VALUES (:model_name, :model_revision, :tenant, :pool_id, :size, :label, :top_skills,
+                        CAST(:centroid AS vector))
+            """), [{"pool_id": p, "size": len(cids), "label": ", ".join(top_skills[p]) or f"Pool {p}",
+                    "top_skills": top_skills[p], "centroid": Vector(centroids[p]), **model}
+                   for p, cids in members.items() if cids])
+            for start in range(0, n, 10000):
+                conn.execute(text(f"""
+                    INSERT INTO {CLUSTERS_TABLE} (model_name, model_revision, tenant_id, candidate_id, pool_id, distance)
+                    VALUES (:model_name, :model_revision, :tenant, :cid, :pool_id, :distance)
+                """), [{"cid": cid, "pool_id": int(label), "distance": float(d), **model}
+                       for cid, label, d in zip(ids[start:start + 10000], labels[start:start + 10000],
+                                                distances[start:start + 10000])])
+            stats["pools"] = sum(1 for cids in members.values() if cids)
+        else:
+            stats["pools"] = 0
+    stats["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return stats
+
+
+def drop_unused_models(engine):
+    """Delete graph and pool rows of models no space uses any more (one statement per table)."""
+    with engine.begin() as conn:
+        for table in (NEIGHBORS_TABLE, CLUSTERS_TABLE, POOLS_TABLE):
+            if not conn.execute(text("SELECT to_regclass(:table)"), {"table": table}).scalar():
+                continue
+            n = conn.execute(text(f"""
+                DELETE FROM {table} g
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {STATE_TABLE} s
+                    WHERE s.model_name = CASE WHEN g.model_revision = '' THEN g.model_name
+                                              ELSE g.model_name || '@' || g.model_revision END)
+            """)).rowcount
+            logging.info(f"Deleted {n} {table} rows of unused models")
+
+
+def _insert_neighbors(conn, rows: List[dict]) -> int:
+    if rows:
+        conn.execute(text(f"""
+            INSERT INTO {NEIGHBORS_TABLE}
+                (model_name, model_revision, tenant_id, candidate_id, rank, neighbor_id, distance)
+            VALUES (:model_name, :model_revision, :tenant, :cid, :rank, :nid, :distance)
+        """), rows)
+    return len(rows)
+
+
+# --- Reads ---
+def related(conn, spec: str, candidate_id: str, limit: int = KNN_NEIGHBORS,
+            tenant: str = DEFAULT_TENANT) -> List[Tuple[str, float]]:
+    """Stored (neighbor_id, distance) rows of a candidate, nearest first."""
+    name, revision = split_model_spec(spec)
+    return [(row[0], row[1]) for row in conn.execute(text(f"""
+        SELECT neighbor_id, distance FROM {NEIGHBORS_TABLE}
+        WHERE model_name = :model_name AND model_revision = :model_revision AND tenant_id = :tenant
+          AND candidate_id = :cid
+        ORDER BY rank LIMIT :limit
+    """), {"model_name": name, "model_revision": revision, "tenant": tenant, "cid": candidate_id, "limit": limit})]
+
+
+def membership(conn, spec: str, candidate_id: str, tenant: str = DEFAULT_TENANT) -> Optional[dict]:
+    """A candidate's talent pool, or None if the candidate wasn't in the last build."""
+    name, revision = split_model_spec(spec)
+    row = conn.execute(text(f"""
+        SELECT c.pool_id, c.distance, p.label, p.top_skills, p.size, p.computed_at
+        FROM {CLUSTERS_TABLE} c
+        JOIN {POOLS_TABLE} p USING (model_name, model_revision, tenant_id, pool_id)
+        WHERE c.model_name = :model_name AND c.model_revision = :model_revision AND c.tenant_id = :tenant
+          AND c.candidate_id = :cid
+    """), {"model_name": name, "model_revision": revision, "tenant": tenant, "cid": candidate_id}).fetchone()
+    if not row:
+        return None
+    return {"pool_id": row[0], "distance": row[1], "label": row[2], "top_skills": list(row[3]),
+            "size": row[4], "computed_at": row[5].isoformat()}
+
+
+def list_pools(conn, spec: str, tenant: str = DEFAULT_TENANT) -> List[dict]:
+    name, revision = split_model_spec(spec)
+    return [{"pool_id": row[0], "label": row[1], "top_skills": list(row[2]), "size": row[3],
+             "computed_at": row[4].isoformat()}
+            for row in conn.execute(text(f"""
+                SELECT pool_id, label, top_skills, size, computed_at FROM {POOLS_TABLE}
+                WHERE model_name = :model_name AND model_revision = :model_revision AND tenant_id = :tenant
+                ORDER BY size DESC, pool_id
+            """), {"model_name": name, "model_revision": revision, "tenant": tenant})]
+
+
+def pool_members(conn, spec: str, pool_id: int, limit: int = 20, offset: int = 0,
+                 tenant: str = DEFAULT_TENANT) -> List[Tuple[str, float]]:
+    """(candidate_id, distance to the centroid) of a pool, most typical member first."""
+    name, revision = split_model_spec(spec)
+    return [(row[0], row[1]) for row in conn.execute(text(f"""
+        SELECT candidate_id, distance FROM {CLUSTERS_TABLE}
+        WHERE model_name = :model_name AND model_revision = :model_revision AND tenant_id = :tenant
+          AND pool_id = :pool_id
+        ORDER BY distance, candidate_id LIMIT :limit OFFSET :offset
+    """), {"model_name": name, "model_revision": revision, "tenant": tenant, "pool_id": pool_id,
+           "limit": limit, "offset": offset})]
+
+
+def main(argv=None):
+    from db import get_engine, get_mongo_db
+
+    parser = argparse.ArgumentParser(description="Build the candidate neighbour graph and talent pools.")
+    parser.add_argument("--space", default=None, help="search space whose model is used (default: the default space)")
+    parser.add_argument("--neighbors", type=int, default=KNN_NEIGHBORS, help="neighbours stored per candidate")
+    parser.add_argument("--pools", type=int, default=TALENT_POOLS, help="talent pools (0: about sqrt(n / 2))")
+    parser.add_argument("--method", choices=["auto", "exact", "index"], default="auto",
+                        help=f"exact matrix multiplies or the HNSW index (auto: exact up to {KNN_EXACT_MAX:,} vectors)")
+    parser.add_argument("--batch-size", type=int, default=GRAPH_BATCH_SIZE, help="candidates per block / statement")
+    parser.add_argument("--tenant", default=None, help="only this tenant (default: every tenant)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    engine = get_engine(statement_timeout_ms=0)
+    prepare_graph(engine)
+    candidates_col = get_mongo_db()[os.getenv("MONGO_CANDIDATES_COLLECTION", "resumes")]
+    stats = build_graph(engine, candidates_col, space=args.space, k=args.neighbors, pools=args.pools,
+                        method=args.method, batch_size=args.batch_size, tenant=args.tenant)
+    print(f"✓ Graph of {stats['candidates']:,} candidates in {stats['tenants']} tenant(s) "
+          f"for {stats['model']} ({stats['method']})")
+    print(f"  {stats['edges']:,} neighbour edges in {stats['neighbors_ms'] / 1000:,.1f}s | "
+          f"{stats['pools']} talent pools | total {stats['total_ms'] / 1000:,.1f}s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
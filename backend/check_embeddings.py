@@ -2,11 +2,33 @@
 """
 Script to check embeddings in NeonDB (PostgreSQL with pgvector)
 Shows how many embeddings exist, their dimensions, and sample data
+
+Usage:
+  python check_embeddings.py                        # overview
+  python check_embeddings.py <candidate_id>         # one embedding
+  python check_embeddings.py reconcile [--repair]   # diff MongoDB against NeonDB
+  python check_embeddings.py tokens [--workers N]   # token counts and truncation of stored content
 """
 
+import heapq
+import itertools
 import os
+import time
+from collections import Counter, deque
+import numpy as np
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from db import Vector, get_engine, get_mongo_db
+from embedding_index import (
+    CANDIDATES_TABLE,
+    STATE_TABLE,
+    default_space,
+    ensure_unique_rows,
+    has_model_columns,
+    read_spaces,
+    split_model_spec,
+    table_vector_dim,
+)
 
 # Load environment variables
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
@@ -17,7 +39,8 @@ if not POSTGRES_URI:
     print("ERROR: POSTGRES_URI must be set in .env file")
     exit(1)
 
-pg_engine = create_engine(POSTGRES_URI)
+# Full-table scans here can outlast the API's statement timeout
+pg_engine = get_engine(POSTGRES_URI, statement_timeout_ms=0)
 
 def print_section(title):
     """Print a formatted section header"""
@@ -25,16 +48,25 @@ def print_section(title):
     print(f"  {title}")
     print("="*70)
 
-def check_table_exists():
-    """Check if the candidates table exists"""
+def parse_vector(emb):
+    """Return the embedding as a list of floats (vector columns come back as numpy arrays, see db.py; text otherwise)."""
+    if emb is None:
+        return None
+    if isinstance(emb, str):
+        body = emb.strip().strip("[]")
+        return [float(v) for v in body.split(",")] if body else []
+    return np.asarray(emb, dtype=float).tolist()
+
+def check_table_exists(table_name="candidates"):
+    """Check if a table exists"""
     try:
         with pg_engine.connect() as conn:
             result = conn.execute(text("""
                 SELECT EXISTS (
                     SELECT FROM information_schema.tables 
-                    WHERE table_name = 'candidates'
+                    WHERE table_name = :table_name
                 );
-            """))
+            """), {"table_name": table_name})
             exists = result.scalar()
             return exists
     except Exception as e:
@@ -66,11 +98,7 @@ def get_embedding_stats():
             """))
             dim_row = dim_result.fetchone()
             if dim_row and dim_row[0] is not None:
-                emb = dim_row[0]
-                try:
-                    embedding_dim = len(emb) if hasattr(emb, '__len__') else 768
-                except:
-                    embedding_dim = 768  # Default for all-mpnet-base-v2
+                embedding_dim = len(parse_vector(dim_row[0]))
             else:
                 embedding_dim = None
             
@@ -78,6 +106,27 @@ def get_embedding_stats():
                 print(f"Embedding dimension: {embedding_dim}D")
             else:
                 print("⚠ Could not determine embedding dimension")
+
+            if check_table_exists(STATE_TABLE):
+                for space, (model, dim) in read_spaces(conn).items():
+                    print(f"Space '{space}': {model} ({dim}D)")
+            if has_model_columns(conn):
+                print("\nRows per model:")
+                for model, revision, dim, count, untagged_dims in conn.execute(text("""
+                    SELECT model_name, model_revision, embedding_dim, COUNT(*),
+                           COUNT(*) FILTER (WHERE vector_dims(embedding) <> embedding_dim)
+                    FROM candidates
+                    GROUP BY 1, 2, 3
+                    ORDER BY 1, 2, 3
+                """)):
+                    label = f"{model}@{revision}" if revision else str(model)
+                    print(f"  {label:<40} {str(dim) + 'D':<7} {count} rows")
+                    if untagged_dims:
+                        print(f"  ⚠ {untagged_dims} rows don't match their recorded dimension")
+            else:
+                declared_dim = table_vector_dim(conn)
+                if declared_dim and embedding_dim and declared_dim != embedding_dim:
+                    print(f"⚠ Column is VECTOR({declared_dim}) but stored vectors are {embedding_dim}D")
             
             # Check for NULL embeddings
             null_result = conn.execute(text("""
@@ -126,13 +175,7 @@ def list_all_embeddings(limit=10):
                 emb = row[2]
                 preview = (row[3] or "")[:40] + "..." if row[3] and len(row[3]) > 40 else (row[3] or "")
                 # Get dimension from embedding in Python
-                if emb is not None:
-                    try:
-                        dim = len(emb) if hasattr(emb, '__len__') else 768
-                    except:
-                        dim = 768
-                else:
-                    dim = "NULL"
+                dim = len(parse_vector(emb)) if emb is not None else "NULL"
                 print(f"{cid:<30} {content_len:<15} {dim:<10} {preview}")
             
             if len(rows) == limit:
@@ -179,32 +222,26 @@ def show_embedding_details(candidate_id=None):
             
             # Get dimension and preview from embedding in Python
             if emb is not None:
-                try:
-                    dim = len(emb) if hasattr(emb, '__len__') else 768
-                    # Get first 10 values for preview
-                    if hasattr(emb, '__getitem__'):
-                        preview = [emb[i] for i in range(min(10, len(emb)))]
-                    else:
-                        preview = list(emb)[:10] if hasattr(emb, '__iter__') else []
-                except:
-                    dim = 768
-                    preview = []
+                values = parse_vector(emb)
+                dim = len(values)
+                # Get first 10 values for preview
+                preview = values[:10]
             else:
                 dim = "NULL"
                 preview = []
             
             print(f"Candidate ID: {cid}")
             print(f"Embedding Dimension: {dim}D")
-            print(f"\nContent Preview:")
+            print("\nContent Preview:")
             print("-" * 70)
             print(content[:500] + "..." if len(content) > 500 else content)
             print("-" * 70)
             if preview:
-                print(f"\nEmbedding Vector (first 10 values):")
+                print("\nEmbedding Vector (first 10 values):")
                 print(f"[{', '.join(map(str, preview[:10]))}...]")
                 print(f"\nTotal embedding values: {dim}")
             else:
-                print(f"\nEmbedding: NULL or could not extract")
+                print("\nEmbedding: NULL or could not extract")
             
     except Exception as e:
         print(f"✗ Error showing details: {e}")
@@ -215,10 +252,14 @@ def test_vector_similarity():
     
     try:
         with pg_engine.connect() as conn:
-            # Get two random embeddings
-            result = conn.execute(text("""
+            # Get two embeddings from the same model (vectors of different models aren't comparable)
+            same_model = ("WHERE (model_name, model_revision) = "
+                          "(SELECT model_name, model_revision FROM candidates LIMIT 1)"
+                          if has_model_columns(conn) else "")
+            result = conn.execute(text(f"""
                 SELECT candidate_id, embedding
                 FROM candidates
+                {same_model}
                 LIMIT 2
             """))
             rows = result.fetchall()
@@ -233,23 +274,23 @@ def test_vector_similarity():
             # Calculate cosine distance
             result = conn.execute(text("""
                 SELECT 
-                    :emb1::vector <-> :emb2::vector as cosine_distance,
-                    1 - (:emb1::vector <-> :emb2::vector) as cosine_similarity
+                    CAST(:emb1 AS vector) <-> CAST(:emb2 AS vector) as cosine_distance,
+                    1 - (CAST(:emb1 AS vector) <-> CAST(:emb2 AS vector)) as cosine_similarity
             """), {
-                "emb1": str(list(emb1)),
-                "emb2": str(list(emb2))
+                "emb1": Vector(parse_vector(emb1)),
+                "emb2": Vector(parse_vector(emb2))
             })
             
             row = result.fetchone()
             if row:
                 distance, similarity = row
-                print(f"Comparing embeddings:")
+                print("Comparing embeddings:")
                 print(f"  Candidate 1: {cid1[:20]}...")
                 print(f"  Candidate 2: {cid2[:20]}...")
                 print(f"\nCosine Distance: {distance:.6f}")
                 print(f"Cosine Similarity: {similarity:.6f}")
-                print(f"\nNote: Lower distance = more similar")
-                print(f"      Higher similarity = more similar")
+                print("\nNote: Lower distance = more similar")
+                print("      Higher similarity = more similar")
             
     except Exception as e:
         print(f"✗ Error testing similarity: {e}")
@@ -275,13 +316,13 @@ def main():
     # Check if table exists
     if not check_table_exists():
         print("\n⚠ Table 'candidates' does not exist!")
-        print("Create it with:")
+        print("Create it with (VECTOR size must match EMBEDDING_MODEL, e.g. 768 for all-mpnet-base-v2):")
         print("""
 CREATE TABLE IF NOT EXISTS candidates (
     id SERIAL PRIMARY KEY,
     candidate_id TEXT,
     content TEXT,
-    embedding VECTOR(768)
+    embedding VECTOR(<model dimension>)
 );
         """)
         return
@@ -313,9 +354,417 @@ CREATE TABLE IF NOT EXISTS candidates (
         print("⚠ No embeddings found")
         print("Load data with: python dummy_candidate.py")
 
+# --- Reconciliation ---
+def _mongo_ids(col, batch_size):
+    """Candidate ids in MongoDB, as strings in byte order (same order as COLLATE "C")."""
+    # ObjectIds and string ids sort separately in MongoDB; hex ObjectIds keep their order as text
+    # Near duplicates flagged at ingest (candidate_dedup.py) are deliberately not embedded
+    indexable = {"duplicate_of": {"$exists": False}}
+    object_ids = (str(d["_id"]) for d in col.find({"_id": {"$type": "objectId"}, **indexable}, {"_id": 1})
+                  .sort("_id", 1).batch_size(batch_size))
+    string_ids = (d["_id"] for d in col.find({"_id": {"$type": "string"}, **indexable}, {"_id": 1})
+                  .sort("_id", 1).batch_size(batch_size))
+    return heapq.merge(object_ids, string_ids)
+
+def _pg_models(conn, batch_size):
+    """(candidate_id, {model spec: most rows in one tenant}) for every candidate in NeonDB, in byte order."""
+    rows = conn.execution_options(stream_results=True, yield_per=batch_size).execute(text(f"""
+        SELECT candidate_id, model_name, model_revision, MAX(n)
+        FROM (
+            SELECT candidate_id, model_name, model_revision, COUNT(*) AS n
+            FROM {CANDIDATES_TABLE}
+            WHERE candidate_id IS NOT NULL
+            GROUP BY candidate_id, model_name, model_revision, tenant_id
+        ) per_tenant
+        GROUP BY 1, 2, 3
+        ORDER BY candidate_id COLLATE "C"
+    """))
+    for cid, group in itertools.groupby(rows, key=lambda r: r[0]):
+        yield cid, {(f"{r[1]}@{r[2]}" if r[2] else r[1]): r[3] for r in group}
+
+def _merge_diff(mongo_ids, pg_models):
+    """Yield (candidate_id, in_mongo, {model spec: rows}) over the union of both sorted streams."""
+    none = object()
+    mongo_id = next(mongo_ids, none)
+    pg = next(pg_models, none)
+    while mongo_id is not none or pg is not none:
+        if pg is none or (mongo_id is not none and mongo_id < pg[0]):
+            yield mongo_id, True, {}
+            mongo_id = next(mongo_ids, none)
+        elif mongo_id is none or pg[0] < mongo_id:
+            yield pg[0], False, pg[1]
+            pg = next(pg_models, none)
+        else:
+            yield mongo_id, True, pg[1]
+            mongo_id = next(mongo_ids, none)
+            pg = next(pg_models, none)
+
+def _repair_batch(kind, ids, candidates_col, outbox_col, spaces):
+    """Fix one batch of problems; returns how many candidates were repaired."""
+    from bson import ObjectId
+    from embedding_index import document_tenant
+    from embedding_worker import PENDING, PROCESSING, index_candidates
+    from section_index import SECTIONS_TABLE, delete_sections
+
+    mongo_keys = [ObjectId(cid) if ObjectId.is_valid(cid) else cid for cid in ids]
+    if kind == "duplicate":
+        # Keep the oldest row per (tenant, candidate, model)
+        with pg_engine.begin() as conn:
+            conn.execute(text(f"""
+                DELETE FROM {CANDIDATES_TABLE} c USING {CANDIDATES_TABLE} d
+                WHERE c.candidate_id = ANY(:ids) AND d.candidate_id = c.candidate_id AND d.tenant_id = c.tenant_id
+                  AND d.model_name = c.model_name AND d.model_revision = c.model_revision AND d.id < c.id
+            """), {"ids": ids})
+        return len(ids)
+    if kind == "orphan":
+        # Re-check: a document inserted after the scan passed its id is not an orphan
+        present = {str(d["_id"]) for d in candidates_col.find({"_id": {"$in": mongo_keys}}, {"_id": 1})}
+        orphans = [cid for cid in ids if cid not in present]
+        with pg_engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {CANDIDATES_TABLE} WHERE candidate_id = ANY(:ids)"), {"ids": orphans})
+            if check_table_exists(SECTIONS_TABLE):
+                delete_sections(conn, orphans)
+        return len(orphans)
+    # Missing: embed, unless the embedding worker still has the candidate queued
+    queued = {str(r["_id"]) for r in outbox_col.find(
+        {"_id": {"$in": mongo_keys}, "status": {"$in": [PENDING, PROCESSING]}}, {"_id": 1})}
+    docs = [d for d in candidates_col.find({"_id": {"$in": mongo_keys}}) if str(d["_id"]) not in queued]
+    if docs:
+        index_candidates(pg_engine, spaces, [(str(d["_id"]), d) for d in docs],
+                         tenants={str(d["_id"]): document_tenant(d) for d in docs})
+    return len(docs)
+
+def reconcile(repair=False, batch_size=1000, show=10):
+    """
+    Diff candidate ids in MongoDB against NeonDB in one pass over both, sorted.
+
+    Memory stays constant: each side is streamed in id order and merged. Finds
+    documents missing an embedding for a model in use, embeddings whose document
+    is gone, and duplicate rows per candidate and model. With repair=True each
+    kind is fixed in batches while scanning.
+    """
+    from embedding_index import SpaceCache
+    from embedding_worker import MONGO_OUTBOX_COLLECTION
+
+    print_section("MONGODB ↔ NEONDB RECONCILIATION")
+    mongo_db = get_mongo_db()
+    candidates_col = mongo_db[os.getenv("MONGO_CANDIDATES_COLLECTION", "resumes")]
+    outbox_col = mongo_db[MONGO_OUTBOX_COLLECTION]
+    spaces = SpaceCache(pg_engine)
+    active = set(spaces.models(refresh=True))
+    print(f"Models in use: {', '.join(sorted(active))}")
+
+    found = {"missing": 0, "orphan": 0, "duplicate": 0}
+    samples = {kind: [] for kind in found}
+    pending = {kind: [] for kind in found}
+    repaired = {kind: 0 for kind in found}
+    scanned = 0
+
+    def flush(kind):
+        if pending[kind]:
+            repaired[kind] += _repair_batch(kind, pending[kind], candidates_col, outbox_col, spaces)
+            pending[kind] = []
+
+    with pg_engine.connect() as conn:
+        for cid, in_mongo, models in _merge_diff(_mongo_ids(candidates_col, batch_size),
+                                                 _pg_models(conn, batch_size)):
+            scanned += 1
+            kinds = []
+            if not in_mongo:
+                kinds.append("orphan")
+            else:
+                if not active <= set(models):
+                    kinds.append("missing")
+                if any(n > 1 for n in models.values()):
+                    kinds.append("duplicate")
+            for kind in kinds:
+                found[kind] += 1
+                if len(samples[kind]) < show:
+                    samples[kind].append(cid)
+                if repair:
+                    pending[kind].append(cid)
+                    if len(pending[kind]) >= batch_size:
+                        flush(kind)
+    if repair:
+        for kind in ("duplicate", "orphan", "missing"):
+            flush(kind)
+
+    print(f"Scanned {scanned} candidate ids")
+    labels = {"missing": "MongoDB documents without an embedding for every model in use",
+              "orphan": "candidate ids in NeonDB with no MongoDB document",
+              "duplicate": "candidates with duplicate rows for a model"}
+    for kind, label in labels.items():
+        if found[kind]:
+            print(f"⚠ {found[kind]} {label}")
+            print(f"    e.g. {', '.join(samples[kind])}")
+        else:
+            print(f"✓ No {label}")
+
+    if repair:
+        print(f"\nRepaired: embedded {repaired['missing']}, removed orphans of {repaired['orphan']}, "
+              f"deduplicated {repaired['duplicate']}")
+        if repaired["missing"] < found["missing"]:
+            print(f"  Still queued for the embedding worker: {found['missing'] - repaired['missing']}")
+        with pg_engine.begin() as conn:
+            if ensure_unique_rows(conn):
+                print("✓ Unique index on (model, candidate_id) in place; loaders can't create duplicates")
+    elif any(found.values()):
+        print("\nRe-run with --repair to fix these")
+    return found
+
+# --- Token statistics ---
+_tokenizer = None  # (tokenizer or None, content token limit or None) in each worker process
+
+def _init_token_worker(tokenizer, limit):
+    global _tokenizer
+    _tokenizer = (tokenizer, limit)
+
+def _line_label(line):
+    """Section of a flattened line: the text before 'Label:' (both the old and the current format)."""
+    label, sep, _ = line.partition(":")
+    return label.strip() if sep and len(label) <= 30 else "(unlabelled)"
+
+def _token_chunk(contents):
+    """Statistics for one chunk of content: (token count histogram, truncated rows, lines, dropped, cut, chars past cut)."""
+    from embedding_utils import CHARS_PER_TOKEN, estimate_tokens
+
+    tokenizer, limit = _tokenizer
+    if tokenizer is not None:
+        enc = tokenizer(contents, add_special_tokens=False, truncation=False, verbose=False,
+                        return_attention_mask=False, return_offsets_mapping=limit is not None)
+        counts = [len(ids) for ids in enc["input_ids"]]
+    else:
+        counts = [estimate_tokens(c) for c in contents]
+
+    lengths, lines, dropped, cut = Counter(counts), Counter(), Counter(), Counter()
+    truncated = chars_past = 0
+    for i, (content, n) in enumerate(zip(contents, counts)):
+        end = None
+        if limit is not None and n > limit:
+            truncated += 1
+            # Character offset where the last token the model reads ends
+            end = enc["offset_mapping"][i][limit - 1][1] if tokenizer is not None else int(limit * CHARS_PER_TOKEN)
+            chars_past += len(content) - end
+        start = 0
+        for line in content.split("\n"):
+            label = _line_label(line)
+            lines[label] += 1
+            if end is not None:
+                if start >= end:
+                    dropped[label] += 1
+                elif start + len(line) > end:
+                    cut[label] += 1
+            start += len(line) + 1
+    return lengths, truncated, lines, dropped, cut, chars_past
+
+def _percentile(lengths, q):
+    """q-th percentile of a {token count: rows} histogram."""
+    target = q / 100 * sum(lengths.values())
+    seen = 0
+    for n in sorted(lengths):
+        seen += lengths[n]
+        if seen >= target:
+            return n
+    return 0
+
+def _encode_cost(lengths, max_len, specials, hidden):
+    """
+    Relative transformer encode cost of the corpus at a max sequence length.
+
+    Per layer and token a BERT-style encoder spends ~24·h² FLOPs in its dense
+    layers and ~4·n·h in attention, so a sequence of n tokens costs about
+    n·(1 + n / 6h). Batches are sorted by length, so padding is ignored.
+    """
+    total = 0.0
+    for n, rows in lengths.items():
+        seq = min(n + specials, max_len) if max_len else n + specials
+        total += rows * seq * (1 + seq / (6 * hidden))
+    return total
+
+def _measure_encode(model, contents, max_len):
+    """Wall time to encode `contents` with the model truncating at max_len."""
+    previous = model.max_seq_length
+    model.max_seq_length = max_len
+    try:
+        model.encode(contents[:8])  # warm-up
+        started = time.perf_counter()
+        model.encode(contents, batch_size=64)
+        return time.perf_counter() - started
+    finally:
+        model.max_seq_length = previous
+
+def token_stats(spec=None, workers=None, chunk_size=512, max_seq_length=None, limit=None, measure=0):
+    """
+    Tokenize every stored `content` with the model's tokenizer and report token
+    counts, how many candidates the model truncates and which sections fall
+    past the cut-off, plus the encode cost at shorter sequence lengths.
+
+    Rows are streamed from a server-side cursor in chunks that a process pool
+    tokenizes; workers send back histograms, so memory stays flat on millions
+    of rows. Models without a tokenizer (hash backend) use estimate_tokens().
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from embedding_utils import CHARS_PER_TOKEN, default_model_name, get_model
+
+    print_section("TOKENIZATION & TRUNCATION")
+    with pg_engine.connect() as conn:
+        tagged = has_model_columns(conn)
+        if not spec and check_table_exists(STATE_TABLE):
+            spec = read_spaces(conn).get(default_space(), (None,))[0]
+    spec = spec or default_model_name()
+
+    model = get_model(spec)
+    tokenizer = getattr(model, "tokenizer", None)
+    specials = tokenizer.num_special_tokens_to_add() if tokenizer is not None else 0
+    max_len = max_seq_length or getattr(model, "max_seq_length", None)
+    content_limit = max_len - specials if max_len else None
+    hidden = model.get_sentence_embedding_dimension()
+    workers = workers or os.cpu_count() or 1
+    print(f"Model: {spec}")
+    if tokenizer is not None:
+        print(f"Tokenizer: {type(tokenizer).__name__}, {specials} special tokens per sequence")
+    else:
+        print(f"⚠ Model has no tokenizer: token counts are estimated at {CHARS_PER_TOKEN} characters per token")
+    print(f"Max sequence length: {max_len or 'none'}"
+          + (f" ({content_limit} content tokens)" if content_limit else ""))
+    print(f"Workers: {workers}, chunk size: {chunk_size}")
+
+    # Each candidate's content is the same for every model: read one model's rows
+    where, params = "WHERE content IS NOT NULL", {}
+    if tagged:
+        name, revision = split_model_spec(spec)
+        where += " AND model_name = :name AND model_revision = :revision"
+        params = {"name": name, "revision": revision}
+    sql = f"SELECT content FROM {CANDIDATES_TABLE} {where}" + (f" LIMIT {int(limit)}" if limit else "")
+
+    lengths, lines, dropped, cut = Counter(), Counter(), Counter(), Counter()
+    truncated = chars_past = chars = rows = 0
+    sample = []
+
+    def merge(part):
+        nonlocal truncated, chars_past
+        lengths.update(part[0])
+        truncated += part[1]
+        lines.update(part[2])
+        dropped.update(part[3])
+        cut.update(part[4])
+        chars_past += part[5]
+
+    started = time.perf_counter()
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")  # one tokenizer thread per worker process
+    pool = ProcessPoolExecutor(workers, initializer=_init_token_worker,
+                               initargs=(tokenizer, content_limit)) if workers > 1 else None
+    if pool is None:
+        _init_token_worker(tokenizer, content_limit)
+    in_flight = deque()
+    try:
+        with pg_engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(text(sql), params)
+            for chunk in result.scalars().partitions(chunk_size):
+                rows += len(chunk)
+                chars += sum(map(len, chunk))
+                if len(sample) < measure:
+                    sample.extend(chunk[:measure - len(sample)])
+                if pool is None:
+                    merge(_token_chunk(chunk))
+                    continue
+                in_flight.append(pool.submit(_token_chunk, chunk))
+                if len(in_flight) >= 2 * workers:  # bounded read-ahead
+                    merge(in_flight.popleft().result())
+                if rows % (chunk_size * 200) == 0:
+                    print(f"  {rows:,} rows, {rows / (time.perf_counter() - started):,.0f} rows/s")
+        while in_flight:
+            merge(in_flight.popleft().result())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    elapsed = time.perf_counter() - started
+
+    if not rows:
+        print(f"⚠ No rows with content for {spec}")
+        return None
+    total_tokens = sum(n * c for n, c in lengths.items())
+    print(f"\nTokenized {rows:,} rows ({total_tokens:,} tokens) in {elapsed:,.1f}s "
+          f"({rows / elapsed:,.0f} rows/s)")
+    print(f"Content tokens per candidate: mean {total_tokens / rows:,.0f} | "
+          + " | ".join(f"p{q} {_percentile(lengths, q):,}" for q in (50, 90, 95, 99))
+          + f" | max {max(lengths):,}")
+
+    # Histogram in quarters of the limit (or of p99 without one), then one overflow bucket
+    width = max(((content_limit or _percentile(lengths, 99)) + 3) // 4, 1)
+    buckets = Counter()
+    for n, c in lengths.items():
+        buckets[min(n // width, 8)] += c
+    peak = max(buckets.values())
+    for b in range(9):
+        if not buckets[b]:
+            continue
+        label = f"{b * width:>6,}-{(b + 1) * width - 1:<6,}" if b < 8 else f"{8 * width:>6,}+      "
+        marker = " ←" if content_limit and b * width < content_limit <= (b + 1) * width else ""
+        print(f"  {label} {'█' * max(round(40 * buckets[b] / peak), 1):<40} {buckets[b]:>9,}{marker}")
+
+    if content_limit:
+        pct = 100 * truncated / rows
+        print(f"\n{'⚠' if truncated else '✓'} {truncated:,} candidates ({pct:.1f}%) are longer than "
+              f"{content_limit} tokens and truncated by the model")
+        lost = sum((n - content_limit) * c for n, c in lengths.items() if n > content_limit)
+        print(f"  Tokens never read by the model: {lost:,} ({100 * lost / total_tokens:.1f}%); "
+              f"text past the cut-off: {100 * chars_past / max(chars, 1):.1f}% of characters "
+              f"(tokenized, then discarded)")
+        if truncated:
+            print(f"\n{'Section':<22} {'lines':>10} {'dropped':>10} {'cut':>8} {'past cut-off':>13}")
+            print("-" * 67)
+            for label, _ in sorted(lines.items(), key=lambda kv: -(dropped[kv[0]] + cut[kv[0]]) / kv[1]):
+                past = dropped[label] + cut[label]
+                print(f"{label[:22]:<22} {lines[label]:>10,} {dropped[label]:>10,} {cut[label]:>8,} "
+                      f"{100 * past / lines[label]:>12.1f}%")
+
+    print_section("ENCODE COST BY MAX SEQUENCE LENGTH")
+    current = _encode_cost(lengths, max_len, specials, hidden)
+    candidates = sorted({64, 128, 256, 384, 512} | ({max_len} if max_len else set()))
+    candidates = [n for n in candidates if not max_len or n <= max_len]
+    timings = {}
+    if sample and tokenizer is not None:
+        for n in candidates:
+            timings[n] = _measure_encode(model, sample, n)
+    print(f"{'max length':>10} {'truncated':>10} {'est. cost':>10} {'saving':>8}"
+          + (f" {'measured':>12}" if timings else ""))
+    print("-" * (42 + (13 if timings else 0)))
+    for n in candidates:
+        cost = _encode_cost(lengths, n, specials, hidden)
+        over = sum(c for t, c in lengths.items() if t + specials > n)
+        measured = f" {1000 * timings[n] / len(sample):>9.2f} ms" if timings else ""
+        mark = " (current)" if n == max_len else ""
+        print(f"{n:>10} {100 * over / rows:>9.1f}% {cost / current:>9.2f}x {100 * (1 - cost / current):>7.1f}%"
+              f"{measured}{mark}")
+    print(f"\nCost model: n·(1 + n/6h) per sequence with h = {hidden}"
+          + (f"; measured per candidate over {len(sample)} rows" if timings else
+             "; add --measure N to time the model on N rows"))
+    return {"rows": rows, "truncated": truncated, "lengths": lengths, "dropped": dropped, "cut": cut}
+
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 1 and sys.argv[1] == "tokens":
+        import argparse
+        parser = argparse.ArgumentParser(prog="check_embeddings.py tokens",
+                                         description="Token counts and truncation of stored embedding content.")
+        parser.add_argument("--model", help="model spec (default: the default space's model)")
+        parser.add_argument("--workers", type=int, default=None, help="tokenizer processes (default: CPU count)")
+        parser.add_argument("--chunk-size", type=int, default=512)
+        parser.add_argument("--max-seq-length", type=int, default=None, help="what-if: truncate at this length")
+        parser.add_argument("--limit", type=int, default=None, help="only the first N rows")
+        parser.add_argument("--measure", type=int, default=0, help="time the model on N rows at each length")
+        args = parser.parse_args(sys.argv[2:])
+        token_stats(args.model, args.workers, args.chunk_size, args.max_seq_length, args.limit, args.measure)
+    elif len(sys.argv) > 1 and sys.argv[1] == "reconcile":
+        import argparse
+        parser = argparse.ArgumentParser(prog="check_embeddings.py reconcile",
+                                         description="Diff MongoDB candidates against NeonDB embeddings.")
+        parser.add_argument("--repair", action="store_true", help="embed missing, delete orphans and duplicates")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        args = parser.parse_args(sys.argv[2:])
+        reconcile(repair=args.repair, batch_size=args.batch_size)
+    elif len(sys.argv) > 1:
         candidate_id = sys.argv[1]
         print_section(f"EMBEDDING DETAILS FOR: {candidate_id}")
         show_embedding_details(candidate_id)
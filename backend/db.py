@@ -1,27 +1,611 @@
+"""
+Shared MongoDB and Postgres (NeonDB) connections.
+
+Every entry point (API, embedding worker, loaders, maintenance scripts) gets
+its clients here, so pool sizes and timeouts are set in one place:
+
+  PG_POOL_SIZE              connections kept open per process (5)
+  PG_MAX_OVERFLOW           extra connections under burst load, closed when returned (5)
+  PG_POOL_TIMEOUT           seconds to wait for a free connection before failing (10)
+  PG_POOL_RECYCLE           reopen connections older than this many seconds (1800)
+  PG_CONNECT_TIMEOUT        seconds to establish a connection (10)
+  PG_STATEMENT_TIMEOUT_MS   server-side statement timeout; 0 = none (30000)
+  PG_PREPARED_STATEMENTS    prepare hot queries once per connection; 0 behind PgBouncer (1)
+  POSTGRES_REPLICA_URIS     comma-separated read replicas for searches and lookups (none)
+  PG_REPLICA_MAX_LAG_S      replicas further behind than this many seconds get no reads (10)
+  PG_REPLICA_CHECK_INTERVAL seconds between replica health checks (2)
+  PG_READ_YOUR_WRITES_S     after a write, reads wait this long for a replica that has it; 0 = off (0)
+  MONGO_MAX_POOL_SIZE       connections per MongoDB server (50)
+  MONGO_MIN_POOL_SIZE       connections kept open per server (0)
+  MONGO_MAX_CONNECTING      connections a pool opens at the same time (2)
+  MONGO_CONNECT_TIMEOUT_MS, MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS,
+  MONGO_WAIT_QUEUE_TIMEOUT_MS  (10000, 5000, 0 = none, 0 = none)
+
+A process's total Postgres connections are at most PG_POOL_SIZE +
+PG_MAX_OVERFLOW; size them so that times the number of processes stays under
+the server's limit (or point POSTGRES_URI at Neon's `-pooler` endpoint).
+prewarm() opens the pools one connection at a time at startup, so scaling
+out doesn't turn the first requests into a connection storm.
+
+Writes always go to POSTGRES_URI. Read-only queries take read_connection(),
+which picks a healthy replica (see ReadRouter) and falls back to the primary.
+
+Every Postgres connection adapts pgvector's `vector` type: embeddings wrapped
+in Vector bind as vectors and vector columns come back as float32 numpy arrays
+(see register_vector_types()). Plain numpy arrays are left to the driver.
+"""
+
+import hashlib
+import logging
 import os
+import re
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from sqlalchemy import create_engine
+from pymongo import MongoClient, monitoring
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import sessionmaker
 
-load_dotenv()
+try:
+    import orjson
+except ImportError:  # optional: vectors are then formatted by Python
+    orjson = None
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
 
 # MongoDB
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
-mongo_client = MongoClient(MONGO_URI)
-mongo_db = mongo_client[os.getenv("MONGO_DB", "recruitbot")]  # DB name
-candidates_collection = mongo_db[os.getenv("MONGO_CANDIDATES_COLLECTION", "resumes")]
+MONGO_DB = os.getenv("MONGO_DB", "recruitbot")
+MONGO_CANDIDATES_COLLECTION = os.getenv("MONGO_CANDIDATES_COLLECTION", "resumes")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_CONNECTING = int(os.getenv("MONGO_MAX_CONNECTING", "2"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "0"))
 
 # NeonDB (Postgres + pgvector)
 POSTGRES_URI = os.getenv("POSTGRES_URI")
-engine = create_engine(POSTGRES_URI)
+PG_POOL_SIZE = int(os.getenv("PG_POOL_SIZE", "5"))
+PG_MAX_OVERFLOW = int(os.getenv("PG_MAX_OVERFLOW", "5"))
+PG_POOL_TIMEOUT = float(os.getenv("PG_POOL_TIMEOUT", "10"))
+PG_POOL_RECYCLE = int(os.getenv("PG_POOL_RECYCLE", "1800"))
+PG_CONNECT_TIMEOUT = int(os.getenv("PG_CONNECT_TIMEOUT", "10"))
+PG_STATEMENT_TIMEOUT_MS = int(os.getenv("PG_STATEMENT_TIMEOUT_MS", "30000"))
+# Session-level PREPARE doesn't survive transaction pooling (PgBouncer, Neon's -pooler endpoint)
+PG_PREPARED_STATEMENTS = os.getenv("PG_PREPARED_STATEMENTS", "1") == "1"
+POSTGRES_REPLICA_URIS = [uri.strip() for uri in os.getenv("POSTGRES_REPLICA_URIS", "").split(",") if uri.strip()]
+PG_REPLICA_MAX_LAG_S = float(os.getenv("PG_REPLICA_MAX_LAG_S", "10"))
+PG_REPLICA_CHECK_INTERVAL = float(os.getenv("PG_REPLICA_CHECK_INTERVAL", "2"))
+PG_READ_YOUR_WRITES_S = float(os.getenv("PG_READ_YOUR_WRITES_S", "0"))
+
+_lock = threading.RLock()  # get_read_router() creates engines while holding it
+_engines = {}
+_mongo_clients = {}
+
+
+class _MongoPoolStats(monitoring.ConnectionPoolListener):
+    """Counts connection pool events; pymongo has no other way to read pool usage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"open": 0, "checked_out": 0, "created": 0, "closed": 0, "checkout_failures": 0,
+                       "pool_clears": 0}
+
+    def _add(self, **deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                self.counts[key] += delta
+
+    def connection_created(self, event):
+        self._add(open=1, created=1)
+
+    def connection_closed(self, event):
+        self._add(open=-1, closed=1)
+
+    def connection_checked_out(self, event):
+        self._add(checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._add(checked_out=-1)
+
+    def connection_check_out_failed(self, event):
+        self._add(checkout_failures=1)
+
+    def pool_cleared(self, event):
+        self._add(pool_clears=1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+
+_mongo_stats = _MongoPoolStats()
+
+
+# --- pgvector type adaptation ---
+def _vector_text(value: np.ndarray) -> bytes:
+    """'[0.1,0.2,...]' for a float32 array; orjson writes the shortest float32 repr in one C call."""
+    value = np.ascontiguousarray(value, dtype=np.float32)
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+    return ("[" + ",".join(map(repr, value.tolist())) + "]").encode()
+
+
+def _vector_from_text(value: str) -> np.ndarray:
+    return np.array(value[1:-1].split(","), dtype=np.float32) if len(value) > 2 else np.zeros(0, np.float32)
+
+
+class Vector:
+    """An embedding to bind as a `vector` parameter (a list of them binds as vector[])."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = np.ascontiguousarray(value, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+
+class _Psycopg2VectorAdapter:
+    def __init__(self, vector: Vector):
+        self.value = vector.value
+
+    def getquoted(self) -> bytes:
+        # Typed, so a list of vectors binds as vector[] rather than text[]
+        return b"'" + _vector_text(self.value) + b"'::vector"
+
+
+def _register_psycopg2(dbapi_conn) -> bool:
+    import psycopg2.extensions as ext
+
+    with dbapi_conn.cursor() as cur:
+        cur.execute("SELECT to_regtype('vector')::oid")
+        oid = cur.fetchone()[0]
+    if not oid:
+        return False
+    caster = ext.new_type((oid,), "VECTOR", lambda value, cur: None if value is None else _vector_from_text(value))
+    ext.register_type(caster, dbapi_conn)
+    ext.register_adapter(Vector, _Psycopg2VectorAdapter)  # psycopg2 adapters are always global
+    return True
+
+
+def _register_psycopg(dbapi_conn) -> bool:
+    from psycopg.adapt import Dumper, Loader
+    from psycopg.pq import Format
+    from psycopg.types import TypeInfo
+
+    class NumpyVectorLoader(Loader):
+        format = Format.TEXT
+
+        def load(self, data):
+            return _vector_from_text(bytes(data).decode())
+
+    class NumpyVectorBinaryLoader(Loader):
+        format = Format.BINARY
+
+        def load(self, data):
+            # uint16 dim, uint16 unused, then big-endian float32s
+            return np.frombuffer(bytes(data)[4:], dtype=">f4").astype(np.float32)
+
+    info = TypeInfo.fetch(dbapi_conn, "vector")
+    if info is None:
+        return False
+
+    class VectorDumper(Dumper):
+        format = Format.TEXT
+        oid = info.oid
+
+        def dump(self, obj):
+            return _vector_text(obj.value)
+
+    class VectorBinaryDumper(Dumper):
+        format = Format.BINARY
+        oid = info.oid
+
+        def dump(self, obj):
+            # pgvector's binary format: uint16 dim, uint16 unused, then big-endian float32s
+            return struct.pack(">HH", len(obj.value), 0) + obj.value.astype(">f4").tobytes()
+
+    info.register(dbapi_conn)  # lists of vectors dump as vector[]
+    dbapi_conn.adapters.register_dumper(Vector, VectorDumper)
+    dbapi_conn.adapters.register_dumper(Vector, VectorBinaryDumper)
+    dbapi_conn.adapters.register_loader(info.oid, NumpyVectorLoader)
+    dbapi_conn.adapters.register_loader(info.oid, NumpyVectorBinaryLoader)
+    return True
+
+
+def register_vector_types(dbapi_conn) -> bool:
+    """
+    Adapt `vector` on one DBAPI connection; False if the extension isn't installed yet.
+
+    psycopg 3 (postgresql+psycopg://) sends and receives vectors in pgvector's
+    binary format. psycopg2 only speaks the text protocol: literals are written
+    by orjson and parsed by numpy instead of float by float in Python.
+    """
+    if type(dbapi_conn).__module__.startswith("psycopg2"):
+        return _register_psycopg2(dbapi_conn)
+    return _register_psycopg(dbapi_conn)
+
+
+def _on_connect(dbapi_conn, connection_record):
+    connection_record.info["pgvector"] = register_vector_types(dbapi_conn)
+    dbapi_conn.rollback()  # the type lookup opened a transaction
+
+
+def ensure_vector_types(conn):
+    """Adapt `vector` on a pooled connection opened before the extension existed (first run on a new database)."""
+    info = conn.connection.info
+    if not info.get("pgvector"):
+        info["pgvector"] = register_vector_types(conn.connection.dbapi_connection)
+
+
+# --- Prepared statements ---
+_BIND_RE = re.compile(r"(?<![:\w\\]):(\w+)(?!:)")  # :name, but not ::type casts or 'hash:768'
+_prepared_sql = {}
+
+
+def _prepared(sql: str):
+    """(statement name, PREPARE statement, EXECUTE statement) for SQL with :name binds."""
+    if sql not in _prepared_sql:
+        names = list(dict.fromkeys(_BIND_RE.findall(sql)))
+        name = "q_" + hashlib.sha1(sql.encode()).hexdigest()[:16]
+        body = _BIND_RE.sub(lambda m: f"${names.index(m.group(1)) + 1}", sql)
+        args = f"({', '.join(':' + n for n in names)})" if names else ""
+        _prepared_sql[sql] = (name, f"PREPARE {name} AS {body}", f"EXECUTE {name}{args}")
+    return _prepared_sql[sql]
+
+
+def execute_prepared(conn, sql: str, params: dict):
+    """
+    conn.execute(text(sql), params), planned once per connection.
+
+    psycopg2 never prepares on its own, so the statement is PREPAREd on first
+    use and EXECUTEd after that. psycopg 3 prepares repeated queries itself.
+    Inline values the plan depends on (e.g. the model of a partial index) as
+    literals rather than binds: a generic plan can't use the index otherwise.
+    """
+    dbapi_conn = conn.connection.dbapi_connection
+    if not PG_PREPARED_STATEMENTS or not type(dbapi_conn).__module__.startswith("psycopg2"):
+        return conn.execute(text(sql), params)
+    name, prepare, execute = _prepared(sql)
+    prepared = conn.connection.info.setdefault("prepared_statements", set())
+    if name not in prepared:
+        conn.exec_driver_sql(prepare)
+        prepared.add(name)
+    return conn.execute(text(execute), params)
+
+
+def get_engine(uri: str = None, statement_timeout_ms: int = None):
+    """
+    The process-wide pooled engine for `uri` (default POSTGRES_URI).
+
+    Long-running maintenance jobs (index builds, full-table scans) pass
+    statement_timeout_ms=0; everything else gets PG_STATEMENT_TIMEOUT_MS.
+    """
+    uri = uri or POSTGRES_URI
+    if not uri:
+        raise RuntimeError("POSTGRES_URI must be set in .env file")
+    timeout = PG_STATEMENT_TIMEOUT_MS if statement_timeout_ms is None else statement_timeout_ms
+    with _lock:
+        key = (uri, timeout)
+        if key not in _engines:
+            connect_args = {"connect_timeout": PG_CONNECT_TIMEOUT}
+            if timeout:
+                connect_args["options"] = f"-c statement_timeout={int(timeout)}"
+            _engines[key] = create_engine(
+                uri,
+                pool_size=PG_POOL_SIZE,
+                max_overflow=PG_MAX_OVERFLOW,
+                pool_timeout=PG_POOL_TIMEOUT,
+                pool_recycle=PG_POOL_RECYCLE,
+                pool_pre_ping=True,
+                # Reuse the most recent connection so idle extras age out instead of all staying warm
+                pool_use_lifo=True,
+                connect_args=connect_args,
+            )
+            event.listen(_engines[key], "connect", _on_connect)
+        return _engines[key]
+
+
+# --- Read replicas ---
+# How far a server has replayed the WAL and how many seconds of commits it is missing.
+# A primary listed as a replica reports its own WAL position and no lag.
+_REPLICA_STATUS_SQL = """
+    SELECT CAST(CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn() ELSE pg_current_wal_lsn() END AS text),
+           CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END
+"""
+
+
+def _parse_lsn(lsn: Optional[str]) -> int:
+    """'16/B374D848' -> WAL byte position."""
+    if not lsn:
+        return 0
+    high, _, low = lsn.partition("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+class ReadRouter:
+    """
+    Routes read-only queries to read replicas, writes stay on the primary.
+
+    A background thread probes every replica each PG_REPLICA_CHECK_INTERVAL
+    seconds; one that can't be reached or lags more than PG_REPLICA_MAX_LAG_S
+    gets no reads until a later probe finds it fit again. A connection error
+    on a replica takes it out at once. Reads go to the fit replica with the
+    fewest checked-out connections (round-robin among ties), and to the
+    primary when no replica is fit.
+
+    With PG_READ_YOUR_WRITES_S set, note_write() after a commit records the
+    primary's WAL position; for that many seconds only replicas that have
+    replayed it are used, so e.g. a candidate just indexed by this process is
+    found by the next search. Under constant ingestion that sends most reads
+    to the primary, so keep the window short.
+    """
+
+    def __init__(self, primary, replica_uris: List[str], max_lag_s: float = PG_REPLICA_MAX_LAG_S,
+                 check_interval: float = PG_REPLICA_CHECK_INTERVAL, read_your_writes_s: float = PG_READ_YOUR_WRITES_S):
+        self.primary = primary
+        self.replicas = [get_engine(uri) for uri in replica_uris]
+        self.max_lag_s = max_lag_s
+        self.check_interval = check_interval
+        self.read_your_writes_s = read_your_writes_s
+        self._lock = threading.Lock()
+        self._status = {replica: {"healthy": False, "lsn": 0, "lag_s": None, "error": "not checked yet"}
+                        for replica in self.replicas}
+        self._written = (0.0, 0)  # (monotonic time, primary WAL position) of the last noted write
+        self._turn = 0
+        self._thread = None
+        self._stop = threading.Event()
+        for replica in self.replicas:
+            event.listen(replica, "handle_error", self._on_error)
+
+    def start(self):
+        """Check the replicas once, then keep checking them in the background."""
+        with self._lock:
+            if self._thread is not None or not self.replicas:
+                return
+            self._thread = threading.Thread(target=self._run, name="replica-health", daemon=True)
+        self.check()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            self.check()
+
+    def check(self):
+        for replica in self.replicas:
+            try:
+                with replica.connect() as conn:
+                    lsn, lag = conn.execute(text(_REPLICA_STATUS_SQL)).one()
+                lag = float(lag)
+                status = {"healthy": lag <= self.max_lag_s, "lsn": _parse_lsn(lsn), "lag_s": round(lag, 3),
+                          "error": None if lag <= self.max_lag_s else f"lagging {lag:.1f}s"}
+            except Exception as e:
+                status = {"healthy": False, "lsn": 0, "lag_s": None, "error": str(e).splitlines()[0]}
+            with self._lock:
+                was_healthy = self._status[replica]["healthy"]
+                self._status[replica] = status
+            if was_healthy != status["healthy"]:
+                label = replica.url.render_as_string(hide_password=True)
+                if status["healthy"]:
+                    logging.info(f"Read replica {label} is serving reads")
+                else:
+                    logging.warning(f"Read replica {label} taken out of rotation: {status['error']}")
+
+    def mark_down(self, replica, error: Exception):
+        with self._lock:
+            status = self._status.get(replica)
+            if not status or not status["healthy"]:
+                return
+            status.update(healthy=False, error=str(error).splitlines()[0])
+        logging.warning(f"Read replica {replica.url.render_as_string(hide_password=True)} failed: {status['error']}")
+
+    def _on_error(self, context):
+        if context.is_disconnect and context.engine is not None:
+            self.mark_down(context.engine, context.original_exception)
+
+    def note_write(self):
+        """Call after committing on the primary to make the following reads see the write (PG_READ_YOUR_WRITES_S)."""
+        if not self.replicas or self.read_your_writes_s <= 0:
+            return
+        with self.primary.connect() as conn:
+            lsn = _parse_lsn(conn.execute(text("SELECT CAST(pg_current_wal_lsn() AS text)")).scalar())
+        with self._lock:
+            self._written = (time.monotonic(), max(lsn, self._written[1]))
+
+    def read_engine(self):
+        """The engine the next read-only query should use."""
+        if not self.replicas:
+            return self.primary
+        self.start()
+        with self._lock:
+            written_at, written_lsn = self._written
+            needed = written_lsn if time.monotonic() - written_at < self.read_your_writes_s else 0
+            fit = [r for r in self.replicas if self._status[r]["healthy"] and self._status[r]["lsn"] >= needed]
+            if not fit:
+                return self.primary
+            self._turn = (self._turn + 1) % len(fit)
+            rotated = fit[self._turn:] + fit[:self._turn]
+        return min(rotated, key=lambda r: r.pool.checkedout())
+
+    @contextmanager
+    def connect(self):
+        engine = self.read_engine()
+        try:
+            conn = engine.connect()
+        except DBAPIError as e:
+            if engine is self.primary:
+                raise
+            self.mark_down(engine, e)
+            conn = self.primary.connect()
+        with conn:
+            yield conn
+
+    def status(self) -> dict:
+        with self._lock:
+            return {replica.url.render_as_string(hide_password=True): {k: v for k, v in status.items() if k != "lsn"}
+                    for replica, status in self._status.items()}
+
+
+_router = None
+
+
+def get_read_router() -> ReadRouter:
+    """The process-wide router over POSTGRES_URI and POSTGRES_REPLICA_URIS."""
+    global _router
+    with _lock:
+        if _router is None:
+            _router = ReadRouter(get_engine(), POSTGRES_REPLICA_URIS)
+        return _router
+
+
+def read_connection():
+    """
+    Connection for read-only queries (searches, lookups): a fit read replica,
+    or the primary when there are none. Never write through it.
+    """
+    return get_read_router().connect()
+
+
+def note_write():
+    get_read_router().note_write()
+
+
+def get_mongo_client(uri: str = None) -> MongoClient:
+    """The process-wide MongoClient for `uri` (default MONGO_URI); it is thread-safe and pools internally."""
+    uri = uri or MONGO_URI
+    with _lock:
+        if uri not in _mongo_clients:
+            options = {
+                "maxPoolSize": MONGO_MAX_POOL_SIZE,
+                "minPoolSize": MONGO_MIN_POOL_SIZE,
+                "maxConnecting": MONGO_MAX_CONNECTING,
+                "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+                "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                "event_listeners": [_mongo_stats],
+            }
+            if MONGO_SOCKET_TIMEOUT_MS:
+                options["socketTimeoutMS"] = MONGO_SOCKET_TIMEOUT_MS
+            if MONGO_WAIT_QUEUE_TIMEOUT_MS:
+                options["waitQueueTimeoutMS"] = MONGO_WAIT_QUEUE_TIMEOUT_MS
+            _mongo_clients[uri] = MongoClient(uri, **options)
+        return _mongo_clients[uri]
+
+
+def get_mongo_db(name: str = None):
+    return get_mongo_client()[name or MONGO_DB]
+
+
+def get_candidates_collection():
+    return get_mongo_db()[MONGO_CANDIDATES_COLLECTION]
+
+
+def prewarm(pg_connections: int = None, mongo: bool = True) -> Dict[str, float]:
+    """
+    Open pool connections before traffic arrives; returns seconds spent per store.
+
+    Postgres connections (primary, then each read replica) are opened one
+    after another and all returned to the pool, which keeps up to
+    PG_POOL_SIZE of them; the replicas get their first health check. MongoDB is pinged once, which
+    selects a server and opens the first connection (MONGO_MIN_POOL_SIZE keeps
+    more open in the background).
+    """
+    timings = {}
+    if POSTGRES_URI:
+        started = time.perf_counter()
+        _prewarm_engine(get_engine(), PG_POOL_SIZE if pg_connections is None else pg_connections)
+        timings["postgres"] = time.perf_counter() - started
+        router = get_read_router()
+        for i, replica in enumerate(router.replicas):
+            started = time.perf_counter()
+            try:
+                _prewarm_engine(replica, PG_POOL_SIZE if pg_connections is None else pg_connections)
+            except DBAPIError as e:
+                logging.warning(f"Could not pre-warm read replica {i + 1}: {e}")
+            timings[f"replica {i + 1}"] = time.perf_counter() - started
+        router.start()
+    if mongo:
+        started = time.perf_counter()
+        get_mongo_client().admin.command("ping")
+        timings["mongo"] = time.perf_counter() - started
+    logging.info("Pre-warmed connection pools: " + ", ".join(f"{k} {v * 1000:.0f}ms" for k, v in timings.items()))
+    return timings
+
+
+def _prewarm_engine(engine, connections: int):
+    conns = []
+    try:
+        for _ in range(connections):
+            conn = engine.connect()
+            conn.execute(text("SELECT 1"))
+            conns.append(conn)
+    finally:
+        for conn in conns:
+            conn.close()
+
+
+def pool_stats() -> dict:
+    """Current pool usage of every engine and of the MongoDB clients."""
+    with _lock:
+        engines = dict(_engines)
+    postgres = {}
+    for (uri, timeout), engine in engines.items():
+        pool = engine.pool
+        label = engine.url.render_as_string(hide_password=True) + ("" if timeout else " (no statement timeout)")
+        postgres[label] = {
+            "pool_size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": PG_MAX_OVERFLOW,
+        }
+    with _mongo_stats._lock:
+        mongo = dict(_mongo_stats.counts, max_pool_size=MONGO_MAX_POOL_SIZE)
+    return {"postgres": postgres, "mongo": mongo}
+
+
+# Module-level handles, as before
+mongo_client = get_mongo_client()
+mongo_db = get_mongo_db()
+candidates_collection = get_candidates_collection()
+engine = get_engine() if POSTGRES_URI else None
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# pgvector extension setup (run once in DB):
+# pgvector schema: created and migrated by embedding_index.prepare_index()
 # CREATE EXTENSION IF NOT EXISTS vector;
 # CREATE TABLE IF NOT EXISTS candidates (
 #     id SERIAL PRIMARY KEY,
 #     candidate_id TEXT,
 #     content TEXT,
-#     embedding VECTOR(768)
+#     embedding VECTOR,               -- untyped: one row per (candidate, model)
+#     model_name TEXT,
+#     model_revision TEXT NOT NULL DEFAULT '',
+#     embedding_dim INTEGER
 # );
+# CREATE UNIQUE INDEX candidates_model_key ON candidates (model_name, model_revision, candidate_id);
+# Changing models: python reindex_embeddings.py --model <name> (see embedding_index.py)
+# Section vectors live in candidate_sections (see section_index.py)
@@ -1,20 +1,14 @@
 # dummy_candidate.py
 import os
 from dotenv import load_dotenv
-from pymongo import MongoClient
-
-from sqlalchemy import create_engine, text
-from embedding_utils import flatten_candidate, get_embedding
+from db import get_candidates_collection, get_engine
+from embedding_utils import flatten_for_models
+from embedding_index import prepare_index, store_embeddings
+from candidate_dedup import find_exact_duplicates, with_dedup_keys
 
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
 
-MONGO_URI = os.getenv("MONGO_URI")
-MONGO_DB = os.getenv("MONGO_DB")
-MONGO_CANDIDATES_COLLECTION = os.getenv("MONGO_CANDIDATES_COLLECTION", "resumes")
-
-mongo_client = MongoClient(MONGO_URI)
-mongo_db = mongo_client[MONGO_DB]
-candidates_col = mongo_db[MONGO_CANDIDATES_COLLECTION]
+candidates_col = get_candidates_collection()
 
 dummy_candidates = [
     {
@@ -578,19 +572,17 @@ dummy_candidates = [
 ]
 
 
-POSTGRES_URI = os.getenv("POSTGRES_URI")
-pg_engine = create_engine(POSTGRES_URI)
+pg_engine = get_engine()
 
 if __name__ == "__main__":
-    for candidate in dummy_candidates:
-        result = candidates_col.insert_one(candidate)
+    models = sorted({spec for spec, _ in prepare_index(pg_engine).values()})
+    for candidate, duplicate in zip(dummy_candidates, find_exact_duplicates(candidates_col, dummy_candidates)):
+        if duplicate:
+            print(f"Skipped {candidate['personal_info']['full_name']}: already stored as {duplicate[1] or 'an earlier entry'}")
+            continue
+        result = candidates_col.insert_one(with_dedup_keys(candidate))
         mongo_id = str(result.inserted_id)
         print(f"Inserted candidate with _id: {mongo_id}")
-        flat = flatten_candidate(candidate)
-        emb = get_embedding(flat)
         with pg_engine.begin() as conn:
-            conn.execute(text("""
-                INSERT INTO candidates (candidate_id, content, embedding)
-                VALUES (:cid, :content, :embedding)
-            """), {"cid": mongo_id, "content": flat, "embedding": emb})
+            store_embeddings(conn, [(mongo_id, flatten_for_models(candidate, models))], models)
         print(f"Embedded and stored in NeonDB with candidate_id: {mongo_id}")
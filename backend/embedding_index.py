@@ -0,0 +1,669 @@
+"""
+Model-versioned embeddings in the `candidates` table.
+
+Every row records the model name, revision and dimension of its vector, so
+several models can live side by side in one table. Each model gets its own
+partial HNSW index over `embedding::vector(dim)`, and searches always filter on
+the model they encoded the query with, so vectors from different models are
+never compared.
+
+`embedding_index_state` maps named search spaces (e.g. "interactive" and
+"batch") to the model serving them. reindex_embeddings.py backfills rows for a
+new model and then flips a space to it by updating that mapping.
+
+Every row also belongs to a tenant (`tenant_id`, one per client company) and
+an activity tier (`tier`: hot, or cold once candidate_archive.py archived
+it). With CANDIDATE_PARTITIONS=tenant,tier (the default for new tables)
+`candidates` is LIST-partitioned by tenant and each tenant's partition again
+by tier, `tenant` partitions by tenant only and `none` keeps a single table. Indexes created
+on the parent exist on every partition. All reads take a tenant and inline it
+as a literal like the model (see model_filter()), so the planner prunes even
+prepared statements to the tenant's partition and its own HNSW index: search
+cost follows the tenant's size, not the corpus. Partitions are created when a
+tenant first writes (ensure_tenant_partitions()); tables created before
+partitioning are converted with `python tenant_partitions.py --migrate`.
+
+Searches read the hot tier only unless asked to include archived
+candidates; with tier partitions the cold rows sit in their own partitions
+and indexes, so the hot index stays the size of the active corpus.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from sqlalchemy import text
+
+from db import Vector, ensure_vector_types, execute_prepared
+from embedding_utils import default_model_name, encode, get_embedding_dimension
+
+STATE_TABLE = "embedding_index_state"
+CANDIDATES_TABLE = "candidates"
+DEFAULT_SPACE = "default"
+UNIQUE_INDEX = f"{CANDIDATES_TABLE}_model_key"
+# Tenant of rows written without one (single-tenant deployments, loaders, old rows)
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")
+# Layout of newly created tables: "tenant,tier", "tenant" or "none"
+CANDIDATE_PARTITIONS = os.getenv("CANDIDATE_PARTITIONS", "tenant,tier").replace(" ", "").lower()
+TIERS = ("hot", "cold")
+HOT_TIER, COLD_TIER = TIERS
+_TENANT_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,62}$")
+
+if CANDIDATE_PARTITIONS not in ("tenant", "tenant,tier", "none"):
+    raise ValueError(f"Unknown CANDIDATE_PARTITIONS: {CANDIDATE_PARTITIONS!r} "
+                     f"(expected 'tenant', 'tenant,tier' or 'none')")
+
+
+def split_model_spec(spec: str) -> Tuple[str, str]:
+    """'all-mpnet-base-v2@abc123' -> ('all-mpnet-base-v2', 'abc123'); no '@' means revision ''."""
+    name, _, revision = spec.partition("@")
+    return name, revision
+
+
+def configured_spaces() -> Dict[str, str]:
+    """
+    Search spaces from EMBEDDING_SPACES, e.g. "interactive=all-MiniLM-L6-v2,batch=all-mpnet-base-v2".
+    The first space listed is the default. Unset means one space using EMBEDDING_MODEL.
+    """
+    raw = os.getenv("EMBEDDING_SPACES", "").strip()
+    if not raw:
+        return {DEFAULT_SPACE: default_model_name()}
+    spaces = {}
+    for part in raw.split(","):
+        space, _, spec = part.partition("=")
+        if not space.strip() or not spec.strip():
+            raise ValueError(f"Invalid EMBEDDING_SPACES entry: {part!r} (expected space=model)")
+        spaces[space.strip()] = spec.strip()
+    return spaces
+
+
+def default_space() -> str:
+    return next(iter(configured_spaces()))
+
+
+def model_index_name(spec: str, table: str = CANDIDATES_TABLE) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "_", spec.lower()).strip("_")[:30]
+    name = f"{table}_emb_{slug}_{hashlib.sha1(spec.encode()).hexdigest()[:8]}"
+    if len(name) > 63:  # partition tables: Postgres would truncate the name, hash suffix included
+        name = f"{table[:46]}_emb_{hashlib.sha1(f'{table}/{spec}'.encode()).hexdigest()[:12]}"
+    return name
+
+
+def sql_literal(value: str) -> str:
+    """A quoted SQL string literal, for DDL (defaults, partition bounds) where parameters can't be bound."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def validate_tenant(tenant: str) -> str:
+    """The tenant id if it is 1-63 letters, digits, '_', '.' or '-' (starting with a letter or digit)."""
+    if not isinstance(tenant, str) or not _TENANT_RE.match(tenant):
+        raise ValueError(f"Invalid tenant id: {tenant!r}")
+    return tenant
+
+
+def document_tenant(doc: dict) -> str:
+    return doc.get("tenant_id") or DEFAULT_TENANT
+
+
+def tenant_query(tenant: str) -> dict:
+    """MongoDB filter for a tenant's documents; those without `tenant_id` belong to DEFAULT_TENANT."""
+    if tenant == DEFAULT_TENANT:
+        return {"tenant_id": {"$in": [tenant, None]}}
+    return {"tenant_id": tenant}
+
+
+def table_vector_dim(conn, table: str = CANDIDATES_TABLE) -> Optional[int]:
+    """Declared dimension of `table.embedding`, e.g. 768 for VECTOR(768); None if untyped or missing."""
+    declared = conn.execute(text("""
+        SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+        WHERE attrelid = to_regclass(:table) AND attname = 'embedding'
+    """), {"table": table}).scalar()
+    if declared and declared.startswith("vector(") and declared.endswith(")"):
+        return int(declared[len("vector("):-1])
+    return None
+
+
+def has_column(conn, column: str, table: str = CANDIDATES_TABLE) -> bool:
+    return bool(conn.execute(text("""
+        SELECT 1 FROM pg_attribute
+        WHERE attrelid = to_regclass(:table) AND attname = :column AND NOT attisdropped
+    """), {"table": table, "column": column}).scalar())
+
+
+def has_model_columns(conn) -> bool:
+    return has_column(conn, "model_name")
+
+
+# --- Schema ---
+def ensure_state_table(conn, spaces: Dict[str, Tuple[str, int]]):
+    """Create the space -> model table and seed any space that isn't recorded yet."""
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+            space TEXT PRIMARY KEY,
+            model_name TEXT NOT NULL,
+            dim INTEGER NOT NULL,
+            activated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """))
+    # Tables created before spaces existed were keyed by table name, with one 'candidates' row
+    if conn.execute(text("""
+        SELECT 1 FROM pg_attribute
+        WHERE attrelid = to_regclass(:t) AND attname = 'table_name' AND NOT attisdropped
+    """), {"t": STATE_TABLE}).scalar():
+        conn.execute(text(f"ALTER TABLE {STATE_TABLE} RENAME COLUMN table_name TO space"))
+        conn.execute(text(f"UPDATE {STATE_TABLE} SET space = :space WHERE space = :table"),
+                     {"space": next(iter(spaces), DEFAULT_SPACE), "table": CANDIDATES_TABLE})
+    for space, (spec, dim) in spaces.items():
+        conn.execute(text(f"""
+            INSERT INTO {STATE_TABLE} (space, model_name, dim)
+            VALUES (:space, :model, :dim)
+            ON CONFLICT (space) DO NOTHING
+        """), {"space": space, "model": spec, "dim": dim})
+
+
+def ensure_model_columns(conn, legacy_spec: str):
+    """
+    Add model_name / model_revision / embedding_dim to `candidates`.
+
+    A table created with a typed VECTOR(n) column is converted once: existing
+    rows are tagged with `legacy_spec`, dimension-bound indexes are dropped and
+    the column becomes an untyped `vector` so several dimensions can coexist.
+    """
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+    create_candidates_table(conn)
+    if not has_model_columns(conn):
+        conn.execute(text(f"""
+            ALTER TABLE {CANDIDATES_TABLE}
+                ADD COLUMN IF NOT EXISTS model_name TEXT,
+                ADD COLUMN IF NOT EXISTS model_revision TEXT NOT NULL DEFAULT '',
+                ADD COLUMN IF NOT EXISTS embedding_dim INTEGER
+        """))
+    legacy_dim = table_vector_dim(conn)
+    if legacy_dim:
+        name, revision = split_model_spec(legacy_spec)
+        tagged = conn.execute(text(f"""
+            UPDATE {CANDIDATES_TABLE}
+            SET model_name = :name, model_revision = :revision, embedding_dim = :dim
+            WHERE model_name IS NULL
+        """), {"name": name, "revision": revision, "dim": legacy_dim}).rowcount
+        indexes = conn.execute(text("""
+            SELECT i.relname FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = ANY(x.indkey)
+            WHERE x.indrelid = to_regclass(:table) AND a.attname = 'embedding'
+        """), {"table": CANDIDATES_TABLE}).scalars().all()
+        for index in indexes:
+            conn.execute(text(f'DROP INDEX IF EXISTS "{index}"'))
+        conn.execute(text(f"ALTER TABLE {CANDIDATES_TABLE} ALTER COLUMN embedding TYPE vector"))
+        logging.info(f"Tagged {tagged} existing rows as {legacy_spec} ({legacy_dim}D); "
+                     f"dropped {len(indexes)} dimension-bound index(es)")
+    ensure_tenant_columns(conn, CANDIDATES_TABLE)
+    if not has_column(conn, "indexed_at"):
+        # Rows from before stay NULL; candidate_archive.py falls back to the ObjectId's creation time
+        conn.execute(text(f"ALTER TABLE {CANDIDATES_TABLE} ADD COLUMN indexed_at TIMESTAMPTZ"))
+        conn.execute(text(f"ALTER TABLE {CANDIDATES_TABLE} ALTER COLUMN indexed_at SET DEFAULT now()"))
+
+
+def create_candidates_table(conn, layout: str = CANDIDATE_PARTITIONS):
+    """Create `candidates` (if missing) with the given partition layout and the default tenant's partition."""
+    partitioned = layout != "none"
+    key = {"none": "id", "tenant": "id, tenant_id", "tenant,tier": "id, tenant_id, tier"}[layout]
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {CANDIDATES_TABLE} (
+            id SERIAL,
+            candidate_id TEXT,
+            content TEXT,
+            embedding vector,
+            model_name TEXT,
+            model_revision TEXT NOT NULL DEFAULT '',
+            embedding_dim INTEGER,
+            tenant_id TEXT NOT NULL DEFAULT {sql_literal(DEFAULT_TENANT)},
+            tier TEXT NOT NULL DEFAULT {sql_literal(HOT_TIER)},
+            indexed_at TIMESTAMPTZ DEFAULT now(),
+            PRIMARY KEY ({key})
+        ){" PARTITION BY LIST (tenant_id)" if partitioned else ""}
+    """))
+    if partitioned and table_layout(conn) != "none":  # not a table from before partitioning
+        ensure_tenant_partitions(conn, [DEFAULT_TENANT], CANDIDATES_TABLE, layout)
+
+
+def ensure_tenant_columns(conn, table: str, tier: bool = True):
+    """Add tenant_id (and tier) to a table created before tenants; existing rows belong to DEFAULT_TENANT."""
+    if has_column(conn, "tenant_id", table) and (not tier or has_column(conn, "tier", table)):
+        return
+    conn.execute(text(f"""
+        ALTER TABLE {table}
+            ADD COLUMN IF NOT EXISTS tenant_id TEXT NOT NULL DEFAULT {sql_literal(DEFAULT_TENANT)}
+            {f", ADD COLUMN IF NOT EXISTS tier TEXT NOT NULL DEFAULT {sql_literal(HOT_TIER)}" if tier else ""}
+    """))
+    logging.info(f"Added tenant columns to {table}; existing rows belong to tenant {DEFAULT_TENANT!r}")
+
+
+# --- Tenant partitions ---
+def table_layout(conn, table: str = CANDIDATES_TABLE) -> Optional[str]:
+    """'none', 'tenant' or 'tenant,tier' for an existing table; None if it doesn't exist."""
+    row = conn.execute(text("""
+        SELECT c.relkind, COUNT(p.oid), COALESCE(bool_or(p.relkind = 'p'), FALSE)
+        FROM pg_class c
+        LEFT JOIN pg_inherits i ON i.inhparent = c.oid
+        LEFT JOIN pg_class p ON p.oid = i.inhrelid
+        WHERE c.oid = to_regclass(:table)
+        GROUP BY c.relkind
+    """), {"table": table}).fetchone()
+    if row is None:
+        return None
+    if row[0] != "p":
+        return "none"
+    if not row[1]:  # no partitions yet to tell from; only candidates have tiers
+        return "tenant,tier" if table == CANDIDATES_TABLE and CANDIDATE_PARTITIONS == "tenant,tier" else "tenant"
+    return "tenant,tier" if row[2] else "tenant"
+
+
+def partition_name(table: str, tenant: str, tier: Optional[str] = None) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "_", tenant.lower()).strip("_")[:20]
+    name = f"{table}_t_{slug}_{hashlib.sha1(tenant.encode()).hexdigest()[:8]}"
+    return f"{name}_{tier}" if tier else name
+
+
+def partitions(conn, table: str) -> List[Tuple[str, bool]]:
+    """(name, is itself partitioned) of the direct partitions of `table`."""
+    return [(row[0], row[1]) for row in conn.execute(text("""
+        SELECT c.relname, c.relkind = 'p' FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname
+    """), {"table": table})]
+
+
+# (table, tenant) pairs whose partitions this process has seen committed
+_existing_partitions = set()
+
+
+def forget_partitions(table: str):
+    """Drop `table` from the partition cache; call once a change to its partitions has committed."""
+    _existing_partitions.difference_update({key for key in _existing_partitions if key[0] == table})
+
+
+def ensure_tenant_partitions(conn, tenants: Iterable[str], table: str = CANDIDATES_TABLE,
+                             layout: Optional[str] = None, cached: bool = True) -> List[str]:
+    """
+    Create the partition (and tier sub-partitions) of every tenant in `tenants`
+    that has none yet; returns the tenants added. A no-op for unpartitioned
+    tables. Creating a partition locks the parent table exclusively, so call
+    this in a short transaction of its own before a long write. cached=False
+    checks every tenant and caches none, for a table re-created in the
+    current transaction.
+    """
+    wanted = sorted({validate_tenant(t) for t in tenants if not cached or (table, t) not in _existing_partitions})
+    if not wanted:
+        return []
+    layout = layout or table_layout(conn, table)
+    if layout in (None, "none"):
+        return []
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": f"{table}_partitions"})
+    added = []
+    for tenant in wanted:
+        name = partition_name(table, tenant)
+        if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+            if cached:
+                _existing_partitions.add((table, tenant))  # cached only once known to be committed
+            continue
+        tiered = layout == "tenant,tier"
+        conn.execute(text(f"""
+            CREATE TABLE {name} PARTITION OF {table} FOR VALUES IN ({sql_literal(tenant)})
+            {"PARTITION BY LIST (tier)" if tiered else ""}
+        """))
+        for tier in TIERS if tiered else ():
+            conn.execute(text(f"""
+                CREATE TABLE {partition_name(table, tenant, tier)} PARTITION OF {name}
+                FOR VALUES IN ({sql_literal(tier)})
+            """))
+        added.append(tenant)
+    if added:
+        logging.info(f"Created {table} partitions for tenant(s) {', '.join(added)}")
+    return added
+
+
+def ensure_unique_rows(conn) -> bool:
+    """
+    Enforce one row per (model, candidate) with a unique index.
+
+    Tables that already hold duplicates keep a plain index instead and a
+    warning is logged; `check_embeddings.py reconcile --repair` removes the
+    duplicates and then calls this again. Returns True if the index exists.
+    """
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": UNIQUE_INDEX}).scalar():
+        return True
+    # A unique index on a partitioned table has to include the partition keys
+    keys = {"none": "", "tenant": "tenant_id, ", "tenant,tier": "tenant_id, tier, "}[table_layout(conn)]
+    duplicated = conn.execute(text(f"""
+        SELECT 1 FROM {CANDIDATES_TABLE}
+        GROUP BY model_name, model_revision, candidate_id HAVING COUNT(*) > 1 LIMIT 1
+    """)).scalar()
+    if duplicated:
+        conn.execute(text(f"""
+            CREATE INDEX IF NOT EXISTS {CANDIDATES_TABLE}_model_idx
+            ON {CANDIDATES_TABLE} (model_name, model_revision, candidate_id)
+        """))
+        logging.warning(f"{CANDIDATES_TABLE} has duplicate rows per candidate and model; "
+                        f"run `python check_embeddings.py reconcile --repair`")
+        return False
+    conn.execute(text(f"""
+        CREATE UNIQUE INDEX IF NOT EXISTS {UNIQUE_INDEX}
+        ON {CANDIDATES_TABLE} ({keys}model_name, model_revision, candidate_id)
+    """))
+    conn.execute(text(f"DROP INDEX IF EXISTS {CANDIDATES_TABLE}_model_idx"))
+    return True
+
+
+def model_index_sql(spec: str, dim: int, concurrently: bool = False, table: str = CANDIDATES_TABLE,
+                    only: bool = False) -> str:
+    name, revision = split_model_spec(spec)
+    return f"""
+        CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {model_index_name(spec, table)}
+        ON {'ONLY ' if only else ''}{table} USING hnsw ((embedding::vector({int(dim)})) vector_l2_ops)
+        WHERE model_name = {sql_literal(name)} AND model_revision = {sql_literal(revision)}
+    """
+
+
+def build_model_index(engine, spec: str, dim: int, table: str = CANDIDATES_TABLE):
+    """
+    Build a model's partial HNSW index without blocking writes. A partitioned
+    table can't CREATE INDEX CONCURRENTLY, so each partition's index is built
+    concurrently and attached to an index created ON ONLY its parent, which
+    becomes valid once every partition has one.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if table_layout(conn, table) == "none":
+            conn.execute(text(model_index_sql(spec, dim, concurrently=True, table=table)))
+            return
+        conn.execute(text(model_index_sql(spec, dim, table=table, only=True)))
+        _build_partitioned_index(conn, spec, dim, table, model_index_name(spec, table))
+
+
+def _build_partitioned_index(conn, spec: str, dim: int, table: str, index: str):
+    for child, partitioned in partitions(conn, table):
+        # Partitions created after the parent index got a (generated-name) copy of it already
+        attached = conn.execute(text("""
+            SELECT c.relname, x.indisvalid FROM pg_inherits i
+            JOIN pg_index x ON x.indexrelid = i.inhrelid JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(:index) AND x.indrelid = to_regclass(:child)
+        """), {"index": index, "child": child}).fetchone()
+        if attached:
+            if partitioned and not attached[1]:
+                _build_partitioned_index(conn, spec, dim, child, attached[0])
+            continue
+        child_index = model_index_name(spec, child)
+        if partitioned:
+            conn.execute(text(model_index_sql(spec, dim, table=child, only=True)))
+            _build_partitioned_index(conn, spec, dim, child, child_index)
+        else:
+            conn.execute(text(model_index_sql(spec, dim, concurrently=True, table=child)))
+        conn.execute(text(f"ALTER INDEX {index} ATTACH PARTITION {child_index}"))
+
+
+def prepare_index(engine) -> Dict[str, Tuple[str, int]]:
+    """Idempotent schema setup for the API and loaders. Returns {space: (model spec, dim)}."""
+    with engine.begin() as conn:
+        seed = {space: (spec, get_embedding_dimension(spec)) for space, spec in configured_spaces().items()}
+        ensure_state_table(conn, seed)
+        spaces = read_spaces(conn)
+        default_spec = spaces[default_space()][0]
+        ensure_model_columns(conn, default_spec)
+        ensure_unique_rows(conn)
+        for spec, dim in set(spaces.values()):
+            conn.execute(text(model_index_sql(spec, dim)))
+        ensure_vector_types(conn)
+        layout = table_layout(conn)
+        if CANDIDATE_PARTITIONS != "none" and layout != CANDIDATE_PARTITIONS:
+            logging.warning(f"{CANDIDATES_TABLE} is partitioned by {layout}, not {CANDIDATE_PARTITIONS}; "
+                            f"run `python tenant_partitions.py --migrate`")
+    return spaces
+
+
+def read_spaces(conn) -> Dict[str, Tuple[str, int]]:
+    rows = conn.execute(text(f"SELECT space, model_name, dim FROM {STATE_TABLE} ORDER BY space")).fetchall()
+    return {row[0]: (row[1], row[2]) for row in rows}
+
+
+def set_active_model(conn, space: str, spec: str, dim: int):
+    conn.execute(text(f"""
+        INSERT INTO {STATE_TABLE} (space, model_name, dim, activated_at)
+        VALUES (:space, :model, :dim, now())
+        ON CONFLICT (space) DO UPDATE
+        SET model_name = EXCLUDED.model_name, dim = EXCLUDED.dim, activated_at = now()
+    """), {"space": space, "model": spec, "dim": dim})
+
+
+# --- Reads and writes ---
+def model_filter(spec: Optional[str] = None, alias: str = "", tenant: Optional[str] = None,
+                 tier: Optional[str] = None) -> str:
+    """
+    WHERE clause selecting one model's rows (of table `alias`, if given),
+    and one tenant's / tier's if `tenant` / `tier` is given. With a spec the
+    values are inlined, so a prepared (generic) plan still matches the model's
+    partial index and is pruned to the tenant's (and tier's) partition;
+    without one it binds :model_name and :model_revision.
+    """
+    prefix = f"{alias}." if alias else ""
+    scope = f" AND {prefix}tenant_id = {sql_literal(validate_tenant(tenant))}" if tenant is not None else ""
+    if tier is not None:
+        scope += f" AND {prefix}tier = {sql_literal(tier)}"
+    if spec is None:
+        return f"{prefix}model_name = :model_name AND {prefix}model_revision = :model_revision{scope}"
+    name, revision = split_model_spec(spec)
+    return f"{prefix}model_name = {sql_literal(name)} AND {prefix}model_revision = {sql_literal(revision)}{scope}"
+
+
+def _search_tier(include_archived: bool) -> Optional[str]:
+    return None if include_archived else HOT_TIER
+
+
+def search_sql(dim: int, where: str = "", spec: Optional[str] = None, tenant: str = DEFAULT_TENANT,
+               include_archived: bool = False) -> str:
+    """
+    Nearest-neighbour query over one model's vectors of a tenant (matches its partial index), hot
+    candidates only unless include_archived; rows are (id, content, L2 distance).
+    """
+    return f"""
+        SELECT candidate_id, content,
+               embedding::vector({int(dim)}) <-> CAST(:query_emb AS vector({int(dim)})) AS distance
+        FROM {CANDIDATES_TABLE}
+        WHERE {model_filter(spec, tenant=tenant, tier=_search_tier(include_archived))} {where}
+        ORDER BY distance
+        LIMIT :top_k
+    """
+
+
+def search_params(spec: str, query_emb, top_k: int) -> dict:
+    name, revision = split_model_spec(spec)
+    return {"model_name": name, "model_revision": revision,
+            "query_emb": Vector(query_emb), "top_k": top_k}
+
+
+def search(conn, spec: str, dim: int, query_emb, top_k: int, tenant: str = DEFAULT_TENANT,
+           include_archived: bool = False):
+    """Run search_sql() for one model as a per-connection prepared statement; the query vector binds as a vector."""
+    ensure_vector_types(conn)
+    return execute_prepared(conn, search_sql(dim, spec=spec, tenant=tenant, include_archived=include_archived), {
+        "query_emb": Vector(query_emb), "top_k": top_k,
+    }).fetchall()
+
+
+def batch_search_sql(dim: int, spec: str, tenant: str = DEFAULT_TENANT, include_archived: bool = False) -> str:
+    """
+    search_sql() for many query vectors in one statement; rows are
+    (query number from 1, candidate_id, content, L2 distance).
+
+    The queries arrive as two arrays (vectors and their top_k), so one prepared
+    statement serves every batch size; LATERAL runs an HNSW scan per query.
+    """
+    return f"""
+        SELECT q.ord, hit.candidate_id, hit.content, hit.distance
+        FROM unnest(CAST(:query_embs AS vector[]), CAST(:top_ks AS integer[])) WITH ORDINALITY AS q(emb, top_k, ord)
+        CROSS JOIN LATERAL (
+            SELECT candidate_id, content,
+                   embedding::vector({int(dim)}) <-> q.emb::vector({int(dim)}) AS distance
+            FROM {CANDIDATES_TABLE}
+            WHERE {model_filter(spec, tenant=tenant, tier=_search_tier(include_archived))}
+            ORDER BY distance
+            LIMIT q.top_k
+        ) hit
+        ORDER BY q.ord, hit.distance
+    """
+
+
+def batch_search(conn, spec: str, dim: int, query_embs, top_ks: List[int], tenant: str = DEFAULT_TENANT,
+                 include_archived: bool = False) -> List[list]:
+    """Rank several queries in one round trip; returns one list of (candidate_id, content, distance) rows per query."""
+    ensure_vector_types(conn)
+    results = [[] for _ in top_ks]
+    rows = execute_prepared(conn, batch_search_sql(dim, spec, tenant, include_archived), {
+        "query_embs": [Vector(emb) for emb in query_embs],
+        "top_ks": [int(k) for k in top_ks],
+    })
+    for ord_, cid, content, distance in rows:
+        results[ord_ - 1].append((cid, content, distance))
+    return results
+
+
+def similar_sql(dim: int, spec: str, tenant: str = DEFAULT_TENANT, include_archived: bool = False) -> str:
+    """
+    Nearest neighbours of a stored candidate vector (hot or archived),
+    excluding the candidate; rows are (id, content, L2 distance). The source
+    vector never leaves the database, so no model call is needed.
+    """
+    return f"""
+        SELECT hit.candidate_id, hit.content, hit.distance
+        FROM (
+            SELECT embedding::vector({int(dim)}) AS emb FROM {CANDIDATES_TABLE}
+            WHERE {model_filter(spec, tenant=tenant)} AND candidate_id = :candidate_id
+        ) src
+        CROSS JOIN LATERAL (
+            SELECT candidate_id, content,
+                   embedding::vector({int(dim)}) <-> src.emb AS distance
+            FROM {CANDIDATES_TABLE}
+            WHERE {model_filter(spec, tenant=tenant, tier=_search_tier(include_archived))}
+              AND candidate_id <> :candidate_id
+            ORDER BY distance
+            LIMIT :top_k
+        ) hit
+        ORDER BY hit.distance
+    """
+
+
+def similar(conn, spec: str, dim: int, candidate_id: str, top_k: int, tenant: str = DEFAULT_TENANT,
+            include_archived: bool = False):
+    """Run similar_sql(); None if the candidate has no vector for this model in the tenant (not indexed yet)."""
+    rows = execute_prepared(conn, similar_sql(dim, spec, tenant, include_archived),
+                            {"candidate_id": candidate_id, "top_k": top_k}).fetchall()
+    if rows:
+        return rows
+    indexed = conn.execute(text(f"""
+        SELECT 1 FROM {CANDIDATES_TABLE} WHERE {model_filter(spec, tenant=tenant)} AND candidate_id = :candidate_id
+    """), {"candidate_id": candidate_id}).scalar()
+    return rows if indexed else None
+
+
+def vectors_from_send(values) -> np.ndarray:
+    """Stack vector_send() values (uint16 dim, uint16 unused, big-endian float32s) into a float32 matrix."""
+    if not values:
+        return np.zeros((0, 0), dtype=np.float32)
+    data = b"".join(bytes(v)[4:] for v in values)
+    return np.frombuffer(data, dtype=">f4").reshape(len(values), -1).astype(np.float32)
+
+
+def iter_model_vectors(conn, spec: str, table: str = CANDIDATES_TABLE, id_column: str = "candidate_id",
+                       chunk_size: int = 8192, tenant: Optional[str] = None, tier: Optional[str] = None):
+    """
+    Yield (ids, float32 matrix) chunks of every vector one model has in
+    `table` (only the tenant's / tier's, if one is given).
+
+    Bulk reads go through vector_send(), pgvector's binary output function:
+    decoding it is a single np.frombuffer per chunk, about 3x faster than
+    parsing the text form row by row under psycopg2.
+    """
+    result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(text(f"""
+        SELECT {id_column}, vector_send(embedding) FROM {table} WHERE {model_filter(spec, tenant=tenant, tier=tier)}
+    """))
+    for chunk in result.partitions(chunk_size):
+        yield [row[0] for row in chunk], vectors_from_send([row[1] for row in chunk])
+
+
+def store_embeddings(conn, items: List[Tuple[str, Union[str, Dict[str, str]]]], specs: Iterable[str],
+                     guard: bool = False, batch_size: int = 64, tenants: Optional[Dict[str, str]] = None,
+                     tiers: Optional[Dict[str, str]] = None, indexed_at: Optional[Dict[str, object]] = None) -> int:
+    """
+    Embed (candidate_id, content) pairs with every model in `specs` and insert one row per model.
+    `content` is one text for every model, or {spec: text} to cut each model's
+    text to its own token budget (flatten_for_models()).
+
+    `tenants` maps candidate ids to their tenant (default DEFAULT_TENANT);
+    the tenants' partitions must exist (ensure_tenant_partitions()). `tiers`
+    and `indexed_at` carry an existing candidate's tier and age over to the
+    new rows (default: hot, now).
+
+    With guard=True the rows are only written if no active space uses a model
+    outside `specs`; 0 is returned if a reindex flipped a space in the meantime.
+    Rows a candidate already has for a model are left as they are.
+    """
+    specs = sorted(set(specs))
+    guard_sql = (f"WHERE NOT EXISTS (SELECT 1 FROM {STATE_TABLE} WHERE model_name <> ALL(:specs))"
+                 if guard else "")
+    inserted = 0
+    ensure_vector_types(conn)
+    for spec in specs:
+        name, revision = split_model_spec(spec)
+        contents = [content[spec] if isinstance(content, dict) else content for _, content in items]
+        embeddings = encode([content or "" for content in contents], batch_size=batch_size, model_name=spec)
+        result = conn.execute(text(f"""
+            INSERT INTO {CANDIDATES_TABLE}
+                (candidate_id, content, embedding, model_name, model_revision, embedding_dim, tenant_id, tier,
+                 indexed_at)
+            SELECT :cid, :content, CAST(:embedding AS vector), :model_name, :model_revision, :dim, :tenant, :tier,
+                   COALESCE(CAST(:indexed_at AS timestamptz), now())
+            {guard_sql}
+            ON CONFLICT DO NOTHING
+        """), [{"cid": cid, "content": content, "embedding": Vector(emb), "model_name": name,
+                "model_revision": revision, "dim": len(emb), "specs": specs,
+                "tenant": (tenants or {}).get(cid, DEFAULT_TENANT), "tier": (tiers or {}).get(cid, HOT_TIER),
+                "indexed_at": (indexed_at or {}).get(cid)}
+               for (cid, _), content, emb in zip(items, contents, embeddings)])
+        inserted += result.rowcount
+    return inserted
+
+
+class SpaceCache:
+    """Caches the space -> (model spec, dim) map for `ttl` seconds to keep it off the hot path."""
+
+    def __init__(self, engine, ttl: float = 5.0):
+        self.engine = engine
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._spaces: Dict[str, Tuple[str, int]] = {}
+        self._expires = 0.0
+
+    def all(self, refresh: bool = False) -> Dict[str, Tuple[str, int]]:
+        with self._lock:
+            if refresh or not self._spaces or time.monotonic() >= self._expires:
+                try:
+                    with self.engine.connect() as conn:
+                        self._spaces = read_spaces(conn) or self._spaces
+                except Exception as e:
+                    logging.warning(f"Could not read {STATE_TABLE}: {e}")
+                self._expires = time.monotonic() + self.ttl
+            return dict(self._spaces)
+
+    def get(self, space: str = None, refresh: bool = False) -> Tuple[str, int]:
+        spaces = self.all(refresh)
+        if space is None:
+            space = default_space()
+        if space not in spaces:
+            raise KeyError(space)
+        return spaces[space]
+
+    def models(self, refresh: bool = False) -> List[str]:
+        return sorted({spec for spec, _ in self.all(refresh).values()})
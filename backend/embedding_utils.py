@@ -1,60 +1,257 @@
+import hashlib
 import os
-from sentence_transformers import SentenceTransformer
-
-# Load model once
-_model = None
-def get_model():
-    global _model
-    if _model is None:
-        model_name = os.getenv("EMBEDDING_MODEL", "all-mpnet-base-v2")
-        _model = SentenceTransformer(model_name)
-    return _model
-
-def get_embedding(text: str):
-    model = get_model()
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# EMBEDDING_BACKEND=hash swaps the SentenceTransformer for HashEmbeddingModel,
+# which needs no model weights and loads instantly (tests and pipeline benchmarks).
+# Its vectors are stored as model 'hash:<dim>', never under a real model's name.
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class HashEmbeddingModel:
+    """
+    Deterministic stand-in for SentenceTransformer.
+
+    Each lower-cased word is hashed to a signed bucket (feature hashing), so the
+    vectors are stable across runs and texts sharing words still score as similar.
+    Output rows are L2-normalized, like the real model with normalization.
+    """
+
+    max_seq_length = None  # no truncation
+
+    def __init__(self, dim: int = 768):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def _encode_one(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for token in _TOKEN_RE.findall(text.lower()):
+            h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            vec[h % self.dim] += 1.0 if (h >> 63) else -1.0
+        norm = np.linalg.norm(vec)
+        if norm == 0:
+            vec[0] = 1.0  # empty text still gets a valid unit vector
+            return vec
+        return vec / norm
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs) -> np.ndarray:
+        if isinstance(sentences, str):
+            return self._encode_one(sentences)
+        if not sentences:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self._encode_one(s) for s in sentences])
+
+
+def default_model_name() -> str:
+    """Model name from the environment; the hash backend uses 'hash:<dim>'."""
+    if os.getenv("EMBEDDING_BACKEND", "sentence-transformers").lower() == "hash":
+        return f"hash:{int(os.getenv('EMBEDDING_DIM', '768'))}"
+    return os.getenv("EMBEDDING_MODEL", "all-mpnet-base-v2")
+
+def _load_model(model_name: str):
+    """Load a model spec: 'name', 'name@revision' or 'hash:<dim>'."""
+    if model_name.startswith("hash:"):
+        return HashEmbeddingModel(int(model_name.split(":", 1)[1]))
+    backend = os.getenv("EMBEDDING_BACKEND", "sentence-transformers").lower()
+    if backend == "hash":
+        # Hash vectors stored under a real model's name would be searched as that model's later
+        raise ValueError(f"EMBEDDING_BACKEND=hash can't stand in for {model_name!r}; "
+                         f"use 'hash:<dim>' model specs (EMBEDDING_SPACES, reindex targets) with it")
+    if backend == "sentence-transformers":
+        from sentence_transformers import SentenceTransformer
+        name, _, revision = model_name.partition("@")
+        return SentenceTransformer(name, revision=revision or None)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend!r} (expected 'sentence-transformers' or 'hash')")
+
+# Load each model once; several can be resident while an index is being rebuilt
+_models = {}
+def get_model(model_name: str = None):
+    model_name = model_name or default_model_name()
+    if model_name not in _models:
+        _models[model_name] = _load_model(model_name)
+    return _models[model_name]
+
+def get_embedding_dimension(model_name: str = None) -> int:
+    return get_model(model_name).get_sentence_embedding_dimension()
+
+def get_embedding(text: str, model_name: str = None):
+    model = get_model(model_name)
     return model.encode([text])[0].tolist()
 
-def flatten_candidate(candidate: dict) -> str:
+def encode(texts: list, batch_size: int = 64, model_name: str = None) -> np.ndarray:
+    """Encode many texts in model-sized batches into a float32 (n, dim) array; rows bind directly as vectors."""
+    model = get_model(model_name)
+    if not texts:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    return np.asarray(model.encode(list(texts), batch_size=batch_size), dtype=np.float32)
+
+def get_embeddings(texts: list, batch_size: int = 64, model_name: str = None):
+    """Encode many texts in model-sized batches (one forward pass per batch)."""
+    if not texts:
+        return []
+    return [emb.tolist() for emb in encode(texts, batch_size=batch_size, model_name=model_name)]
+
+# --- Flattening ---
+# English resume text averages about 4 characters per WordPiece/BPE token; the
+# budget is tracked in characters so flattening never runs a tokenizer. The
+# encoder tokenizes the text again anyway, and the estimate only decides which
+# low-priority line is cut; a tokenizer pass per document would double that work.
+CHARS_PER_TOKEN = float(os.getenv("FLATTEN_CHARS_PER_TOKEN", "4.0"))
+FLATTEN_MAX_TOKENS = os.getenv("FLATTEN_MAX_TOKENS")
+_MIN_PARTIAL_CHARS = 64  # don't end on a stub of a line shorter than this
+_budgets = {}
+
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / CHARS_PER_TOKEN + 0.5)
+
+
+def token_budget(model_name: str = None) -> Optional[int]:
+    """
+    Tokens the model actually reads: FLATTEN_MAX_TOKENS, else the model's
+    max_seq_length minus [CLS]/[SEP]. None means no limit (hash backend).
+    """
+    if FLATTEN_MAX_TOKENS:
+        return int(FLATTEN_MAX_TOKENS) or None
+    model_name = model_name or default_model_name()
+    if model_name.startswith("hash:"):
+        return None
+    # Resolved once per model: flattening runs for every candidate
+    if model_name not in _budgets:
+        limit = getattr(get_model(model_name), "max_seq_length", None)
+        _budgets[model_name] = limit - 2 if limit else None
+    return _budgets[model_name]
+
+
+def _items(values) -> str:
+    return ", ".join(filter(None, values or ()))
+
+
+def _joined(sep: str, *parts) -> str:
+    return sep.join(filter(None, parts))
+
+
+def _clause(*parts) -> str:
+    return ". ".join([p.rstrip(". ") for p in parts if p])
+
+
+def _section_lines(candidate: dict):
+    """(section, line) pairs in priority order; contact details, links, ids and empty values are left out."""
+    pi = candidate.get("personal_info") or {}
+    skills = candidate.get("skills") or {}
+    add = candidate.get("additional_info") or {}
+    if pi.get("full_name"):
+        yield "name", f"Name: {pi['full_name']}"
+    if pi.get("summary"):
+        yield "summary", f"Summary: {pi['summary']}"
+    if skills.get("technical"):
+        yield "skills", f"Technical Skills: {_items(skills['technical'])}"
+    for exp in candidate.get("experience") or []:
+        role = _joined(" at ", exp.get("job_title"), exp.get("company"))
+        line = _clause(role, "; ".join(filter(None, exp.get("responsibilities") or ())),
+                       f"Technologies: {_items(exp['technologies_used'])}" if exp.get("technologies_used") else "")
+        if line:
+            yield "experience", f"Experience: {line}"
+    for proj in candidate.get("projects") or []:
+        line = _clause(proj.get("project_name"), proj.get("description"),
+                       f"Technologies: {_items(proj['technologies'])}" if proj.get("technologies") else "")
+        if line:
+            yield "projects", f"Project: {line}"
+    for edu in candidate.get("education") or []:
+        line = _joined(" at ", _joined(" in ", edu.get("degree"), edu.get("major")), edu.get("university"))
+        if line:
+            yield "education", f"Education: {line}"
+    for cert in candidate.get("certifications") or []:
+        line = _joined(" by ", cert.get("name"), cert.get("issuing_organization"))
+        if line:
+            yield "certifications", f"Certification: {line}"
+    if pi.get("address"):
+        yield "location", f"Location: {pi['address']}"
+    if skills.get("soft"):
+        yield "skills", f"Soft Skills: {_items(skills['soft'])}"
+    if skills.get("languages"):
+        yield "skills", f"Languages: {_items(skills['languages'])}"
+    for ach in candidate.get("achievements") or []:
+        if ach:
+            yield "achievements", f"Achievement: {ach}"
+    for pub in candidate.get("publications") or []:
+        line = _joined(" in ", pub.get("title"), pub.get("journal"))
+        if line:
+            yield "publications", f"Publication: {line}"
+    for vol in add.get("volunteer_experience") or []:
+        line = _clause(_joined(" at ", vol.get("role"), vol.get("organization")), vol.get("description"))
+        if line:
+            yield "volunteer", f"Volunteer: {line}"
+    if add.get("interests"):
+        yield "interests", f"Interests: {_items(add['interests'])}"
+
+
+def candidate_sections(candidate: dict) -> List[Tuple[str, str]]:
+    """The candidate as (section, text) lines, most search-relevant first."""
+    return list(_section_lines(candidate))
+
+
+def flatten_candidate(candidate: dict, max_tokens: Optional[int] = -1) -> str:
     """
     Flatten the candidate schema into a single string for embedding.
+
+    Sections are written in priority order (summary, skills and experience
+    before education, certifications and interests) and stop at the token
+    budget, so what the model truncates is the least useful text rather than
+    the experience at the end. The default budget is token_budget() for the
+    default model; pass None for no limit.
     """
-    parts = []
-    pi = candidate.get("personal_info", {})
-    parts.append(f"Name: {pi.get('full_name','')}")
-    parts.append(f"Summary: {pi.get('summary','')}")
-    parts.append(f"Email: {pi.get('email','')}")
-    parts.append(f"Phone: {pi.get('phone','')}")
-    parts.append(f"LinkedIn: {pi.get('linkedin','')}")
-    parts.append(f"GitHub: {pi.get('github','')}")
-    parts.append(f"Portfolio: {pi.get('portfolio','')}")
-    parts.append(f"Address: {pi.get('address','')}")
-    # Education
-    for edu in candidate.get("education", []):
-        parts.append(f"Education: {edu.get('degree','')} in {edu.get('major','')} at {edu.get('university','')} ({edu.get('start_date','')} - {edu.get('end_date','')}) GPA: {edu.get('gpa','')}")
-    # Experience
-    for exp in candidate.get("experience", []):
-        parts.append(f"Experience: {exp.get('job_title','')} at {exp.get('company','')} ({exp.get('start_date','')} - {exp.get('end_date','')}) Responsibilities: {'; '.join(exp.get('responsibilities', []))} Technologies: {', '.join(exp.get('technologies_used', []))}")
-    # Projects
-    for proj in candidate.get("projects", []):
-        parts.append(f"Project: {proj.get('project_name','')} - {proj.get('description','')} Technologies: {', '.join(proj.get('technologies', []))} Link: {proj.get('link','')}")
-    # Skills
-    skills = candidate.get("skills", {})
-    parts.append(f"Technical Skills: {', '.join(skills.get('technical', []))}")
-    parts.append(f"Soft Skills: {', '.join(skills.get('soft', []))}")
-    parts.append(f"Languages: {', '.join(skills.get('languages', []))}")
-    # Certifications
-    for cert in candidate.get("certifications", []):
-        parts.append(f"Certification: {cert.get('name','')} by {cert.get('issuing_organization','')} ({cert.get('issue_date','')} - {cert.get('expiration_date','')}) Credential: {cert.get('credential_id','')} {cert.get('credential_url','')}")
-    # Achievements
-    for ach in candidate.get("achievements", []):
-        parts.append(f"Achievement: {ach}")
-    # Publications
-    for pub in candidate.get("publications", []):
-        parts.append(f"Publication: {pub.get('title','')} in {pub.get('journal','')} ({pub.get('date','')}) {pub.get('url','')}")
-    # Additional Info
-    add = candidate.get("additional_info", {})
-    for interest in add.get("interests", []):
-        parts.append(f"Interest: {interest}")
-    for vol in add.get("volunteer_experience", []):
-        parts.append(f"Volunteer: {vol.get('role','')} at {vol.get('organization','')} ({vol.get('start_date','')} - {vol.get('end_date','')}) {vol.get('description','')}")
-    return "\n".join(parts)
\ No newline at end of file
+    if max_tokens == -1:
+        max_tokens = token_budget()
+    return _fit([line for _, line in _section_lines(candidate)], max_tokens)
+
+
+def flatten_for_models(candidate: dict, model_names: Iterable[str]) -> Dict[str, str]:
+    """{model: the candidate flattened to that model's token_budget()}; models with the same budget share one text."""
+    by_budget: Dict[Optional[int], str] = {}
+    contents = {}
+    for model_name in model_names:
+        budget = token_budget(model_name)
+        if budget not in by_budget:
+            by_budget[budget] = flatten_candidate(candidate, budget)
+        contents[model_name] = by_budget[budget]
+    return contents
+
+
+def flatten_job(job: dict, max_tokens: Optional[int] = -1) -> str:
+    """
+    Flatten a job description for embedding, labelled like flatten_candidate()
+    lines so the two read alike to the model: title, skills and requirements
+    first, then the free-text description.
+    """
+    if max_tokens == -1:
+        max_tokens = token_budget()
+    title = _joined(" at ", job.get("title"), job.get("company"))
+    lines = [
+        f"Job Title: {title}" if title else "",
+        f"Technical Skills: {_items(job['skills'])}" if job.get("skills") else "",
+        *(f"Requirement: {req}" for req in job.get("requirements") or () if req),
+        f"Description: {job['description']}" if job.get("description") else "",
+        f"Location: {job['location']}" if job.get("location") else "",
+    ]
+    return _fit([line for line in lines if line], max_tokens)
+
+
+def _fit(lines: List[str], max_tokens: Optional[int]) -> str:
+    """Join lines, stopping at the token budget (None: no limit)."""
+    if max_tokens is None:
+        return "\n".join(lines)
+    remaining = int(max_tokens * CHARS_PER_TOKEN)
+    for i, line in enumerate(lines):
+        remaining -= len(line) + 1
+        if remaining < 0:
+            # Keep the head of the line that crosses the budget, cut at a word boundary
+            keep = len(line) + remaining
+            head = line[:keep].rsplit(" ", 1)[0] if keep >= _MIN_PARTIAL_CHARS else ""
+            return "\n".join(lines[:i] + ([head] if head else []))
+    return "\n".join(lines)
@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+Write-behind embedding for new candidates (transactional outbox).
+
+POST /candidates stores the resume and an outbox record in MongoDB and returns
+without touching the model or Postgres. The worker here drains the outbox in
+batches: it claims records with a lease, embeds the candidates with every
+model in use and writes their rows to `candidates`, then marks them indexed.
+Failures are retried with exponential backoff until OUTBOX_MAX_ATTEMPTS.
+
+With SECTION_INDEX=1 the candidates' section vectors are synced in the same
+transaction (see section_index.py); only sections whose text changed are
+re-embedded. New candidates are also matched against saved searches there,
+raising alerts (see saved_searches.py).
+
+Each candidate's rows go to its tenant's partition (`tenant_id` on the
+document, see embedding_index.py); partitions of new tenants are created in a
+short transaction of their own before the batch.
+
+Searches may run on read replicas (db.py); with PG_READ_YOUR_WRITES_S set,
+a candidate reported as indexed is found by searches in the same process
+even if the replicas haven't caught up yet.
+
+The API runs a worker thread by default (EMBEDDING_WORKER=1). To embed in a
+separate process instead, set EMBEDDING_WORKER=0 for the API and run:
+  python embedding_worker.py                  # poll forever
+  python embedding_worker.py --once           # drain what's due and exit
+  python embedding_worker.py --retry-failed   # requeue failed records first
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+from sqlalchemy import text
+
+from candidate_dedup import DEDUP_POLICY, DEDUP_SIMILARITY, merge_into, near_duplicates, with_dedup_keys
+from db import note_write
+from embedding_index import CANDIDATES_TABLE, document_tenant, ensure_tenant_partitions, store_embeddings
+from embedding_utils import flatten_for_models
+from saved_searches import SAVED_SEARCH_ALERTS, SavedSearchCache, evaluate_new_candidates
+from section_index import SECTION_INDEX, SECTIONS_TABLE, delete_sections, sync_sections
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
+
+MONGO_OUTBOX_COLLECTION = os.getenv("MONGO_OUTBOX_COLLECTION", "embedding_outbox")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "64"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1.0"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "2"))
+OUTBOX_RETRY_MAX_SECONDS = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "300"))
+# A record without its document is dropped only once it is this old: without transactions the
+# document is inserted right after the record, and a worker may claim the record in between
+OUTBOX_ORPHAN_GRACE_SECONDS = float(os.getenv("OUTBOX_ORPHAN_GRACE_SECONDS", str(3 * OUTBOX_LEASE_SECONDS)))
+
+PENDING, PROCESSING, INDEXED, FAILED = "pending", "processing", "indexed", "failed"
+DUPLICATE = "duplicate"  # near duplicate of another candidate; see candidate_dedup.py
+
+# Standalone mongod has no transactions (error code 20); remembered after the first attempt
+_transactions_supported: Optional[bool] = None
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _mongo_key(candidate_id: str):
+    return ObjectId(candidate_id) if ObjectId.is_valid(candidate_id) else candidate_id
+
+
+def ensure_outbox_indexes(outbox_col):
+    outbox_col.create_index([("status", ASCENDING), ("next_attempt_at", ASCENDING)])
+    outbox_col.create_index([("lease_id", ASCENDING)], sparse=True)
+
+
+def enqueue_candidate(mongo_client, candidates_col, outbox_col, candidate: dict) -> str:
+    """
+    Store a candidate and its outbox record atomically; returns the new id.
+
+    Uses a multi-document transaction where the deployment supports one
+    (replica sets, Atlas). Otherwise the outbox record is written first, so a
+    stored document always has one; a record whose document insert failed is
+    removed again. A worker that claims a record before its document exists
+    retries it later, and drops it only after OUTBOX_ORPHAN_GRACE_SECONDS.
+    """
+    global _transactions_supported
+    candidate = dict(candidate)
+    candidate["_id"] = ObjectId()
+    now = _now()
+    record = {"_id": candidate["_id"], "status": PENDING, "attempts": 0, "tenant_id": document_tenant(candidate),
+              "created_at": now, "updated_at": now, "next_attempt_at": now}
+
+    if _transactions_supported is not False:
+        try:
+            with mongo_client.start_session() as session:
+                session.with_transaction(lambda s: (
+                    candidates_col.insert_one(candidate, session=s),
+                    outbox_col.insert_one(record, session=s),
+                ))
+            _transactions_supported = True
+            return str(candidate["_id"])
+        except OperationFailure as e:
+            if e.code != 20:  # IllegalOperation: transactions need a replica set
+                raise
+            logging.info("MongoDB has no transaction support; writing the outbox record first")
+            _transactions_supported = False
+
+    outbox_col.insert_one(record)
+    try:
+        candidates_col.insert_one(candidate)
+    except Exception:
+        outbox_col.delete_one({"_id": record["_id"]})
+        raise
+    return str(candidate["_id"])
+
+
+def requeue_candidates(outbox_col, candidate_ids: List[str]):
+    """(Re-)embed existing candidates, e.g. after their document changed."""
+    now = _now()
+    for candidate_id in candidate_ids:
+        outbox_col.update_one(
+            {"_id": _mongo_key(candidate_id)},
+            {"$set": {"status": PENDING, "attempts": 0, "updated_at": now, "next_attempt_at": now},
+             "$unset": {"lease_id": "", "lease_expires": "", "duplicate_of": "", "similarity": "",
+                        "missing_checks": ""},
+             "$setOnInsert": {"created_at": now}},
+            upsert=True,
+        )
+
+
+def indexing_status(outbox_col, candidate_id: str, tenant: Optional[str] = None) -> Optional[dict]:
+    """Outbox state of one candidate (of `tenant`, if given), or None if it never went through the outbox."""
+    record = outbox_col.find_one({"_id": _mongo_key(candidate_id)})
+    if not record or (tenant is not None and document_tenant(record) != tenant):
+        return None
+    status = {
+        "id": candidate_id,
+        "status": record["status"],
+        "attempts": record.get("attempts", 0),
+        "last_error": record.get("last_error"),
+        "created_at": record.get("created_at"),
+        "indexed_at": record.get("indexed_at"),
+        "next_attempt_at": record.get("next_attempt_at") if record["status"] == PENDING else None,
+    }
+    if record["status"] == DUPLICATE:
+        status.update(duplicate_of=record.get("duplicate_of"), similarity=record.get("similarity"),
+                      merged=record.get("merged", False))
+    return status
+
+
+def outbox_counts(outbox_col) -> dict:
+    """Number of outbox records per status."""
+    counts = {PENDING: 0, PROCESSING: 0, INDEXED: 0, FAILED: 0, DUPLICATE: 0}
+    for row in outbox_col.aggregate([{"$group": {"_id": "$status", "n": {"$sum": 1}}}]):
+        counts[row["_id"]] = row["n"]
+    return counts
+
+
+def retry_failed(outbox_col) -> int:
+    now = _now()
+    return outbox_col.update_many(
+        {"status": FAILED},
+        {"$set": {"status": PENDING, "attempts": 0, "next_attempt_at": now, "updated_at": now}},
+    ).modified_count
+
+
+def _due(now: datetime) -> dict:
+    return {"$or": [
+        {"status": PENDING, "next_attempt_at": {"$lte": now}},
+        {"status": PROCESSING, "lease_expires": {"$lt": now}},  # worker died mid-batch
+    ]}
+
+
+def _backoff(attempts: int) -> float:
+    return min(OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1), OUTBOX_RETRY_MAX_SECONDS)
+
+
+class _ModelsChanged(Exception):
+    pass
+
+
+def index_candidates(engine, spaces, items: List[tuple], on_stored=None, tenants: Optional[Dict[str, str]] = None):
+    """
+    Replace the rows of (candidate_id, document) pairs for every model in use.
+
+    Each model embeds the document flattened to its own token budget, so a
+    space flipped to a model with a longer context gets the longer text.
+
+    Deleting first makes a retried batch idempotent; the new rows keep the
+    tier and `indexed_at` of the deleted ones, so re-indexing an archived
+    candidate leaves it archived. The guarded insert writes nothing if a
+    reindex flipped a space meanwhile; refresh the models and retry.
+    `on_stored(conn, ids)` runs in the same transaction, after the insert.
+    `tenants` maps candidate ids to their tenant (default DEFAULT_TENANT).
+    """
+    ids = [cid for cid, _ in items]
+    if tenants:
+        with engine.begin() as conn:
+            for table in (CANDIDATES_TABLE, SECTIONS_TABLE):
+                ensure_tenant_partitions(conn, set(tenants.values()), table)
+    for refresh in (False, True):
+        try:
+            with engine.begin() as conn:
+                deleted = conn.execute(text(f"""
+                    DELETE FROM {CANDIDATES_TABLE} WHERE candidate_id = ANY(:ids) RETURNING candidate_id, tier, indexed_at
+                """), {"ids": ids}).fetchall()
+                tiers = {cid: tier for cid, tier, _ in deleted}
+                indexed_at = {cid: at for cid, _, at in deleted if at is not None}
+                specs = spaces.models(refresh=refresh)
+                contents = [(cid, flatten_for_models(doc, specs)) for cid, doc in items]
+                if not store_embeddings(conn, contents, specs, guard=True, tenants=tenants,
+                                        tiers=tiers, indexed_at=indexed_at):
+                    raise _ModelsChanged()
+                if on_stored:
+                    on_stored(conn, ids)
+            return
+        except _ModelsChanged:
+            continue
+    raise RuntimeError("Embedding models changed twice during insert")
+
+
+class EmbeddingWorker:
+    """Drains the embedding outbox, on a background thread or in the foreground via run()."""
+
+    def __init__(self, outbox_col, candidates_col, engine, spaces,
+                 batch_size: int = OUTBOX_BATCH_SIZE, poll_interval: float = OUTBOX_POLL_INTERVAL,
+                 max_attempts: int = OUTBOX_MAX_ATTEMPTS, lease_seconds: float = OUTBOX_LEASE_SECONDS):
+        self.outbox_col = outbox_col
+        self.candidates_col = candidates_col
+        self.engine = engine
+        self.spaces = spaces
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.saved_searches = SavedSearchCache(engine, spaces)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- Lifecycle ---
+    def start(self):
+        ensure_outbox_indexes(self.outbox_col)
+        self._thread = threading.Thread(target=self.run, name="embedding-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def notify(self):
+        """Skip the rest of the poll interval; called after enqueueing."""
+        self._wake.set()
+
+    def run(self):
+        logging.info("Embedding worker started")
+        while not self._stop.is_set():
+            try:
+                if self.drain_once():
+                    continue
+            except Exception as e:
+                logging.error(f"Embedding worker error: {e}", exc_info=True)
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+        logging.info("Embedding worker stopped")
+
+    # --- Batches ---
+    def claim(self) -> List[dict]:
+        """Lease up to batch_size due records. Concurrent workers never claim the same record."""
+        now = _now()
+        ids = [r["_id"] for r in self.outbox_col.find(_due(now), {"_id": 1})
+               .sort("next_attempt_at", ASCENDING).limit(self.batch_size)]
+        if not ids:
+            return []
+        lease_id = uuid.uuid4().hex
+        self.outbox_col.update_many(
+            {"_id": {"$in": ids}, **_due(now)},
+            {"$set": {"status": PROCESSING, "lease_id": lease_id, "updated_at": now,
+                      "lease_expires": now + timedelta(seconds=self.lease_seconds)}},
+        )
+        return list(self.outbox_col.find({"lease_id": lease_id, "status": PROCESSING}))
+
+    def drain_once(self) -> int:
+        """Process one batch; returns the number of records claimed."""
+        records = self.claim()
+        if not records:
+            return 0
+        docs = {doc["_id"]: doc for doc in self.candidates_col.find({"_id": {"$in": [r["_id"] for r in records]}})}
+        missing = [r for r in records if r["_id"] not in docs]
+        if missing:
+            self._release_missing(missing)
+        records = [r for r in records if r["_id"] in docs]
+        if not records:
+            return len(missing)
+
+        items = [(str(r["_id"]), docs[r["_id"]]) for r in records]
+        tenants = {str(r["_id"]): document_tenant(docs[r["_id"]]) for r in records}
+        near = {}
+        alerts = {"raised": 0}
+        check_near = DEDUP_POLICY != "off" and DEDUP_SIMILARITY > 0
+        if check_near or SECTION_INDEX or SAVED_SEARCH_ALERTS:
+            def on_stored(conn, ids):
+                found = {}
+                if check_near:
+                    # Near duplicates stay out of search: drop their rows before the batch commits
+                    spec, dim = self.spaces.get()
+                    found = near_duplicates(conn, ids, spec, dim)
+                    if found:
+                        conn.execute(text(f"DELETE FROM {CANDIDATES_TABLE} WHERE candidate_id = ANY(:ids)"),
+                                     {"ids": list(found)})
+                    near.update(found)
+                if SECTION_INDEX:
+                    if found:
+                        delete_sections(conn, list(found))
+                    sync_sections(conn, {cid: docs[by_id[cid]["_id"]] for cid in ids if cid not in found},
+                                  self.spaces.models())
+                if SAVED_SEARCH_ALERTS:
+                    # Near duplicates don't alert: the recruiter already has the original
+                    alerts["raised"] += evaluate_new_candidates(
+                        conn, self.saved_searches, {cid: docs[by_id[cid]["_id"]] for cid in ids if cid not in found})
+        else:
+            on_stored = None
+
+        by_id = {str(r["_id"]): r for r in records}
+        try:
+            index_candidates(self.engine, self.spaces, items, on_stored, tenants)
+            indexed = [cid for cid, _ in items]
+        except Exception as e:
+            if len(records) == 1:
+                self._mark_failed(records[0], e)
+                return 1 + len(missing)
+            # Retry one by one so a single bad candidate doesn't hold back the batch
+            logging.warning(f"Batch of {len(records)} failed ({e}); retrying individually")
+            # What on_stored found was rolled back with the batch
+            near.clear()
+            alerts["raised"] = 0
+            indexed = []
+            for item in items:
+                raised = alerts["raised"]
+                try:
+                    index_candidates(self.engine, self.spaces, [item], on_stored, tenants)
+                    indexed.append(item[0])
+                except Exception as item_error:
+                    near.pop(item[0], None)
+                    alerts["raised"] = raised
+                    self._mark_failed(by_id[item[0]], item_error)
+        if indexed:
+            note_write()  # searches right after "indexed" read from a replica that has the rows (PG_READ_YOUR_WRITES_S)
+        for cid in indexed:
+            if cid in near:
+                self._resolve_near_duplicate(by_id[cid], docs[by_id[cid]["_id"]], *near[cid])
+        self._mark_indexed([by_id[cid] for cid in indexed if cid not in near])
+        logging.info(f"Embedded {len(indexed)}/{len(records)} candidate(s) from the outbox"
+                     + (f", {len(near)} near duplicate(s)" if near else "")
+                     + (f", {alerts['raised']} saved-search alert(s)" if alerts["raised"] else ""))
+        return len(records) + len(missing)
+
+    def _release_missing(self, records: List[dict]):
+        """
+        Handle claimed records whose document doesn't exist (yet).
+
+        Without transactions the record is written before its document, so a
+        fresh one is only early: release it and look again later. Records
+        older than OUTBOX_ORPHAN_GRACE_SECONDS are left over from a failed
+        document insert and are dropped.
+        """
+        now = _now()
+        ids = [r["_id"] for r in records]
+        leases = [r["lease_id"] for r in records]
+        dropped = self.outbox_col.delete_many({
+            "_id": {"$in": ids}, "lease_id": {"$in": leases},
+            "created_at": {"$lt": now - timedelta(seconds=OUTBOX_ORPHAN_GRACE_SECONDS)},
+        }).deleted_count
+        if dropped:
+            logging.warning(f"Dropped {dropped} outbox record(s) without a candidate document")
+        for record in records:
+            checks = record.get("missing_checks", 0) + 1
+            # Not counted as an attempt: the candidate hasn't failed, its document isn't there yet
+            self.outbox_col.update_one(
+                {"_id": record["_id"], "lease_id": record["lease_id"]},
+                {"$set": {"status": PENDING, "missing_checks": checks, "updated_at": now,
+                          "next_attempt_at": now + timedelta(seconds=_backoff(checks))},
+                 "$unset": {"lease_id": "", "lease_expires": ""}},
+            )
+
+    def _resolve_near_duplicate(self, record: dict, doc: dict, other_id: str, similarity: float):
+        """Apply DEDUP_POLICY to a candidate whose rows were dropped as a near duplicate of `other_id`."""
+        if DEDUP_POLICY == "merge":
+            # Release the new document's identity keys first: the existing candidate takes them over
+            self.candidates_col.update_one({"_id": doc["_id"]}, {"$unset": {"dedup_keys": ""}})
+            merge_into(self.candidates_col, other_id, with_dedup_keys(doc))
+            self.candidates_col.delete_one({"_id": doc["_id"]})
+            requeue_candidates(self.outbox_col, [other_id])
+        else:
+            self.candidates_col.update_one({"_id": doc["_id"]}, {"$set": {"duplicate_of": other_id}})
+        self.outbox_col.update_one(
+            {"_id": record["_id"], "lease_id": record["lease_id"]},
+            {"$set": {"status": DUPLICATE, "duplicate_of": other_id, "similarity": similarity,
+                      "merged": DEDUP_POLICY == "merge", "updated_at": _now()},
+             "$unset": {"lease_id": "", "lease_expires": ""}},
+        )
+        logging.info(f"Candidate {record['_id']} is a near duplicate of {other_id} "
+                     f"(similarity {similarity}); policy: {DEDUP_POLICY}")
+
+    def _mark_indexed(self, records: List[dict]):
+        if not records:
+            return
+        now = _now()
+        for lease_id in {r["lease_id"] for r in records}:
+            self.outbox_col.update_many(
+                {"_id": {"$in": [r["_id"] for r in records if r["lease_id"] == lease_id]}, "lease_id": lease_id},
+                {"$set": {"status": INDEXED, "indexed_at": now, "updated_at": now, "last_error": None},
+                 "$unset": {"lease_id": "", "lease_expires": ""}},
+            )
+
+    def _mark_failed(self, record: dict, error: Exception):
+        attempts = record.get("attempts", 0) + 1
+        now = _now()
+        update = {"attempts": attempts, "last_error": str(error)[:500], "updated_at": now}
+        if attempts >= self.max_attempts:
+            update["status"] = FAILED
+            logging.error(f"Giving up on candidate {record['_id']} after {attempts} attempts: {error}")
+        else:
+            update["status"] = PENDING
+            update["next_attempt_at"] = now + timedelta(seconds=_backoff(attempts))
+            logging.warning(f"Embedding candidate {record['_id']} failed (attempt {attempts}): {error}")
+        self.outbox_col.update_one(
+            {"_id": record["_id"], "lease_id": record["lease_id"]},
+            {"$set": update, "$unset": {"lease_id": "", "lease_expires": ""}},
+        )
+
+
+def main(argv=None):
+    from db import get_engine, get_mongo_db, prewarm
+    from embedding_index import SpaceCache, prepare_index
+    from saved_searches import prepare_searches
+    from section_index import prepare_sections
+
+    parser = argparse.ArgumentParser(description="Drain the candidate embedding outbox.")
+    parser.add_argument("--once", action="store_true", help="process everything due, then exit")
+    parser.add_argument("--retry-failed", action="store_true", help="requeue records that exhausted their retries")
+    parser.add_argument("--batch-size", type=int, default=OUTBOX_BATCH_SIZE)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    mongo_db = get_mongo_db()
+    outbox_col = mongo_db[MONGO_OUTBOX_COLLECTION]
+    candidates_col = mongo_db[os.getenv("MONGO_CANDIDATES_COLLECTION", "resumes")]
+    engine = get_engine()
+    prewarm()
+    prepare_index(engine)
+    if SECTION_INDEX:
+        prepare_sections(engine)
+    prepare_searches(engine)
+    ensure_outbox_indexes(outbox_col)
+
+    if args.retry_failed:
+        logging.info(f"Requeued {retry_failed(outbox_col)} failed record(s)")
+    worker = EmbeddingWorker(outbox_col, candidates_col, engine,
+                             SpaceCache(engine, ttl=float(os.getenv("EMBEDDING_STATE_TTL", "5"))),
+                             batch_size=args.batch_size)
+    if args.once:
+        started = time.perf_counter()
+        total = 0
+        while n := worker.drain_once():
+            total += n
+        logging.info(f"Processed {total} record(s) in {time.perf_counter() - started:,.1f}s; "
+                     f"outbox: {outbox_counts(outbox_col)}")
+        return
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
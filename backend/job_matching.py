@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Job descriptions matched against the whole candidate pool.
+
+Jobs are stored in MongoDB (`jobs`) and embedded once per model into
+`job_embeddings`, like candidates: each row keeps the sha1 of the flattened
+text, so only new or edited jobs are embedded again.
+
+match_jobs() scores many jobs in one pass. Candidate vectors are streamed
+from `candidates` in chunks; each chunk is one (jobs x candidates) matrix
+multiply, and a running top-k per job is kept with argpartition. The ranked
+shortlists are written to `job_shortlists`, one row per job and rank, so the
+UI reads a job's shortlist with one indexed query instead of searching again.
+A job (`tenant_id`, like candidates) is only matched against its own tenant's
+candidates, and only hot ones unless archived candidates are included
+(candidate_archive.py); shortlisted candidates count as matched.
+
+  python job_matching.py --all                 # every open job
+  python job_matching.py --job <id> --job <id> --top-k 100
+  python job_matching.py --all --tenant acme   # one tenant's open jobs
+  python job_matching.py --all --include-archived
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from candidate_archive import prepare_archive, touch
+from db import Vector
+from embedding_index import (
+    HOT_TIER,
+    default_space,
+    document_tenant,
+    iter_model_vectors,
+    model_filter,
+    read_spaces,
+    split_model_spec,
+    tenant_query,
+    vectors_from_send,
+)
+from embedding_utils import encode, flatten_job
+from section_index import content_hash
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
+
+MONGO_JOBS_COLLECTION = os.getenv("MONGO_JOBS_COLLECTION", "jobs")
+JOB_EMBEDDINGS_TABLE = "job_embeddings"
+JOB_SHORTLISTS_TABLE = "job_shortlists"
+# Candidates kept per job
+JOB_SHORTLIST_SIZE = int(os.getenv("JOB_SHORTLIST_SIZE", "50"))
+# Candidate vectors scored per matrix multiply; memory is about chunk x dim x 4 bytes
+JOB_MATCH_CHUNK_SIZE = int(os.getenv("JOB_MATCH_CHUNK_SIZE", "8192"))
+
+
+def job_query(job_id: str) -> dict:
+    """MongoDB filter for a job id (ObjectId hex or a string id)."""
+    return {"_id": ObjectId(job_id)} if ObjectId.is_valid(job_id) else {"_id": job_id}
+
+
+# --- Schema ---
+def ensure_job_tables(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {JOB_EMBEDDINGS_TABLE} (
+            job_id TEXT NOT NULL,
+            content TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            embedding vector NOT NULL,
+            model_name TEXT NOT NULL,
+            model_revision TEXT NOT NULL DEFAULT '',
+            embedding_dim INTEGER NOT NULL,
+            PRIMARY KEY (model_name, model_revision, job_id)
+        )
+    """))
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {JOB_SHORTLISTS_TABLE} (
+            job_id TEXT NOT NULL,
+            rank INTEGER NOT NULL,
+            candidate_id TEXT NOT NULL,
+            distance DOUBLE PRECISION NOT NULL,
+            model_name TEXT NOT NULL,
+            model_revision TEXT NOT NULL DEFAULT '',
+            computed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (job_id, rank)
+        )
+    """))
+
+
+def prepare_jobs(engine):
+    """Idempotent schema setup; call after embedding_index.prepare_index()."""
+    with engine.begin() as conn:
+        ensure_job_tables(conn)
+
+
+# --- Writes ---
+def embed_jobs(conn, jobs: Dict[str, dict], specs: Iterable[str], batch_size: int = 64) -> int:
+    """Embed {job_id: document} with every model in `specs`, skipping jobs whose text is unchanged. Returns rows written."""
+    texts = {job_id: flatten_job(job) for job_id, job in jobs.items()}
+    hashes = {job_id: content_hash(content) for job_id, content in texts.items()}
+    written = 0
+    for spec in sorted(set(specs)):
+        name, revision = split_model_spec(spec)
+        current = dict(conn.execute(text(f"""
+            SELECT job_id, content_hash FROM {JOB_EMBEDDINGS_TABLE}
+            WHERE model_name = :model_name AND model_revision = :model_revision AND job_id = ANY(:ids)
+        """), {"model_name": name, "model_revision": revision, "ids": list(jobs)}).fetchall())
+        stale = [job_id for job_id in jobs if current.get(job_id) != hashes[job_id]]
+        if not stale:
+            continue
+        embeddings = encode([texts[job_id] for job_id in stale], batch_size=batch_size, model_name=spec)
+        conn.execute(text(f"""
+            INSERT INTO {JOB_EMBEDDINGS_TABLE}
+                (job_id, content, content_hash, embedding, model_name, model_revision, embedding_dim)
+            VALUES (:job_id, :content, :hash, CAST(:embedding AS vector), :model_name, :model_revision, :dim)
+            ON CONFLICT (model_name, model_revision, job_id) DO UPDATE
+            SET content = EXCLUDED.content, content_hash = EXCLUDED.content_hash,
+                embedding = EXCLUDED.embedding, embedding_dim = EXCLUDED.embedding_dim
+        """), [{"job_id": job_id, "content": texts[job_id], "hash": hashes[job_id], "embedding": Vector(emb),
+                "model_name": name, "model_revision": revision, "dim": len(emb)}
+               for job_id, emb in zip(stale, embeddings)])
+        written += len(stale)
+    return written
+
+
+def save_shortlists(conn, spec: str, shortlists: Dict[str, List[Tuple[str, float]]]):
+    """Replace the stored shortlist of every job in `shortlists`."""
+    if not shortlists:
+        return
+    name, revision = split_model_spec(spec)
+    conn.execute(text(f"DELETE FROM {JOB_SHORTLISTS_TABLE} WHERE job_id = ANY(:ids)"), {"ids": list(shortlists)})
+    rows = [{"job_id": job_id, "rank": rank, "candidate_id": cid, "distance": distance,
+             "model_name": name, "model_revision": revision}
+            for job_id, matches in shortlists.items() for rank, (cid, distance) in enumerate(matches)]
+    if rows:
+        conn.execute(text(f"""
+            INSERT INTO {JOB_SHORTLISTS_TABLE} (job_id, rank, candidate_id, distance, model_name, model_revision)
+            VALUES (:job_id, :rank, :candidate_id, :distance, :model_name, :model_revision)
+        """), rows)
+
+
+def delete_job(conn, job_id: str):
+    conn.execute(text(f"DELETE FROM {JOB_EMBEDDINGS_TABLE} WHERE job_id = :job_id"), {"job_id": job_id})
+    conn.execute(text(f"DELETE FROM {JOB_SHORTLISTS_TABLE} WHERE job_id = :job_id"), {"job_id": job_id})
+
+
+# --- Scoring ---
+def job_vectors(conn, spec: str, job_ids: List[str]) -> Tuple[List[str], np.ndarray]:
+    """(job ids, float32 matrix) of the jobs that have a vector for this model."""
+    rows = conn.execute(text(f"""
+        SELECT job_id, vector_send(embedding) FROM {JOB_EMBEDDINGS_TABLE}
+        WHERE {model_filter(spec)} AND job_id = ANY(:ids)
+    """), {"ids": list(job_ids)}).fetchall()
+    return [row[0] for row in rows], vectors_from_send([row[1] for row in rows])
+
+
+def top_k_matches(jobs: np.ndarray, chunks, top_k: int) -> List[List[Tuple[str, float]]]:
+    """
+    The top_k nearest candidates (L2, like the search endpoints) of every job row.
+
+    `chunks` yields (candidate ids, float32 matrix). ||c - j||^2 = ||c||^2 -
+    2 c.j + ||j||^2: the first two terms are one matrix multiply per chunk,
+    and ||j||^2 doesn't change a job's ranking, so it's added at the end.
+    """
+    n_jobs = len(jobs)
+    best = np.zeros((n_jobs, 0), dtype=np.float32)
+    best_pos = np.zeros((n_jobs, 0), dtype=np.int64)
+    ids: List[str] = []
+    for chunk_ids, cands in chunks:
+        if not chunk_ids or not n_jobs:
+            continue
+        scores = np.einsum("ij,ij->i", cands, cands)[None, :] - 2.0 * (jobs @ cands.T)
+        positions = np.broadcast_to(np.arange(len(ids), len(ids) + len(chunk_ids)), scores.shape)
+        ids.extend(chunk_ids)
+        scores = np.concatenate([best, scores], axis=1)
+        positions = np.concatenate([best_pos, positions], axis=1)
+        if scores.shape[1] > top_k:
+            keep = np.argpartition(scores, top_k - 1, axis=1)[:, :top_k]
+            scores = np.take_along_axis(scores, keep, axis=1)
+            positions = np.take_along_axis(positions, keep, axis=1)
+        best, best_pos = scores, positions
+
+    order = np.argsort(best, axis=1)
+    best = np.take_along_axis(best, order, axis=1)
+    best_pos = np.take_along_axis(best_pos, order, axis=1)
+    distances = np.sqrt(np.maximum(best + np.einsum("ij,ij->i", jobs, jobs)[:, None], 0.0))
+    return [[(ids[p], float(d)) for p, d in zip(row_pos, row_dist)] for row_pos, row_dist in zip(best_pos, distances)]
+
+
+def match_jobs(engine, jobs_col, job_ids: Optional[List[str]] = None, space: Optional[str] = None,
+               top_k: int = JOB_SHORTLIST_SIZE, chunk_size: int = JOB_MATCH_CHUNK_SIZE,
+               tenant: Optional[str] = None, include_archived: bool = False) -> dict:
+    """
+    Score jobs (default: every open job; only `tenant`'s if given) against all
+    hot (or, with include_archived, all) candidates of their tenant for the
+    space's model and persist their shortlists. Each tenant's candidates are
+    streamed once, from its own partition. Returns counts and timings.
+    """
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        spaces = read_spaces(conn)
+    spec, _ = spaces[space or default_space()]
+
+    query = {"_id": {"$in": [job_query(j)["_id"] for j in job_ids]}} if job_ids else {"status": "open"}
+    if tenant is not None:
+        query = {**query, **tenant_query(tenant)}
+    jobs = {str(doc["_id"]): doc for doc in jobs_col.find(query)}
+    with engine.begin() as conn:
+        embedded = embed_jobs(conn, jobs, [spec]) if jobs else 0
+    by_tenant: Dict[str, List[str]] = {}
+    for job_id, doc in jobs.items():
+        by_tenant.setdefault(document_tenant(doc), []).append(job_id)
+
+    shortlists = {}
+    counted = {"candidates": 0}
+    loaded = time.perf_counter()
+    with engine.connect() as conn:
+        for job_tenant, tenant_job_ids in sorted(by_tenant.items()):
+            ids, matrix = job_vectors(conn, spec, tenant_job_ids)
+
+            def chunks():
+                for chunk in iter_model_vectors(conn, spec, chunk_size=chunk_size, tenant=job_tenant,
+                                                tier=None if include_archived else HOT_TIER):
+                    counted["candidates"] += len(chunk[0])
+                    yield chunk
+
+            if ids:
+                shortlists.update(zip(ids, top_k_matches(matrix, chunks(), top_k)))
+            conn.rollback()  # end the streaming read before the next tenant and before writing
+    scored = time.perf_counter()
+    with engine.begin() as conn:
+        save_shortlists(conn, spec, shortlists)
+        for job_tenant, tenant_job_ids in by_tenant.items():
+            touch(conn, job_tenant, {cid for job_id in tenant_job_ids for cid, _ in shortlists.get(job_id, [])})
+    return {"model": spec, "jobs": len(shortlists), "embedded": embedded, "candidates": counted["candidates"],
+            "top_k": top_k, "score_ms": round((scored - loaded) * 1000, 1),
+            "total_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
+# --- Reads ---
+def read_shortlist(conn, job_id: str, limit: int = JOB_SHORTLIST_SIZE):
+    """Stored (candidate_id, distance, model spec, computed_at) rows of a job, best first."""
+    rows = conn.execute(text(f"""
+        SELECT candidate_id, distance, model_name, model_revision, computed_at FROM {JOB_SHORTLISTS_TABLE}
+        WHERE job_id = :job_id ORDER BY rank LIMIT :limit
+    """), {"job_id": job_id, "limit": limit}).fetchall()
+    return [(row[0], row[1], f"{row[2]}@{row[3]}" if row[3] else row[2], row[4]) for row in rows]
+
+
+def main(argv=None):
+    from db import get_engine, get_mongo_db
+    from embedding_index import prepare_index
+
+    parser = argparse.ArgumentParser(description="Score job descriptions against all candidates.")
+    parser.add_argument("--all", action="store_true", help="every open job")
+    parser.add_argument("--job", action="append", default=[], help="job id (repeatable)")
+    parser.add_argument("--top-k", type=int, default=JOB_SHORTLIST_SIZE, help="candidates kept per job")
+    parser.add_argument("--space", default=None, help="search space whose model is used (default: the default space)")
+    parser.add_argument("--chunk-size", type=int, default=JOB_MATCH_CHUNK_SIZE, help="candidate vectors per matrix multiply")
+    parser.add_argument("--tenant", default=None, help="only this tenant's jobs (default: every tenant)")
+    parser.add_argument("--include-archived", action="store_true", help="also match archived candidates")
+    args = parser.parse_args(argv)
+    if not args.all and not args.job:
+        parser.error("nothing to do (use --all or --job)")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    engine = get_engine(statement_timeout_ms=0)
+    prepare_index(engine)
+    prepare_jobs(engine)
+    prepare_archive(engine)
+    stats = match_jobs(engine, get_mongo_db()[MONGO_JOBS_COLLECTION], job_ids=args.job or None, space=args.space,
+                       top_k=args.top_k, chunk_size=args.chunk_size, tenant=args.tenant,
+                       include_archived=args.include_archived)
+    print(f"✓ Shortlisted {stats['jobs']} jobs against {stats['candidates']:,} candidates with {stats['model']}")
+    print(f"  top {stats['top_k']} per job | {stats['embedded']} jobs embedded | "
+          f"scoring {stats['score_ms']:,.0f} ms | total {stats['total_ms']:,.0f} ms")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,68 @@
 import os
 import logging
+import time
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Query as FastAPIQuery
+from fastapi import FastAPI, HTTPException, Query as FastAPIQuery, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pymongo import MongoClient
-from sqlalchemy import create_engine, text as sql_text
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
+from pymongo.errors import DuplicateKeyError
 from sqlalchemy.exc import SQLAlchemyError
-from embedding_utils import flatten_candidate, get_embedding, get_model
-from bson import ObjectId
-from bson.errors import InvalidId
+from embedding_utils import encode, get_model
+from embedding_index import (
+    DEFAULT_TENANT,
+    SpaceCache,
+    document_tenant,
+    prepare_index,
+    validate_tenant,
+)
+from embedding_worker import (
+    MONGO_OUTBOX_COLLECTION,
+    EmbeddingWorker,
+    enqueue_candidate,
+    indexing_status,
+    outbox_counts,
+    requeue_candidates,
+)
+from db import (
+    MONGO_CANDIDATES_COLLECTION,
+    MONGO_DB,
+    get_engine,
+    get_mongo_client,
+    get_read_router,
+    note_write,
+    pool_stats,
+    prewarm,
+    read_connection,
+)
+from candidate_dedup import DEDUP_POLICY, ensure_dedup_index, find_exact_duplicates, merge_into, with_dedup_keys
+from mongo_indexes import MONGO_ENSURE_INDEXES, CollectionScanError, check_query_shapes, ensure_candidate_indexes
+import section_index
+import candidate_graph
+import saved_searches
+from candidate_archive import ACTIVITY_TRACKING, ActivityTracker, prepare_archive, tier_sizes
+from storage import STORAGE_BACKEND, LocalRepository, RemoteRepository
+from job_matching import (
+    JOB_SHORTLIST_SIZE,
+    MONGO_JOBS_COLLECTION,
+    embed_jobs,
+    job_query,
+    match_jobs,
+    prepare_jobs,
+    read_shortlist,
+)
 from typing import List
 
-from models import CandidateIn, CandidateShort, ExperienceShort
+from models import (
+    BatchQueryRequest,
+    CandidateIn,
+    CandidateShort,
+    ExperienceShort,
+    JobIn,
+    JobMatchRequest,
+    SavedSearchIn,
+)
+from serialization import dumps, respond
 
 # --- Setup ---
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
@@ -22,15 +73,61 @@ app = FastAPI()
 
 @app.on_event("startup")
 def startup_event():
-    """Load the embedding model at startup."""
-    logging.info("Loading embedding model...")
+    """Load the embedding model of every search space at startup."""
+    if LOCAL_STORAGE:
+        for space, (model_name, dim) in spaces.all().items():
+            get_model(model_name)
+            logging.info(f"Space '{space}': {model_name} ({dim}D) loaded; local store at {store.path}")
+        return
+    try:
+        prewarm()
+    except Exception as e:
+        logging.error(f"Failed to pre-warm connection pools: {e}", exc_info=True)
+    logging.info("Loading embedding models...")
     try:
-        get_model()
-        logging.info("Embedding model loaded successfully.")
+        prepare_index(pg_engine)
+        if section_index.SECTION_INDEX:
+            section_index.prepare_sections(pg_engine)
+        prepare_jobs(pg_engine)
+        candidate_graph.prepare_graph(pg_engine)
+        saved_searches.prepare_searches(pg_engine)
+        prepare_archive(pg_engine)
+        for space, (model_name, dim) in spaces.all(refresh=True).items():
+            get_model(model_name)
+            logging.info(f"Space '{space}': {model_name} ({dim}D) loaded.")
+        logging.info("Embedding models loaded successfully.")
     except Exception as e:
         logging.error(f"Failed to load embedding model: {e}", exc_info=True)
         # Depending on the use case, you might want to exit the app if the model fails to load
         # raise RuntimeError("Failed to load embedding model") from e
+    try:
+        if MONGO_ENSURE_INDEXES:
+            created = ensure_candidate_indexes(candidates_col)
+            if created:
+                logging.info(f"Created MongoDB indexes: {', '.join(created)}")
+        else:
+            ensure_dedup_index(candidates_col)
+    except Exception as e:
+        logging.error(f"Failed to create MongoDB indexes: {e}", exc_info=True)
+    try:
+        check_query_shapes(candidates_col)
+    except CollectionScanError:
+        raise
+    except Exception as e:
+        logging.error(f"Failed to explain MongoDB queries: {e}", exc_info=True)
+    if EMBEDDING_WORKER:
+        embedding_worker.start()
+    if ACTIVITY_TRACKING:
+        activity.start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    if LOCAL_STORAGE:
+        store.close()
+        return
+    embedding_worker.stop()
+    if ACTIVITY_TRACKING:
+        activity.stop()
 
 app.add_middleware(
     CORSMiddleware,
@@ -39,17 +136,43 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Compress large bodies (full resumes, big result pages); small ones aren't worth the CPU
+app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv("GZIP_MIN_SIZE", "1024")),
+                   compresslevel=int(os.getenv("GZIP_LEVEL", "5")))
 
 # --- DB Connections ---
-MONGO_URI = os.getenv("MONGO_URI")
-MONGO_DB = os.getenv("MONGO_DB")
-MONGO_CANDIDATES_COLLECTION = os.getenv("MONGO_CANDIDATES_COLLECTION", "resumes")
-POSTGRES_URI = os.getenv("POSTGRES_URI")
+# STORAGE_BACKEND=local keeps candidates in one directory instead of MongoDB and PostgreSQL (storage.py);
+# the features built on those (dedup, sections, jobs, talent pools, saved searches) are then unavailable
+LOCAL_STORAGE = STORAGE_BACKEND == "local"
+if LOCAL_STORAGE:
+    mongo_client = mongo_db = candidates_col = outbox_col = jobs_col = pg_engine = None
+    store = LocalRepository()
+    spaces = store.spaces
+else:
+    # Pooled clients shared with the embedding worker; pool sizes and timeouts are set in db.py
+    mongo_client = get_mongo_client()
+    mongo_db = mongo_client[MONGO_DB]
+    candidates_col = mongo_db[MONGO_CANDIDATES_COLLECTION]
+    outbox_col = mongo_db[MONGO_OUTBOX_COLLECTION]
+    jobs_col = mongo_db[MONGO_JOBS_COLLECTION]
+    pg_engine = get_engine()
+    store = RemoteRepository(mongo_client, candidates_col, outbox_col)
+    # Search space -> embedding model; flips when reindex_embeddings.py switches a space
+    spaces = SpaceCache(pg_engine, ttl=float(os.getenv("EMBEDDING_STATE_TTL", "5")))
+
+# New candidates are embedded write-behind; set EMBEDDING_WORKER=0 when embedding_worker.py runs separately
+EMBEDDING_WORKER = os.getenv("EMBEDDING_WORKER", "1") == "1" and not LOCAL_STORAGE
+embedding_worker = None if LOCAL_STORAGE else EmbeddingWorker(outbox_col, candidates_col, pg_engine, spaces)
+# Candidates returned by searches, for the archiving policy's last-matched age (candidate_archive.py)
+ACTIVITY_TRACKING = ACTIVITY_TRACKING and not LOCAL_STORAGE
+activity = ActivityTracker(pg_engine)
 
-mongo_client = MongoClient(MONGO_URI)
-mongo_db = mongo_client[MONGO_DB]
-candidates_col = mongo_db[MONGO_CANDIDATES_COLLECTION]
-pg_engine = create_engine(POSTGRES_URI, pool_pre_ping=True)
+# "document" searches one vector per resume; "section" the best-matching section (SECTION_INDEX=1)
+SEARCH_GRANULARITY = os.getenv("SEARCH_GRANULARITY", "document")
+# Queries accepted by one POST /chatbot/query/batch
+BATCH_QUERY_MAX = int(os.getenv("BATCH_QUERY_MAX", "100"))
+# Requests act for the tenant named in this header (DEFAULT_TENANT without it)
+TENANT_HEADER = os.getenv("TENANT_HEADER", "X-Tenant-ID")
 
 # --- API Endpoints ---
 @app.get("/")
@@ -58,110 +181,371 @@ def root():
 
 @app.get("/health")
 def health_check():
-    """Check if the embedding model is loaded."""
-    model = get_model()
-    if model is not None:
-        return {"status": "ok", "model_loaded": True}
+    """Check if the embedding models are loaded."""
+    active = spaces.all()
+    models = [get_model(model_name) for model_name, _ in active.values()]
+    if models and all(m is not None for m in models) and LOCAL_STORAGE:
+        return {"status": "ok", "model_loaded": True,
+                "spaces": {space: {"model": m, "dim": d} for space, (m, d) in active.items()},
+                "storage": store.stats()}
+    if models and all(m is not None for m in models):
+        try:
+            indexing = outbox_counts(outbox_col)
+        except Exception as e:
+            logging.warning(f"Could not read the embedding outbox: {e}")
+            indexing = None
+        try:
+            with read_connection() as conn:
+                tiers = tier_sizes(conn)
+        except Exception as e:
+            logging.warning(f"Could not read the candidate tier sizes: {e}")
+            tiers = None
+        return {"status": "ok", "model_loaded": True,
+                "spaces": {space: {"model": m, "dim": d} for space, (m, d) in active.items()},
+                "indexing": indexing,
+                "tiers": tiers,
+                "pools": pool_stats(),
+                "replicas": get_read_router().status(),
+                "storage": store.stats()}
     else:
         return {"status": "error", "model_loaded": False}
 
-@app.post("/candidates")
-def add_candidate(payload: CandidateIn):
+@app.post("/candidates", status_code=202)
+def add_candidate(payload: CandidateIn, request: Request, response: Response):
+    """
+    Store the candidate; it becomes searchable once the embedding worker has indexed it
+    (with the local store, right away).
+    """
+    tenant = _tenant(request)
     try:
-        candidate_dict = payload.candidate.model_dump()
-        result = candidates_col.insert_one(candidate_dict)
-        mongo_id = str(result.inserted_id)
-
-        flat = flatten_candidate(candidate_dict)
-        emb = get_embedding(flat)
-
-        with pg_engine.begin() as conn:
-            conn.execute(sql_text("""
-                INSERT INTO candidates (candidate_id, content, embedding)
-                VALUES (:cid, :content, :embedding)
-            """), {"cid": mongo_id, "content": flat, "embedding": emb})
-        return {"id": mongo_id}
+        candidate = {**payload.candidate.model_dump(), "tenant_id": tenant}
+        if LOCAL_STORAGE:
+            candidate_id, status = store.add(candidate)
+            return {"id": candidate_id, "status": status}
+        if DEDUP_POLICY == "off":
+            mongo_id = enqueue_candidate(mongo_client, candidates_col, outbox_col, candidate)
+        else:
+            candidate = with_dedup_keys(candidate)
+            match = find_exact_duplicates(candidates_col, [candidate])[0]
+            if match:
+                return _resolve_exact_duplicate(candidate, *match, response)
+            try:
+                mongo_id = enqueue_candidate(mongo_client, candidates_col, outbox_col, candidate)
+            except DuplicateKeyError:
+                # A concurrent upload of the same person won the unique index
+                match = find_exact_duplicates(candidates_col, [candidate])[0]
+                if not match:
+                    raise
+                return _resolve_exact_duplicate(candidate, *match, response)
+        embedding_worker.notify()
+        return {"id": mongo_id, "status": "pending"}
     except Exception as e:
         logging.error(f"Failed to add candidate: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to add candidate: {str(e)}")
 
-@app.get("/candidates/{candidate_id}")
-def get_candidate(candidate_id: str):
+def _resolve_exact_duplicate(candidate: dict, key: str, existing_id: str, response: Response) -> dict:
+    """Apply DEDUP_POLICY to an upload sharing an identity key with a stored candidate."""
+    if DEDUP_POLICY == "merge":
+        merge_into(candidates_col, existing_id, candidate)
+        requeue_candidates(outbox_col, [existing_id])
+        embedding_worker.notify()
+        return {"id": existing_id, "status": "pending", "merged": True, "matched_on": key}
+    response.status_code = 200
+    return {"id": existing_id, "status": "duplicate", "duplicate_of": existing_id, "matched_on": key}
+
+@app.get("/candidates/{candidate_id}/status")
+def get_candidate_status(candidate_id: str, request: Request):
+    """Indexing state: pending, processing, indexed or failed (with the last error)."""
     try:
-        doc = None
-        try:
-            doc = candidates_col.find_one({"_id": ObjectId(candidate_id)})
-        except InvalidId:
-            pass  # Not a valid ObjectId, proceed to check as a string
+        status = None if LOCAL_STORAGE else indexing_status(outbox_col, candidate_id, _tenant(request))
+        if status:
+            return status
+        # Candidates loaded before the outbox existed (or by the bulk loaders) have no record
+        if store.is_indexed(candidate_id, _tenant(request)):
+            return {"id": candidate_id, "status": "indexed"}
+        get_candidate(candidate_id, request)  # 404 if the candidate doesn't exist
+        return {"id": candidate_id, "status": "not_indexed"}
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        logging.error(f"Failed to fetch indexing status for '{candidate_id}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
-        if not doc:
-            doc = candidates_col.find_one({"_id": candidate_id})
+@app.get("/candidates/{candidate_id}/similar")
+def get_similar_candidates(candidate_id: str, request: Request, top_k: int = 5, space: str = None,
+                           include_archived: bool = False):
+    """
+    "More like this": nearest neighbours of the candidate's stored vector, without the candidate itself;
+    hot candidates only unless include_archived.
+    """
+    if top_k < 1:
+        raise HTTPException(status_code=422, detail="top_k must be at least 1.")
+    try:
+        model_name, dim = spaces.get(space)
+    except KeyError:
+        raise HTTPException(status_code=422, detail=f"Unknown search space: {space}")
+    tenant = _tenant(request)
 
-        if not doc:
-            doc = candidates_col.find_one({"candidate_id": candidate_id})
+    try:
+        rows = store.similar(model_name, dim, candidate_id, top_k, tenant, include_archived)
+        if rows is None:
+            get_candidate(candidate_id, request)  # 404 if the candidate doesn't exist
+            raise HTTPException(status_code=409, detail="Candidate is not indexed yet; check /candidates/{id}/status")
 
-        if not doc:
-            raise HTTPException(status_code=404, detail="Candidate not found")
+        _record_matches(tenant, [str(row[0]) for row in rows])
+        doc_map = _fetch_candidates([str(row[0]) for row in rows])
+        results = [_candidate_short(str(row[0]), doc_map.get(str(row[0])), row[1]) for row in rows]
+        return respond(request, {"id": candidate_id, "results": results})
+    except HTTPException as http_exc:
+        raise http_exc
+    except SQLAlchemyError as e:
+        logging.error(f"Database error finding candidates similar to '{candidate_id}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        logging.error(f"Failed to find candidates similar to '{candidate_id}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
+@app.get("/candidates/{candidate_id}/related")
+def get_related_candidates(candidate_id: str, request: Request, limit: int = candidate_graph.KNN_NEIGHBORS,
+                           space: str = None):
+    """Precomputed nearest neighbours from the last candidate_graph.py build; no vector search at request time."""
+    _require_remote()
+    model_name = _space_model(space)
+    with read_connection() as conn:
+        rows = candidate_graph.related(conn, model_name, candidate_id, limit, _tenant(request))
+    if not rows:
+        get_candidate(candidate_id, request)  # 404 if the candidate doesn't exist
+        raise HTTPException(status_code=409, detail="Candidate is not in the neighbour graph yet; "
+                                                    "run candidate_graph.py or use /candidates/{id}/similar")
+    doc_map = _fetch_candidates([row[0] for row in rows])
+    results = [{"distance": distance, "candidate": _candidate_short(cid, doc_map[cid], "")}
+               for cid, distance in rows if cid in doc_map]  # skip candidates deleted since the build
+    return respond(request, {"id": candidate_id, "results": results})
+
+@app.get("/candidates/{candidate_id}/pool")
+def get_candidate_pool(candidate_id: str, request: Request, space: str = None):
+    """The talent pool the candidate was assigned to by the last candidate_graph.py build."""
+    _require_remote()
+    model_name = _space_model(space)
+    with read_connection() as conn:
+        pool = candidate_graph.membership(conn, model_name, candidate_id, _tenant(request))
+    if not pool:
+        get_candidate(candidate_id, request)
+        raise HTTPException(status_code=409, detail="Candidate is not in a talent pool yet; run candidate_graph.py")
+    return {"id": candidate_id, **pool}
+
+@app.get("/talent-pools")
+def get_talent_pools(request: Request, space: str = None):
+    _require_remote()
+    with read_connection() as conn:
+        return respond(request, {"pools": candidate_graph.list_pools(conn, _space_model(space), _tenant(request))})
+
+@app.get("/talent-pools/{pool_id}")
+def get_talent_pool_members(pool_id: int, request: Request, limit: int = 20, offset: int = 0, space: str = None):
+    """Members of a pool, most typical (closest to the centroid) first."""
+    _require_remote()
+    with read_connection() as conn:
+        rows = candidate_graph.pool_members(conn, _space_model(space), pool_id, limit, offset, _tenant(request))
+    if not rows and offset == 0:
+        raise HTTPException(status_code=404, detail="Talent pool not found")
+    doc_map = _fetch_candidates([row[0] for row in rows])
+    results = [{"distance": distance, "candidate": _candidate_short(cid, doc_map[cid], "")}
+               for cid, distance in rows if cid in doc_map]
+    return respond(request, {"pool_id": pool_id, "results": results})
+
+@app.post("/saved-searches", status_code=201)
+def add_saved_search(payload: SavedSearchIn, request: Request):
+    """
+    Save a query; every candidate indexed from now on that reaches its
+    min_similarity (and passes its filters) raises an alert.
+    """
+    _require_remote()
+    if not payload.query.strip():
+        raise HTTPException(status_code=422, detail="A query string is required.")
+    if payload.min_similarity is not None and not -1 <= payload.min_similarity <= 1:
+        raise HTTPException(status_code=422, detail="min_similarity must be between -1 and 1.")
+    _space_model(payload.space)
+    tenant = _tenant(request)
+    try:
+        with pg_engine.begin() as conn:
+            search_id = saved_searches.create_search(
+                conn, payload.name, payload.query, payload.filters.model_dump(), payload.min_similarity,
+                payload.space, spaces.models(), owner=payload.owner, tenant=tenant)
+        note_write()
+        embedding_worker.saved_searches.invalidate()
+        return {"id": search_id}
+    except SQLAlchemyError as e:
+        logging.error(f"Database error saving a search: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@app.get("/saved-searches")
+def get_saved_searches(request: Request, owner: str = None):
+    _require_remote()
+    with read_connection() as conn:
+        return respond(request, {"searches": saved_searches.list_searches(conn, owner, _tenant(request))})
+
+@app.delete("/saved-searches/{search_id}")
+def delete_saved_search(search_id: int, request: Request):
+    _require_remote()
+    tenant = _tenant(request)
+    with pg_engine.begin() as conn:
+        if not saved_searches.delete_search(conn, search_id, tenant):
+            raise HTTPException(status_code=404, detail="Saved search not found")
+    note_write()
+    embedding_worker.saved_searches.invalidate()
+    return {"id": search_id, "deleted": True}
+
+@app.get("/saved-searches/{search_id}/alerts")
+def get_saved_search_alerts(search_id: int, request: Request, unseen_only: bool = False, limit: int = 50):
+    """Candidates that matched the search when they were indexed, newest first."""
+    _require_remote()
+    tenant = _tenant(request)
+    with read_connection() as conn:
+        if not saved_searches.search_exists(conn, search_id, tenant):
+            raise HTTPException(status_code=404, detail="Saved search not found")
+        rows = saved_searches.read_alerts(conn, search_id, unseen_only, limit)
+    doc_map = _fetch_candidates([row[0] for row in rows])
+    results = [{"similarity": similarity, "created_at": created_at,
+                "candidate": _candidate_short(cid, doc_map[cid], "")}
+               for cid, similarity, created_at in rows if cid in doc_map]
+    return respond(request, {"id": search_id, "results": results})
+
+@app.post("/saved-searches/{search_id}/alerts/seen")
+def mark_saved_search_alerts_seen(search_id: int, request: Request):
+    _require_remote()
+    tenant = _tenant(request)
+    with pg_engine.begin() as conn:
+        if not saved_searches.search_exists(conn, search_id, tenant):
+            raise HTTPException(status_code=404, detail="Saved search not found")
+        marked = saved_searches.mark_seen(conn, search_id)
+    note_write()
+    return {"id": search_id, "marked": marked}
+
+def _tenant(request: Request) -> str:
+    """The tenant a request acts for; every search, lookup and write is scoped to it."""
+    try:
+        return validate_tenant(request.headers.get(TENANT_HEADER) or DEFAULT_TENANT)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def _space_model(space: str = None) -> str:
+    try:
+        return spaces.get(space)[0]
+    except KeyError:
+        raise HTTPException(status_code=422, detail=f"Unknown search space: {space}")
 
-        doc["id"] = str(doc.get("_id") or doc.get("candidate_id"))
-        doc.pop("_id", None)
-        return doc
+@app.get("/candidates/{candidate_id}")
+def get_candidate(candidate_id: str, request: Request):
+    try:
+        doc = store.get(candidate_id)
+        if not doc or document_tenant(doc) != _tenant(request):
+            raise HTTPException(status_code=404, detail="Candidate not found")
+        return respond(request, doc)
     except HTTPException as http_exc:
         raise http_exc
     except Exception as e:
         logging.error(f"Failed to fetch candidate '{candidate_id}': {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
+@app.post("/jobs", status_code=201)
+def add_job(payload: JobIn, request: Request):
+    """Store a job description and embed it with every active model (once; edits re-embed)."""
+    _require_remote()
+    tenant = _tenant(request)
+    try:
+        job = {**payload.job.model_dump(), "tenant_id": tenant}
+        job_id = str(jobs_col.insert_one(job).inserted_id)
+        with pg_engine.begin() as conn:
+            embed_jobs(conn, {job_id: job}, spaces.models())
+        return {"id": job_id, "status": job["status"]}
+    except Exception as e:
+        logging.error(f"Failed to add job: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to add job: {str(e)}")
+
+@app.post("/jobs/match")
+def match_open_jobs(payload: JobMatchRequest, request: Request):
+    """
+    Score the tenant's jobs (default: every open one) against its whole
+    candidate pool and store their shortlists; read them with GET /jobs/{id}/shortlist.
+    """
+    _require_remote()
+    tenant = _tenant(request)
+    top_k = JOB_SHORTLIST_SIZE if payload.top_k is None else payload.top_k
+    if top_k < 1:
+        raise HTTPException(status_code=422, detail="top_k must be at least 1.")
+    try:
+        spaces.get(payload.space)
+    except KeyError:
+        raise HTTPException(status_code=422, detail=f"Unknown search space: {payload.space}")
+    try:
+        result = match_jobs(pg_engine, jobs_col, job_ids=payload.job_ids, space=payload.space, top_k=top_k,
+                            tenant=tenant, include_archived=payload.include_archived)
+        note_write()
+        return result
+    except SQLAlchemyError as e:
+        logging.error(f"Database error while matching jobs: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        logging.error(f"Failed to match jobs: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to match jobs: {str(e)}")
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, request: Request):
+    _require_remote()
+    doc = jobs_col.find_one(job_query(job_id))
+    if not doc or document_tenant(doc) != _tenant(request):
+        raise HTTPException(status_code=404, detail="Job not found")
+    doc["id"] = str(doc.pop("_id"))
+    return respond(request, doc)
+
+@app.get("/jobs/{job_id}/shortlist")
+def get_job_shortlist(job_id: str, request: Request, limit: int = JOB_SHORTLIST_SIZE):
+    """The stored shortlist of a job, best match first; empty until POST /jobs/match has scored it."""
+    _require_remote()
+    doc = jobs_col.find_one(job_query(job_id), {"tenant_id": 1})
+    if not doc or document_tenant(doc) != _tenant(request):
+        raise HTTPException(status_code=404, detail="Job not found")
+    try:
+        with read_connection() as conn:
+            rows = read_shortlist(conn, job_id, limit)
+        doc_map = _fetch_candidates([row[0] for row in rows])
+        results = [{"rank": rank, "distance": row[1], "candidate": _candidate_short(row[0], doc_map.get(row[0]), "")}
+                   for rank, row in enumerate(rows)]
+        return respond(request, {"id": job_id, "model": rows[0][2] if rows else None,
+                                 "computed_at": rows[0][3].isoformat() if rows else None, "results": results})
+    except SQLAlchemyError as e:
+        logging.error(f"Database error reading the shortlist of job '{job_id}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
 @app.get("/chatbot/query")
-def chatbot_query(text: str = FastAPIQuery(None, alias="text"),
+def chatbot_query(request: Request,
+                  text: str = FastAPIQuery(None, alias="text"),
                   query: str = FastAPIQuery(None, alias="query"),
-                  top_k: int = 5):
+                  top_k: int = 5,
+                  space: str = None,
+                  granularity: str = None,
+                  include_archived: bool = False):
     user_query = text or query
     if not user_query:
         raise HTTPException(status_code=422, detail="A query string is required.")
-
+    if top_k < 1:
+        raise HTTPException(status_code=422, detail="top_k must be at least 1.")
     try:
-        query_emb = get_embedding(user_query)
+        model_name, dim = spaces.get(space)
+    except KeyError:
+        raise HTTPException(status_code=422, detail=f"Unknown search space: {space}")
+    granularity = _granularity(granularity, include_archived)
+    tenant = _tenant(request)
 
-        with pg_engine.connect() as conn:
-            res = conn.execute(sql_text("""
-                SELECT candidate_id, content
-                FROM candidates
-                ORDER BY embedding <-> :query_emb
-                LIMIT :top_k
-            """), {"query_emb": str(query_emb), "top_k": top_k})
-            rows = res.fetchall()
+    try:
+        rows = _rank(user_query, model_name, dim, top_k, granularity, tenant, include_archived)
 
         candidate_ids = [str(row[0]) for row in rows]
-        doc_map = _fetch_candidates_from_mongo(candidate_ids)
-
-        results = []
-        for row in rows:
-            cid = str(row[0])
-            doc = doc_map.get(cid)
-            content = row[1]
-
-            if not doc:
-                results.append(CandidateShort(
-                    id=cid,
-                    name="Unknown Candidate",
-                    summary=content[:400] + "..." if len(content) > 400 else content,
-                    skills=[],
-                    experience=[]
-                ))
-                continue
-
-            pi = doc.get("personal_info", {})
-            exp = doc.get("experience", [])
-            results.append(CandidateShort(
-                id=doc["id"],
-                name=pi.get("full_name", "N/A"),
-                summary=pi.get("summary", ""),
-                skills=doc.get("skills", {}).get("technical", []),
-                experience=[ExperienceShort(job_title=e.get("job_title", "N/A"), company=e.get("company", "N/A")) for e in exp]
-            ))
-
-        return {"results": results}
+        _record_matches(tenant, candidate_ids)
+        doc_map = _fetch_candidates(candidate_ids)
+
+        results = [_candidate_short(str(row[0]), doc_map.get(str(row[0])), row[1]) for row in rows]
+        return respond(request, {"results": results})
     except SQLAlchemyError as e:
         logging.error(f"Database error during chatbot query: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -169,30 +553,178 @@ def chatbot_query(text: str = FastAPIQuery(None, alias="text"),
         logging.error(f"Failed to run RAG pipeline: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to run RAG pipeline: {str(e)}")
 
-def _fetch_candidates_from_mongo(candidate_ids: List[str]) -> dict:
-    doc_map = {}
-    if not candidate_ids:
-        return doc_map
-
-    try:
-        object_ids = [ObjectId(cid) for cid in candidate_ids if ObjectId.is_valid(cid)]
-        string_ids = [cid for cid in candidate_ids if not ObjectId.is_valid(cid)]
-
-        query = {
-            "$or": [
-                {"_id": {"$in": object_ids}},
-                {"_id": {"$in": string_ids}},
-                {"candidate_id": {"$in": candidate_ids}}
-            ]
-        }
-        
-        for doc in candidates_col.find(query):
-            doc_id = str(doc['_id'])
-            doc['id'] = doc_id
-            doc.pop('_id', None)
-            doc_map[doc_id] = doc
+@app.get("/chatbot/query/stream")
+def chatbot_query_stream(request: Request,
+                         text: str = FastAPIQuery(None, alias="text"),
+                         query: str = FastAPIQuery(None, alias="query"),
+                         top_k: int = 5,
+                         space: str = None,
+                         format: str = None,
+                         granularity: str = None,
+                         include_archived: bool = False):
+    """
+    Streaming /chatbot/query: a `ranked` event with ids and distances as soon as
+    the vector search returns, one `candidate` event per result as it is
+    hydrated from MongoDB (in arrival order, each with its rank), then `done`.
 
+    Server-sent events by default; `format=ndjson` (or `Accept: application/x-ndjson`)
+    sends one JSON object per line with an `event` field instead.
+    """
+    user_query = text or query
+    if not user_query:
+        raise HTTPException(status_code=422, detail="A query string is required.")
+    if top_k < 1:
+        raise HTTPException(status_code=422, detail="top_k must be at least 1.")
+    try:
+        model_name, dim = spaces.get(space)
+    except KeyError:
+        raise HTTPException(status_code=422, detail=f"Unknown search space: {space}")
+    granularity = _granularity(granularity, include_archived)
+    tenant = _tenant(request)
+    if format is None:
+        format = "ndjson" if "application/x-ndjson" in request.headers.get("accept", "") else "sse"
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=422, detail=f"Unknown stream format: {format} (expected sse or ndjson)")
+
+    def frame(event: str, payload: dict) -> bytes:
+        if format == "sse":
+            return b"event: " + event.encode() + b"\ndata: " + dumps(payload) + b"\n\n"
+        return dumps({"event": event, **payload}) + b"\n"
+
+    def events():
+        started = time.perf_counter()
+        try:
+            rows = _rank(user_query, model_name, dim, top_k, granularity, tenant, include_archived)
+            _record_matches(tenant, [str(r[0]) for r in rows])
+            ranked_ms = (time.perf_counter() - started) * 1000
+            yield frame("ranked", {"results": [{"id": str(r[0]), "distance": float(r[2]),
+                                                **({"section": r[3]} if granularity == "section" else {})}
+                                               for r in rows],
+                                   "elapsed_ms": round(ranked_ms, 1)})
+
+            ranks = {str(r[0]): (i, r) for i, r in enumerate(rows)}
+            pending = dict(ranks)
+            for doc in _iter_candidates(list(ranks)):
+                hit = pending.pop(doc["id"], None)
+                if hit is None:
+                    continue
+                rank, row = hit
+                yield frame("candidate", {"rank": rank, "distance": float(row[2]),
+                                          "candidate": _candidate_short(doc["id"], doc, row[1])})
+            for cid, (rank, row) in sorted(pending.items(), key=lambda item: item[1][0]):
+                yield frame("candidate", {"rank": rank, "distance": float(row[2]),
+                                          "candidate": _candidate_short(cid, None, row[1])})
+            yield frame("done", {"count": len(rows), "ranked_ms": round(ranked_ms, 1),
+                                 "total_ms": round((time.perf_counter() - started) * 1000, 1)})
+        except Exception as e:
+            # Headers are already sent; report the failure in-band
+            logging.error(f"Failed to stream RAG pipeline: {e}", exc_info=True)
+            yield frame("error", {"detail": f"Failed to run RAG pipeline: {str(e)}"})
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type,
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/chatbot/query/batch")
+def chatbot_query_batch(payload: BatchQueryRequest, request: Request):
+    """
+    Many /chatbot/query searches (e.g. a dashboard's saved searches) in one call:
+    the queries are encoded in one model batch, ranked in one SQL statement and
+    hydrated with one MongoDB query. Results come back in request order.
+    """
+    queries = payload.queries
+    if not queries:
+        raise HTTPException(status_code=422, detail="At least one query is required.")
+    if len(queries) > BATCH_QUERY_MAX:
+        raise HTTPException(status_code=422, detail=f"At most {BATCH_QUERY_MAX} queries per batch.")
+    if any(not q.text or q.top_k < 1 for q in queries):
+        raise HTTPException(status_code=422, detail="Every query needs a text and a top_k of at least 1.")
+    try:
+        model_name, dim = spaces.get(payload.space)
+    except KeyError:
+        raise HTTPException(status_code=422, detail=f"Unknown search space: {payload.space}")
+    tenant = _tenant(request)
+
+    try:
+        query_embs = encode([q.text for q in queries], model_name=model_name)
+        ranked = store.batch_search(model_name, dim, query_embs, [q.top_k for q in queries], tenant,
+                                    payload.include_archived)
+
+        matched = list({str(row[0]) for rows in ranked for row in rows})
+        _record_matches(tenant, matched)
+        doc_map = _fetch_candidates(matched)
+        results = [{"query": q.text,
+                    "results": [_candidate_short(str(row[0]), doc_map.get(str(row[0])), row[1]) for row in rows]}
+                   for q, rows in zip(queries, ranked)]
+        return respond(request, {"results": results})
+    except SQLAlchemyError as e:
+        logging.error(f"Database error during batch query: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
-        logging.error(f"An error occurred while fetching candidates from MongoDB: {e}", exc_info=True)
+        logging.error(f"Failed to run batch RAG pipeline: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to run RAG pipeline: {str(e)}")
+
+def _granularity(granularity: str = None, include_archived: bool = False) -> str:
+    granularity = granularity or SEARCH_GRANULARITY
+    if granularity not in ("document", "section"):
+        raise HTTPException(status_code=422, detail=f"Unknown granularity: {granularity} (expected document or section)")
+    if granularity == "section" and (not section_index.SECTION_INDEX or LOCAL_STORAGE):
+        raise HTTPException(status_code=422, detail="Section search needs SECTION_INDEX=1 and STORAGE_BACKEND=remote")
+    if granularity == "section" and include_archived:
+        # Archived candidates have no section rows (candidate_archive.py)
+        raise HTTPException(status_code=422, detail="include_archived needs granularity=document")
+    return granularity
+
+def _rank(user_query: str, model_name: str, dim: int, top_k: int, granularity: str = "document",
+          tenant: str = DEFAULT_TENANT, include_archived: bool = False):
+    """
+    Encode the query and run the vector search over one tenant's candidates (hot ones
+    unless include_archived); rows are (candidate_id, content, distance). Section search
+    ranks candidates by their best section, whose text is the content.
+    """
+    query_emb = encode([user_query], model_name=model_name)[0]
+    if granularity == "section":
+        with read_connection() as conn:
+            return section_index.search(conn, model_name, dim, query_emb, top_k, tenant)
+    return store.search(model_name, dim, query_emb, top_k, tenant, include_archived)
 
-    return doc_map
+def _require_remote():
+    """503 for the features that need MongoDB and PostgreSQL."""
+    if LOCAL_STORAGE:
+        raise HTTPException(status_code=503, detail="Not available with STORAGE_BACKEND=local")
+
+def _record_matches(tenant: str, candidate_ids: List[str]):
+    if ACTIVITY_TRACKING:
+        activity.record(tenant, candidate_ids)
+
+def _candidate_short(cid: str, doc: dict, content: str) -> CandidateShort:
+    # Built with model_construct: the fields come from documents validated at ingest
+    # (CandidateIn), so validating them again on every query is wasted work
+    if not doc:
+        return CandidateShort.model_construct(
+            id=cid,
+            name="Unknown Candidate",
+            summary=content[:400] + "..." if len(content) > 400 else content,
+            skills=[],
+            experience=[]
+        )
+    pi = doc.get("personal_info", {})
+    exp = doc.get("experience", [])
+    return CandidateShort.model_construct(
+        id=doc["id"],
+        name=pi.get("full_name", "N/A"),
+        summary=pi.get("summary", ""),
+        skills=doc.get("skills", {}).get("technical", []),
+        experience=[ExperienceShort.model_construct(job_title=e.get("job_title", "N/A"), company=e.get("company", "N/A"))
+                    for e in exp]
+    )
+
+def _fetch_candidates(candidate_ids: List[str]) -> dict:
+    return {doc["id"]: doc for doc in _iter_candidates(candidate_ids)}
+
+def _iter_candidates(candidate_ids: List[str]):
+    """Yield candidate documents (with `id` set) as the store returns them, in no particular order."""
+    try:
+        yield from store.iter_documents(candidate_ids)
+    except Exception as e:
+        logging.error(f"An error occurred while fetching candidates from {STORAGE_BACKEND} storage: {e}", exc_info=True)
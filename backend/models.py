@@ -13,6 +13,15 @@ class CandidateShort(BaseModel):
     skills: List[str]
     experience: List[ExperienceShort]
 
+class BatchQuery(BaseModel):
+    text: str
+    top_k: int = 5
+
+class BatchQueryRequest(BaseModel):
+    queries: List[BatchQuery]
+    space: Optional[str] = None
+    include_archived: bool = False
+
 # --- Full Candidate Schema for MongoDB ---
 class PersonalInfo(BaseModel):
     full_name: str
@@ -92,3 +101,34 @@ class CandidateMongo(BaseModel):
 class CandidateIn(BaseModel):
     candidate: CandidateMongo
 
+# --- Job Descriptions ---
+class JobDescription(BaseModel):
+    title: str
+    company: str = ""
+    location: str = ""
+    description: str
+    requirements: List[str] = []
+    skills: List[str] = []
+    status: str = "open"
+
+class JobIn(BaseModel):
+    job: JobDescription
+
+class JobMatchRequest(BaseModel):
+    job_ids: Optional[List[str]] = None
+    top_k: Optional[int] = None
+    space: Optional[str] = None
+    include_archived: bool = False
+
+# --- Saved Searches ---
+class SavedSearchFilters(BaseModel):
+    skills: List[str] = []
+    location: Optional[str] = None
+
+class SavedSearchIn(BaseModel):
+    name: str
+    query: str
+    filters: SavedSearchFilters = SavedSearchFilters()
+    min_similarity: Optional[float] = None
+    space: Optional[str] = None
+    owner: str = ""
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Indexes of the `resumes` collection, and a check that the request path uses them.
+
+Search results are hydrated from MongoDB by id (storage.RemoteRepository):
+GET /candidates/{id} tries an ObjectId `_id`, a string `_id` and then the
+legacy `candidate_id` field, and a page of results is fetched with one `$or`
+over the three. Both `_id` types are served by the built-in `_id` index;
+`candidate_id` needs its own (sparse: only legacy documents have the field),
+otherwise every lookup that falls through to it, and every hydration,
+scans the whole collection. Duplicate checks at ingest look up `dedup_keys`
+(the normalized email, phone and profile URLs, see candidate_dedup.py).
+
+The API creates missing indexes at startup (MONGO_ENSURE_INDEXES=1) and then
+explains each of these query shapes. A plan with a COLLSCAN is logged as an
+error, or stops startup with MONGO_QUERY_CHECK=fail; =off skips the check.
+
+  python mongo_indexes.py --ensure
+  python mongo_indexes.py --check        # exits 1 if a query shape scans the collection
+"""
+
+import argparse
+import logging
+import os
+import sys
+from typing import Dict, List
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import ASCENDING
+
+from candidate_dedup import ensure_dedup_index
+from storage import hydration_query, lookup_queries
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
+
+MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "1") == "1"
+MONGO_QUERY_CHECK = os.getenv("MONGO_QUERY_CHECK", "warn").lower()
+
+if MONGO_QUERY_CHECK not in ("off", "warn", "fail"):
+    raise ValueError(f"Unknown MONGO_QUERY_CHECK: {MONGO_QUERY_CHECK!r} (expected 'off', 'warn' or 'fail')")
+
+
+class CollectionScanError(RuntimeError):
+    """A request-path query has no index to use."""
+
+
+# (name, keys, options); the dedup index is created by candidate_dedup.ensure_dedup_index
+CANDIDATE_INDEXES = [
+    ("candidate_id", [("candidate_id", ASCENDING)], {"sparse": True}),
+]
+
+
+def ensure_candidate_indexes(candidates_col) -> List[str]:
+    """Create the indexes the candidate lookups need; returns the names of those created."""
+    before = candidates_col.index_information()
+    existing = {tuple(info["key"]) for info in before.values()}
+    for name, keys, options in CANDIDATE_INDEXES:
+        # An index on the same keys (e.g. created by hand as candidate_id_1) serves as well
+        if tuple(keys) not in existing:
+            candidates_col.create_index(keys, name=name, **options)
+    ensure_dedup_index(candidates_col)
+    return sorted(set(candidates_col.index_information()) - set(before) - {"_id_"})
+
+
+def query_shapes() -> Dict[str, dict]:
+    """{description: filter} of every MongoDB query on the request path, with probe ids."""
+    object_id, legacy_id = str(ObjectId()), "legacy-probe"
+    by_object_id, by_string_id, by_candidate_id = lookup_queries(object_id)
+    return {
+        "get by ObjectId _id": by_object_id,
+        "get by string _id": by_string_id,
+        "get by candidate_id": by_candidate_id,
+        "hydrate a page of ids": hydration_query([object_id, legacy_id]),
+        "duplicate check": {"dedup_keys": {"$in": ["email:probe@example.com"]}},
+    }
+
+
+def _stages(plan) -> List[str]:
+    if isinstance(plan, list):
+        return [stage for item in plan for stage in _stages(item)]
+    if not isinstance(plan, dict):
+        return []
+    stages = [plan["stage"]] if "stage" in plan else []
+    for value in plan.values():
+        if isinstance(value, (dict, list)):
+            stages.extend(_stages(value))
+    return stages
+
+
+def explain_shapes(candidates_col) -> Dict[str, List[str]]:
+    """{query shape: stages of its winning plan}, e.g. ['FETCH', 'IXSCAN']."""
+    plans = {}
+    for shape, query in query_shapes().items():
+        explained = candidates_col.database.command(
+            {"explain": {"find": candidates_col.name, "filter": query, "limit": 1}, "verbosity": "queryPlanner"})
+        plans[shape] = _stages(explained["queryPlanner"]["winningPlan"])
+    return plans
+
+
+def collection_scans(candidates_col) -> List[str]:
+    """Query shapes whose plan scans the whole collection."""
+    return [shape for shape, stages in explain_shapes(candidates_col).items() if "COLLSCAN" in stages]
+
+
+def check_query_shapes(candidates_col, mode: str = MONGO_QUERY_CHECK):
+    """Log (mode 'warn') or raise CollectionScanError (mode 'fail') if a request-path query scans the collection."""
+    if mode == "off":
+        return
+    scans = collection_scans(candidates_col)
+    if not scans:
+        return
+    message = (f"MongoDB queries on {candidates_col.name} scan the whole collection: {', '.join(scans)}; "
+               f"run `python mongo_indexes.py --ensure`")
+    if mode == "fail":
+        raise CollectionScanError(message)
+    logging.error(message)
+
+
+def main(argv=None):
+    from db import get_candidates_collection
+
+    parser = argparse.ArgumentParser(description="Indexes of the MongoDB candidate collection.")
+    parser.add_argument("--ensure", action="store_true", help="create missing indexes")
+    parser.add_argument("--check", action="store_true", help="explain the request-path queries; exit 1 on a COLLSCAN")
+    args = parser.parse_args(argv)
+    if not (args.ensure or args.check):
+        parser.error("nothing to do (use --ensure or --check)")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    candidates_col = get_candidates_collection()
+    if args.ensure:
+        created = ensure_candidate_indexes(candidates_col)
+        print(f"✓ {candidates_col.name}: {len(created)} index(es) created"
+              + (f" ({', '.join(created)})" if created else " (all existed)"))
+    if args.check:
+        failed = False
+        for shape, stages in explain_shapes(candidates_col).items():
+            if "COLLSCAN" in stages:
+                failed = True
+                print(f"✗ {shape:<24} {' > '.join(stages)}")
+            else:
+                print(f"✓ {shape:<24} {' > '.join(stages)}")
+        if failed:
+            print("  Run `python mongo_indexes.py --ensure` to add the missing indexes")
+            return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
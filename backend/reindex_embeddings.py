@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Zero-downtime re-embedding of a search space with a new model.
+
+Rows for the new model are written next to the existing ones in `candidates`
+(each row records its model), in throttled, resumable batches, while the space
+keeps serving search and ingest with the old model. The new model's vector
+index is then built concurrently, and in one short transaction the job
+catches up candidates ingested meanwhile and points the space at the new
+model in `embedding_index_state`. Search flips to the new vectors at that
+commit; rows of models no space uses any more are removed with --drop-old.
+Section vectors (section_index.py) for the new model are filled afterwards
+with `python section_index.py --sync`.
+
+The new rows embed each candidate's MongoDB document flattened afresh for the
+new model (its token budget, the current flattening); --reuse-content embeds
+the text stored with the old model's rows instead and needs no MongoDB.
+
+Usage:
+  python reindex_embeddings.py --model all-MiniLM-L6-v2
+  python reindex_embeddings.py --space batch --model all-mpnet-base-v2@<revision>
+  python reindex_embeddings.py --space batch --model <its current model>  # fill a newly added space
+  python reindex_embeddings.py --model all-MiniLM-L6-v2 --max-rows-per-sec 200 --batch-size 256
+  python reindex_embeddings.py --model all-MiniLM-L6-v2 --no-swap      # backfill only
+  python reindex_embeddings.py --model all-MiniLM-L6-v2 --reuse-content  # old rows' text, no MongoDB
+  python reindex_embeddings.py --drop-old                             # delete unused model rows
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from embedding_index import (
+    CANDIDATES_TABLE,
+    STATE_TABLE,
+    build_model_index,
+    default_space,
+    model_index_name,
+    prepare_index,
+    read_spaces,
+    set_active_model,
+    split_model_spec,
+    store_embeddings,
+)
+from db import get_engine
+from embedding_utils import flatten_candidate, get_embedding_dimension, token_budget
+from job_matching import JOB_EMBEDDINGS_TABLE
+from saved_searches import SEARCH_EMBEDDINGS_TABLE
+from section_index import SECTIONS_TABLE
+import candidate_graph
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+# Source rows (one per candidate) that have no row for the target model yet
+_MISSING_SQL = f"""
+    SELECT s.id, s.candidate_id, s.content, s.tenant_id, s.tier, s.indexed_at FROM {CANDIDATES_TABLE} s
+    WHERE s.model_name = :src_name AND s.model_revision = :src_revision AND s.id > :last
+      AND NOT EXISTS (
+          SELECT 1 FROM {CANDIDATES_TABLE} t
+          WHERE t.model_name = :dst_name AND t.model_revision = :dst_revision
+            AND t.candidate_id = s.candidate_id AND t.tenant_id = s.tenant_id)
+    ORDER BY s.id
+    LIMIT :limit
+"""
+
+
+def _missing(conn, source: str, target: str, last_id: int, limit: int):
+    src_name, src_revision = split_model_spec(source)
+    dst_name, dst_revision = split_model_spec(target)
+    return conn.execute(text(_MISSING_SQL), {
+        "src_name": src_name, "src_revision": src_revision,
+        "dst_name": dst_name, "dst_revision": dst_revision,
+        "last": last_id, "limit": limit,
+    }).fetchall()
+
+
+def _contents(rows, target: str, candidates_col) -> dict:
+    """{candidate_id: text to embed}: the document flattened for the target model, else the stored text."""
+    contents = {r[1]: r[2] for r in rows}
+    if candidates_col is None:
+        return contents
+    keys = [ObjectId(cid) if ObjectId.is_valid(cid) else cid for cid in contents]
+    budget = token_budget(target)
+    for doc in candidates_col.find({"_id": {"$in": keys}}):
+        contents[str(doc["_id"])] = flatten_candidate(doc, budget)
+    return contents
+
+
+def _store(conn, rows, target: str, batch_size: int, candidates_col=None) -> int:
+    """Embed _missing() rows with the target model, into their candidates' tenants and tiers."""
+    contents = _contents(rows, target, candidates_col)
+    return store_embeddings(conn, [(r[1], contents[r[1]]) for r in rows], [target], batch_size=batch_size,
+                            tenants={r[1]: r[3] for r in rows}, tiers={r[1]: r[4] for r in rows},
+                            indexed_at={r[1]: r[5] for r in rows})
+
+
+def backfill(engine, source: str, target: str, batch_size: int, max_rows_per_sec: float,
+             candidates_col=None) -> int:
+    """
+    Embed every source-model candidate with the target model (from its document
+    in `candidates_col`, or the stored text if None). Safe to interrupt and re-run.
+    """
+    src_name, src_revision = split_model_spec(source)
+    with engine.connect() as conn:
+        total = conn.execute(text(f"""
+            SELECT COUNT(*) FROM {CANDIDATES_TABLE}
+            WHERE model_name = :name AND model_revision = :revision
+        """), {"name": src_name, "revision": src_revision}).scalar()
+
+    started = time.perf_counter()
+    copied = 0
+    last_id = 0
+    while True:
+        with engine.connect() as conn:
+            rows = _missing(conn, source, target, last_id, batch_size)
+        if not rows:
+            break
+        with engine.begin() as conn:
+            copied += _store(conn, rows, target, batch_size, candidates_col)
+        last_id = rows[-1][0]
+
+        elapsed = time.perf_counter() - started
+        rate = copied / elapsed if elapsed else 0.0
+        eta = max(total - copied, 0) / rate if rate else 0.0
+        logging.info(f"{copied}/{total} rows | {rate:,.0f} rows/s | ETA {eta:,.0f}s")
+
+        # Throttle: never run ahead of the configured rate so live traffic keeps its share of the DB
+        if max_rows_per_sec:
+            ahead = copied / max_rows_per_sec - (time.perf_counter() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+    return copied
+
+
+def build_index(engine, target: str, dim: int):
+    """Build the target model's partial HNSW index (on every partition) without blocking writes."""
+    logging.info(f"Building vector index for {target}...")
+    build_model_index(engine, target, dim)
+
+
+def flip(engine, space: str, source: str, target: str, dim: int, batch_size: int, candidates_col=None):
+    """Catch up candidates ingested during the backfill and switch the space in one transaction."""
+    with engine.begin() as conn:
+        # Blocks writers (not readers) for the duration of the catch-up
+        conn.execute(text(f"LOCK TABLE {CANDIDATES_TABLE} IN SHARE ROW EXCLUSIVE MODE"))
+        while True:
+            rows = _missing(conn, source, target, 0, batch_size)
+            if not rows:
+                break
+            _store(conn, rows, target, batch_size, candidates_col)
+            logging.info(f"Caught up {len(rows)} rows ingested during the backfill")
+        set_active_model(conn, space, target, dim)
+    logging.info(f"Space '{space}' now searches {target} ({dim}D). Rows for {source} are kept until --drop-old.")
+
+
+def drop_unused(engine, batch_size: int):
+    """
+    Delete rows whose model no space uses any more: candidates and their
+    sections in batches, the graph, and job and saved-search vectors.
+    """
+    for table in (CANDIDATES_TABLE, SECTIONS_TABLE):
+        _drop_unused_rows(engine, table, batch_size)
+    candidate_graph.drop_unused_models(engine)
+    _drop_unused_vectors(engine, (JOB_EMBEDDINGS_TABLE, SEARCH_EMBEDDINGS_TABLE))
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        keep = {model_index_name(spec, table) for spec, _ in read_spaces(conn).values()
+                for table in (CANDIDATES_TABLE, SECTIONS_TABLE)}
+        indexes = dict(conn.execute(text("""
+            SELECT i.indexname, c.relkind = 'I' FROM pg_indexes i
+            JOIN pg_class c ON c.relname = i.indexname AND c.relnamespace = to_regnamespace(i.schemaname)
+            WHERE (i.tablename = :table AND i.indexname LIKE :prefix)
+               OR (i.tablename = :sections AND i.indexname LIKE :sections_prefix)
+        """), {"table": CANDIDATES_TABLE, "prefix": f"{CANDIDATES_TABLE}_emb_%",
+               "sections": SECTIONS_TABLE, "sections_prefix": f"{SECTIONS_TABLE}_emb_%"}).all())
+        for index in sorted(set(indexes) - keep):
+            # An index on a partitioned table can't be dropped concurrently; dropping it drops the partitions' too
+            concurrently = "" if indexes[index] else "CONCURRENTLY "
+            conn.execute(text(f'DROP INDEX {concurrently}IF EXISTS "{index}"'))
+            logging.info(f"Dropped index {index}")
+
+
+def _drop_unused_vectors(engine, tables):
+    """One statement per table: job and saved-search vectors are one row per job/search and model."""
+    with engine.begin() as conn:
+        for table in tables:
+            if not conn.execute(text("SELECT to_regclass(:table)"), {"table": table}).scalar():
+                continue
+            n = conn.execute(text(f"""
+                DELETE FROM {table} v
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {STATE_TABLE} s
+                    WHERE s.model_name = CASE WHEN v.model_revision = '' THEN v.model_name
+                                              ELSE v.model_name || '@' || v.model_revision END)
+            """)).rowcount
+            logging.info(f"Deleted {n} {table} rows of unused models")
+
+
+def _drop_unused_rows(engine, table: str, batch_size: int):
+    with engine.connect() as conn:
+        if not conn.execute(text("SELECT to_regclass(:table)"), {"table": table}).scalar():
+            return
+    deleted = 0
+    while True:
+        with engine.begin() as conn:
+            n = conn.execute(text(f"""
+                DELETE FROM {table} WHERE id IN (
+                    SELECT c.id FROM {table} c
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM {STATE_TABLE} s
+                        WHERE s.model_name = CASE WHEN c.model_revision = '' THEN c.model_name
+                                                  ELSE c.model_name || '@' || c.model_revision END)
+                    LIMIT :limit)
+            """), {"limit": batch_size}).rowcount
+        deleted += n
+        if n < batch_size:
+            break
+        logging.info(f"Deleted {deleted} {table} rows so far...")
+    logging.info(f"Deleted {deleted} {table} rows of unused models")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-embed a search space with a new model, without downtime.")
+    parser.add_argument("--space", default=None, help="space to switch (default: first in EMBEDDING_SPACES)")
+    parser.add_argument("--model", help="target model, as 'name' or 'name@revision'")
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--max-rows-per-sec", type=float, default=0, help="throttle; 0 = unthrottled")
+    parser.add_argument("--no-swap", action="store_true", help="backfill only; run again to finish")
+    parser.add_argument("--drop-old", action="store_true", help="delete rows of models no space uses, and exit")
+    parser.add_argument("--reuse-content", action="store_true",
+                        help="embed the old rows' stored text instead of re-flattening the MongoDB documents")
+    args = parser.parse_args(argv)
+
+    # Index builds and catch-up locks can take longer than the API's statement timeout
+    engine = get_engine(statement_timeout_ms=0)
+    spaces = prepare_index(engine)
+
+    if args.drop_old:
+        drop_unused(engine, args.batch_size)
+        return
+    if not args.model:
+        parser.error("--model is required")
+    if args.reuse_content:
+        candidates_col = None
+    else:
+        from db import get_candidates_collection
+        candidates_col = get_candidates_collection()
+
+    space = args.space or default_space()
+    if space not in spaces:
+        parser.error(f"Unknown space {space!r}; known: {', '.join(spaces)}")
+    source, _ = spaces[space]
+    if source == args.model:
+        # A space added via EMBEDDING_SPACES starts empty: fill it from the default space's rows
+        fill_from = spaces[default_space()][0]
+        if fill_from == args.model:
+            logging.info(f"Space '{space}' already uses {args.model}; nothing to do")
+            return
+        logging.info(f"Space '{space}' already uses {args.model}; backfilling it from {fill_from}")
+        copied = backfill(engine, fill_from, args.model, args.batch_size, args.max_rows_per_sec, candidates_col)
+        logging.info(f"Backfill embedded {copied} rows")
+        return
+    dim = get_embedding_dimension(args.model)
+    logging.info(f"Reindexing space '{space}': {source} -> {args.model} ({dim}D)")
+
+    started = time.perf_counter()
+    copied = backfill(engine, source, args.model, args.batch_size, args.max_rows_per_sec, candidates_col)
+    logging.info(f"Backfill embedded {copied} rows in {time.perf_counter() - started:,.1f}s")
+    if args.no_swap:
+        logging.info("--no-swap: backfill done; re-run without --no-swap to flip")
+        return
+    build_index(engine, args.model, dim)
+    flip(engine, space, source, args.model, dim, args.batch_size, candidates_col)
+    with engine.connect() as conn:
+        logging.info(f"Active spaces: {read_spaces(conn)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Saved searches and the alerts they raise when matching candidates arrive.
+
+A saved search is a query text plus optional filters (required skills, a
+location) and a minimum cosine similarity. Its query is embedded once per
+model, like a job description, into `saved_search_embeddings`.
+
+Instead of re-running every saved search against the whole corpus, matching
+runs the other way round, on ingest: when the embedding worker stores a batch
+of new candidates, their vectors are scored against all active saved searches
+in one matrix product per model, in the same transaction. Hits at or above a
+search's threshold that pass its filters become rows in `search_alerts` (one
+per search and candidate, so a retried batch doesn't alert twice). Searches
+belong to a tenant and only alert on that tenant's candidates.
+
+The worker keeps the saved-search vectors in memory (SavedSearchCache),
+reloading them every SAVED_SEARCH_TTL seconds. SAVED_SEARCH_ALERTS=0 turns
+matching off.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from db import Vector
+from embedding_index import (
+    CANDIDATES_TABLE,
+    DEFAULT_TENANT,
+    document_tenant,
+    model_filter,
+    split_model_spec,
+    sql_literal,
+    vectors_from_send,
+)
+from embedding_utils import encode
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
+
+SEARCHES_TABLE = "saved_searches"
+SEARCH_EMBEDDINGS_TABLE = "saved_search_embeddings"
+ALERTS_TABLE = "search_alerts"
+SAVED_SEARCH_ALERTS = os.getenv("SAVED_SEARCH_ALERTS", "1") == "1"
+# Cosine similarity a new candidate needs to trigger an alert, unless the search sets its own
+SAVED_SEARCH_MIN_SIMILARITY = float(os.getenv("SAVED_SEARCH_MIN_SIMILARITY", "0.5"))
+SAVED_SEARCH_TTL = float(os.getenv("SAVED_SEARCH_TTL", "5"))
+
+
+# --- Schema ---
+def ensure_search_tables(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {SEARCHES_TABLE} (
+            id BIGSERIAL PRIMARY KEY,
+            name TEXT NOT NULL,
+            owner TEXT NOT NULL DEFAULT '',
+            query TEXT NOT NULL,
+            filters JSONB NOT NULL DEFAULT '{{}}',
+            min_similarity DOUBLE PRECISION NOT NULL,
+            space TEXT,
+            active BOOLEAN NOT NULL DEFAULT TRUE,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            tenant_id TEXT NOT NULL DEFAULT {sql_literal(DEFAULT_TENANT)}
+        )
+    """))
+    conn.execute(text(f"""
+        ALTER TABLE {SEARCHES_TABLE} ADD COLUMN IF NOT EXISTS tenant_id TEXT NOT NULL DEFAULT {sql_literal(DEFAULT_TENANT)}
+    """))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {SEARCHES_TABLE}_tenant_idx ON {SEARCHES_TABLE} (tenant_id, owner)"))
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {SEARCH_EMBEDDINGS_TABLE} (
+            search_id BIGINT NOT NULL REFERENCES {SEARCHES_TABLE} (id) ON DELETE CASCADE,
+            embedding vector NOT NULL,
+            model_name TEXT NOT NULL,
+            model_revision TEXT NOT NULL DEFAULT '',
+            PRIMARY KEY (model_name, model_revision, search_id)
+        )
+    """))
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {ALERTS_TABLE} (
+            id BIGSERIAL PRIMARY KEY,
+            search_id BIGINT NOT NULL REFERENCES {SEARCHES_TABLE} (id) ON DELETE CASCADE,
+            candidate_id TEXT NOT NULL,
+            similarity DOUBLE PRECISION NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            seen_at TIMESTAMPTZ,
+            UNIQUE (search_id, candidate_id)
+        )
+    """))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {ALERTS_TABLE}_search_idx ON {ALERTS_TABLE} (search_id, created_at DESC)"))
+
+
+def prepare_searches(engine):
+    """Idempotent schema setup."""
+    with engine.begin() as conn:
+        ensure_search_tables(conn)
+
+
+# --- Saved searches ---
+def create_search(conn, name: str, query: str, filters: dict, min_similarity: Optional[float],
+                  space: Optional[str], specs: List[str], owner: str = "", tenant: str = DEFAULT_TENANT) -> int:
+    """Store a saved search and embed its query with every model in `specs`."""
+    search_id = conn.execute(text(f"""
+        INSERT INTO {SEARCHES_TABLE} (name, owner, query, filters, min_similarity, space, tenant_id)
+        VALUES (:name, :owner, :query, CAST(:filters AS jsonb), :min_similarity, :space, :tenant)
+        RETURNING id
+    """), {"name": name, "owner": owner, "query": query, "filters": json.dumps(filters or {}),
+           "min_similarity": SAVED_SEARCH_MIN_SIMILARITY if min_similarity is None else min_similarity,
+           "space": space, "tenant": tenant}).scalar()
+    for spec in sorted(set(specs)):
+        embed_searches(conn, {search_id: query}, spec)
+    return search_id
+
+
+def embed_searches(conn, queries: Dict[int, str], spec: str):
+    name, revision = split_model_spec(spec)
+    embeddings = encode(list(queries.values()), model_name=spec)
+    conn.execute(text(f"""
+        INSERT INTO {SEARCH_EMBEDDINGS_TABLE} (search_id, embedding, model_name, model_revision)
+        VALUES (:search_id, CAST(:embedding AS vector), :model_name, :model_revision)
+        ON CONFLICT (model_name, model_revision, search_id) DO NOTHING
+    """), [{"search_id": search_id, "embedding": Vector(emb), "model_name": name, "model_revision": revision}
+           for search_id, emb in zip(queries, embeddings)])
+
+
+def list_searches(conn, owner: Optional[str] = None, tenant: str = DEFAULT_TENANT) -> List[dict]:
+    rows = conn.execute(text(f"""
+        SELECT s.id, s.name, s.owner, s.query, s.filters, s.min_similarity, s.space, s.active, s.created_at,
+               COUNT(a.id) FILTER (WHERE a.seen_at IS NULL) AS unseen
+        FROM {SEARCHES_TABLE} s LEFT JOIN {ALERTS_TABLE} a ON a.search_id = s.id
+        WHERE s.tenant_id = :tenant AND (CAST(:owner AS TEXT) IS NULL OR s.owner = :owner)
+        GROUP BY s.id ORDER BY s.id
+    """), {"owner": owner, "tenant": tenant}).fetchall()
+    return [{"id": r[0], "name": r[1], "owner": r[2], "query": r[3], "filters": r[4], "min_similarity": r[5],
+             "space": r[6], "active": r[7], "created_at": r[8].isoformat(), "unseen_alerts": r[9]} for r in rows]
+
+
+def search_exists(conn, search_id: int, tenant: str = DEFAULT_TENANT) -> bool:
+    return conn.execute(text(f"SELECT 1 FROM {SEARCHES_TABLE} WHERE id = :id AND tenant_id = :tenant"),
+                        {"id": search_id, "tenant": tenant}).scalar() is not None
+
+
+def delete_search(conn, search_id: int, tenant: str = DEFAULT_TENANT) -> bool:
+    return conn.execute(text(f"DELETE FROM {SEARCHES_TABLE} WHERE id = :id AND tenant_id = :tenant"),
+                        {"id": search_id, "tenant": tenant}).rowcount > 0
+
+
+def read_alerts(conn, search_id: int, unseen_only: bool = False, limit: int = 50) -> List[Tuple[str, float, str]]:
+    """(candidate_id, similarity, created_at) of a search's alerts, newest first."""
+    rows = conn.execute(text(f"""
+        SELECT candidate_id, similarity, created_at FROM {ALERTS_TABLE}
+        WHERE search_id = :search_id AND (NOT :unseen_only OR seen_at IS NULL)
+        ORDER BY created_at DESC, similarity DESC LIMIT :limit
+    """), {"search_id": search_id, "unseen_only": unseen_only, "limit": limit}).fetchall()
+    return [(row[0], row[1], row[2].isoformat()) for row in rows]
+
+
+def mark_seen(conn, search_id: int) -> int:
+    return conn.execute(text(f"""
+        UPDATE {ALERTS_TABLE} SET seen_at = now() WHERE search_id = :search_id AND seen_at IS NULL
+    """), {"search_id": search_id}).rowcount
+
+
+# --- Matching on ingest ---
+def matches_filters(doc: dict, filters: dict) -> bool:
+    """All required skills (case-insensitive) and the location as a substring of the address."""
+    if filters.get("skills"):
+        have = {s.lower() for s in ((doc.get("skills") or {}).get("technical") or []) if s}
+        if any(s.lower() not in have for s in filters["skills"]):
+            return False
+    if filters.get("location"):
+        address = ((doc.get("personal_info") or {}).get("address") or "").lower()
+        if filters["location"].lower() not in address:
+            return False
+    return True
+
+
+class SavedSearchCache:
+    """
+    Active saved searches as one unit-length matrix per model, reloaded every
+    `ttl` seconds. Searches without a vector for their space's current model
+    (created before a reindex) are embedded while loading.
+    """
+
+    def __init__(self, engine, spaces, ttl: float = SAVED_SEARCH_TTL):
+        self.engine = engine
+        self.spaces = spaces
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = 0.0
+        self._models: Dict[str, Tuple[List[int], np.ndarray, np.ndarray, List[dict], np.ndarray]] = {}
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+    def get(self) -> Dict[str, Tuple[List[int], np.ndarray, np.ndarray, List[dict], np.ndarray]]:
+        """{model spec: (search ids, unit-length query matrix, thresholds, filters, tenants)}"""
+        with self._lock:
+            if time.monotonic() - self._loaded_at > self.ttl:
+                self._models = self._load()
+                self._loaded_at = time.monotonic()
+            return self._models
+
+    def _load(self):
+        with self.engine.begin() as conn:
+            if not conn.execute(text("SELECT to_regclass(:t)"), {"t": SEARCHES_TABLE}).scalar():
+                return {}
+            searches = conn.execute(text(f"""
+                SELECT id, query, filters, min_similarity, space, tenant_id FROM {SEARCHES_TABLE} WHERE active
+            """)).fetchall()
+            by_model: Dict[str, list] = {}
+            for row in searches:
+                try:
+                    spec = self.spaces.get(row[4])[0]
+                except KeyError:
+                    spec = self.spaces.get()[0]  # the search's space was removed
+                by_model.setdefault(spec, []).append(row)
+
+            models = {}
+            for spec, rows in by_model.items():
+                ids = [row[0] for row in rows]
+                vectors = dict(conn.execute(text(f"""
+                    SELECT search_id, vector_send(embedding) FROM {SEARCH_EMBEDDINGS_TABLE}
+                    WHERE {model_filter(spec)} AND search_id = ANY(:ids)
+                """), {"ids": ids}).fetchall())
+                missing = {row[0]: row[1] for row in rows if row[0] not in vectors}
+                if missing:
+                    embed_searches(conn, missing, spec)
+                    vectors.update(conn.execute(text(f"""
+                        SELECT search_id, vector_send(embedding) FROM {SEARCH_EMBEDDINGS_TABLE}
+                        WHERE {model_filter(spec)} AND search_id = ANY(:ids)
+                    """), {"ids": list(missing)}).fetchall())
+                    logging.info(f"Embedded {len(missing)} saved search(es) with {spec}")
+                matrix = _unit(vectors_from_send([vectors[i] for i in ids]))
+                models[spec] = (ids, matrix, np.array([row[3] for row in rows], dtype=np.float32),
+                                [row[2] or {} for row in rows], np.array([row[5] for row in rows], dtype=object))
+        return models
+
+
+def _unit(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def evaluate_new_candidates(conn, cache: SavedSearchCache, docs: Dict[str, dict]) -> int:
+    """
+    Score just-stored candidates {candidate_id: document} against every active
+    saved search and record alerts; returns the number of new alerts. Runs in
+    the indexing transaction, so it reads the candidates' fresh vectors.
+    A candidate only alerts searches of its own tenant.
+    """
+    if not docs:
+        return 0
+    alerts = []
+    for spec, (search_ids, queries, thresholds, filters, tenants) in cache.get().items():
+        rows = conn.execute(text(f"""
+            SELECT candidate_id, vector_send(embedding) FROM {CANDIDATES_TABLE}
+            WHERE {model_filter(spec)} AND candidate_id = ANY(:ids)
+        """), {"ids": list(docs)}).fetchall()
+        if not rows:
+            continue
+        similarity = _unit(vectors_from_send([row[1] for row in rows])) @ queries.T  # candidates x searches
+        same_tenant = np.array([document_tenant(docs[row[0]]) for row in rows], dtype=object)[:, None] == tenants[None, :]
+        for c, s in zip(*np.nonzero((similarity >= thresholds[None, :]) & same_tenant)):
+            cid = rows[c][0]
+            if matches_filters(docs[cid], filters[s]):
+                alerts.append({"search_id": search_ids[s], "cid": cid, "similarity": float(similarity[c, s])})
+    if not alerts:
+        return 0
+    return conn.execute(text(f"""
+        INSERT INTO {ALERTS_TABLE} (search_id, candidate_id, similarity)
+        VALUES (:search_id, :cid, :similarity)
+        ON CONFLICT (search_id, candidate_id) DO NOTHING
+    """), alerts).rowcount
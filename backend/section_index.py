@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Section-level vectors for candidates (multi-vector index).
+
+Next to the one-vector-per-resume rows in `candidates`, `candidate_sections`
+holds one vector per section unit: the summary, the skills, each experience,
+each project, each degree and so on (see section_units()). Short units fit the
+model's sequence length, so nothing at the end of a long resume is lost to
+truncation, and a query matching one past role isn't diluted by the rest of
+the resume.
+
+Every row carries the sha1 of its text. Syncing a candidate compares hashes
+and only embeds units whose text is new; unchanged units keep their vectors
+and units that disappeared are deleted. Editing one experience re-embeds that
+experience only.
+
+Search ranks section hits with each model's HNSW index and aggregates them
+per candidate (best section wins) in one statement; see search_sql().
+
+Rows carry the candidate's tenant and, like `candidates`, the table is
+partitioned by tenant unless CANDIDATE_PARTITIONS=none; searches are scoped
+to one tenant. Archived candidates (candidate_archive.py) have no section
+rows, so section search covers hot candidates only.
+
+SECTION_INDEX=1 makes the embedding worker sync sections for every candidate
+it indexes. Existing candidates (or a model a space was just switched to) are
+filled with:
+  python section_index.py --sync
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+
+from db import Vector, ensure_vector_types, execute_prepared
+from embedding_index import (
+    CANDIDATE_PARTITIONS,
+    CANDIDATES_TABLE,
+    COLD_TIER,
+    DEFAULT_TENANT,
+    document_tenant,
+    ensure_tenant_columns,
+    ensure_tenant_partitions,
+    model_filter,
+    model_index_sql,
+    read_spaces,
+    split_model_spec,
+    sql_literal,
+    table_layout,
+)
+from embedding_utils import candidate_sections, encode
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
+
+SECTIONS_TABLE = "candidate_sections"
+SECTION_INDEX = os.getenv("SECTION_INDEX", "0") == "1"
+# Section hits fetched per requested candidate before aggregating (a candidate matches with several sections)
+SECTION_POOL_FACTOR = int(os.getenv("SECTION_POOL_FACTOR", "8"))
+_HNSW_EF_SEARCH_DEFAULT = 40  # pgvector's default; an HNSW scan returns at most ef_search rows
+
+# One vector per entry for these; every other section is embedded as one unit
+PER_ENTRY_SECTIONS = {"experience", "projects", "education", "certifications", "publications", "volunteer"}
+# Not worth a vector of their own
+SKIPPED_SECTIONS = {"name", "location"}
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def section_units(candidate: dict) -> List[Tuple[str, int, str, str]]:
+    """(section, ordinal, text, content hash) units of a candidate; identical units are kept once."""
+    grouped: Dict[str, List[str]] = {}
+    for section, line in candidate_sections(candidate):
+        if section not in SKIPPED_SECTIONS:
+            grouped.setdefault(section, []).append(line)
+    units, seen = [], set()
+    for section, lines in grouped.items():
+        for ordinal, content in enumerate(lines if section in PER_ENTRY_SECTIONS else ["\n".join(lines)]):
+            digest = content_hash(content)
+            if (section, digest) not in seen:
+                seen.add((section, digest))
+                units.append((section, ordinal, content, digest))
+    return units
+
+
+# --- Schema ---
+def ensure_sections_table(conn, spaces: Dict[str, Tuple[str, int]]):
+    """Create `candidate_sections` and a partial HNSW index per model in use."""
+    create_sections_table(conn)
+    ensure_tenant_columns(conn, SECTIONS_TABLE, tier=False)
+    tenant_key = "tenant_id, " if table_layout(conn, SECTIONS_TABLE) != "none" else ""
+    conn.execute(text(f"""
+        CREATE UNIQUE INDEX IF NOT EXISTS {SECTIONS_TABLE}_model_key
+        ON {SECTIONS_TABLE} ({tenant_key}model_name, model_revision, candidate_id, section, content_hash)
+    """))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {SECTIONS_TABLE}_candidate_idx ON {SECTIONS_TABLE} (candidate_id)"))
+    for spec, dim in set(spaces.values()):
+        conn.execute(text(model_index_sql(spec, dim, table=SECTIONS_TABLE)))
+
+
+def create_sections_table(conn, layout: str = CANDIDATE_PARTITIONS):
+    """Create `candidate_sections` (if missing), partitioned by tenant unless layout is 'none'."""
+    partitioned = layout != "none"
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {SECTIONS_TABLE} (
+            id BIGSERIAL,
+            candidate_id TEXT NOT NULL,
+            section TEXT NOT NULL,
+            ordinal INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            embedding vector NOT NULL,
+            model_name TEXT NOT NULL,
+            model_revision TEXT NOT NULL DEFAULT '',
+            embedding_dim INTEGER NOT NULL,
+            tenant_id TEXT NOT NULL DEFAULT {sql_literal(DEFAULT_TENANT)},
+            PRIMARY KEY ({"id, tenant_id" if partitioned else "id"})
+        ){" PARTITION BY LIST (tenant_id)" if partitioned else ""}
+    """))
+    if partitioned and table_layout(conn, SECTIONS_TABLE) != "none":
+        # Sections have no tier sub-partitions
+        ensure_tenant_partitions(conn, [DEFAULT_TENANT], SECTIONS_TABLE, layout="tenant")
+
+
+def prepare_sections(engine) -> Dict[str, Tuple[str, int]]:
+    """Idempotent schema setup; call after embedding_index.prepare_index()."""
+    with engine.begin() as conn:
+        spaces = read_spaces(conn)
+        ensure_sections_table(conn, spaces)
+    return spaces
+
+
+# --- Writes ---
+def sync_sections(conn, candidates: Dict[str, dict], specs: Iterable[str], batch_size: int = 64) -> Dict[str, int]:
+    """
+    Bring the section rows of {candidate_id: document} up to date for every model in `specs`.
+
+    Only units whose (section, content hash) has no row yet are embedded, in one
+    encode call per model for the whole batch. Rows are written to each
+    document's tenant, whose partition must exist. Returns counts of
+    embedded, reused and deleted rows.
+    """
+    ids = list(candidates)
+    wanted = {}
+    for cid, doc in candidates.items():
+        for section, ordinal, content, digest in section_units(doc):
+            wanted[(cid, section, digest)] = (ordinal, content)
+
+    counts = {"embedded": 0, "reused": 0, "deleted": 0}
+    ensure_vector_types(conn)
+    for spec in sorted(set(specs)):
+        name, revision = split_model_spec(spec)
+        model = {"model_name": name, "model_revision": revision}
+        existing = {(r[1], r[2], r[3]): (r[0], r[4]) for r in conn.execute(text(f"""
+            SELECT id, candidate_id, section, content_hash, ordinal FROM {SECTIONS_TABLE}
+            WHERE model_name = :model_name AND model_revision = :model_revision AND candidate_id = ANY(:ids)
+        """), {**model, "ids": ids})}
+
+        stale = [row_id for key, (row_id, _) in existing.items() if key not in wanted]
+        if stale:
+            conn.execute(text(f"DELETE FROM {SECTIONS_TABLE} WHERE id = ANY(:ids)"), {"ids": stale})
+        moved = [{"id": existing[key][0], "ordinal": ordinal} for key, (ordinal, _) in wanted.items()
+                 if key in existing and existing[key][1] != ordinal]
+        if moved:
+            conn.execute(text(f"UPDATE {SECTIONS_TABLE} SET ordinal = :ordinal WHERE id = :id"), moved)
+
+        new = [key for key in wanted if key not in existing]
+        if new:
+            embeddings = encode([wanted[key][1] for key in new], batch_size=batch_size, model_name=spec)
+            conn.execute(text(f"""
+                INSERT INTO {SECTIONS_TABLE}
+                    (candidate_id, section, ordinal, content, content_hash, embedding, model_name, model_revision,
+                     embedding_dim, tenant_id)
+                VALUES (:cid, :section, :ordinal, :content, :hash, CAST(:embedding AS vector),
+                        :model_name, :model_revision, :dim, :tenant)
+                ON CONFLICT DO NOTHING
+            """), [{"cid": cid, "section": section, "ordinal": wanted[(cid, section, digest)][0],
+                    "content": wanted[(cid, section, digest)][1], "hash": digest,
+                    "embedding": Vector(emb), "dim": len(emb), "tenant": document_tenant(candidates[cid]), **model}
+                   for (cid, section, digest), emb in zip(new, embeddings)])
+        counts["embedded"] += len(new)
+        counts["reused"] += len(wanted) - len(new)
+        counts["deleted"] += len(stale)
+    return counts
+
+
+def delete_sections(conn, candidate_ids: List[str]):
+    conn.execute(text(f"DELETE FROM {SECTIONS_TABLE} WHERE candidate_id = ANY(:ids)"), {"ids": list(candidate_ids)})
+
+
+# --- Reads ---
+def search_sql(dim: int, spec: str = None, tenant: str = DEFAULT_TENANT) -> str:
+    """
+    Best-section search; rows are (candidate_id, best section text, L2 distance,
+    best section, sections matched), like embedding_index.search_sql() plus two columns.
+
+    The inner query takes the :pool nearest section rows through the model's
+    HNSW index; the outer one keeps each candidate's best section and ranks
+    candidates by it.
+    """
+    return f"""
+        SELECT candidate_id,
+               (array_agg(content ORDER BY distance))[1] AS content,
+               MIN(distance) AS distance,
+               (array_agg(section ORDER BY distance))[1] AS section,
+               COUNT(*) AS sections_matched
+        FROM (
+            SELECT candidate_id, section, content,
+                   embedding::vector({int(dim)}) <-> CAST(:query_emb AS vector({int(dim)})) AS distance
+            FROM {SECTIONS_TABLE}
+            WHERE {model_filter(spec, tenant=tenant)}
+            ORDER BY distance
+            LIMIT :pool
+        ) hits
+        GROUP BY candidate_id
+        ORDER BY MIN(distance)
+        LIMIT :top_k
+    """
+
+
+def search(conn, spec: str, dim: int, query_emb, top_k: int, tenant: str = DEFAULT_TENANT):
+    """
+    Run search_sql() as a per-connection prepared statement; raises
+    hnsw.ef_search for this transaction when the pool is larger than its default.
+    """
+    ensure_vector_types(conn)
+    pool = max(top_k * SECTION_POOL_FACTOR, top_k)
+    if pool > _HNSW_EF_SEARCH_DEFAULT:
+        conn.execute(text(f"SET LOCAL hnsw.ef_search = {int(min(pool, 1000))}"))
+    return execute_prepared(conn, search_sql(dim, spec, tenant), {
+        "query_emb": Vector(query_emb), "pool": pool, "top_k": top_k,
+    }).fetchall()
+
+
+def main(argv=None):
+    from db import get_engine, get_mongo_db
+    from embedding_index import prepare_index
+
+    parser = argparse.ArgumentParser(description="Sync section-level candidate vectors.")
+    parser.add_argument("--sync", action="store_true", help="embed new or changed sections of every candidate")
+    parser.add_argument("--batch-size", type=int, default=256, help="candidates per transaction")
+    args = parser.parse_args(argv)
+    if not args.sync:
+        parser.error("nothing to do (use --sync)")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    candidates_col = get_mongo_db()[os.getenv("MONGO_CANDIDATES_COLLECTION", "resumes")]
+    engine = get_engine()
+    prepare_index(engine)
+    specs = sorted({spec for spec, _ in prepare_sections(engine).values()})
+
+    def flush(batch):
+        with engine.begin() as conn:
+            # Archived candidates have no section rows (candidate_archive.py)
+            cold = set(conn.execute(text(f"""
+                SELECT DISTINCT candidate_id FROM {CANDIDATES_TABLE} WHERE tier = :tier AND candidate_id = ANY(:ids)
+            """), {"tier": COLD_TIER, "ids": list(batch)}).scalars().all())
+            for cid in cold:
+                del batch[cid]
+            ensure_tenant_partitions(conn, {document_tenant(doc) for doc in batch.values()}, SECTIONS_TABLE)
+        with engine.begin() as conn:
+            for key, n in sync_sections(conn, batch, specs).items():
+                totals[key] += n
+
+    started = time.perf_counter()
+    totals = {"embedded": 0, "reused": 0, "deleted": 0}
+    batch, synced = {}, 0
+    # Near duplicates (candidate_dedup.py) are kept out of search
+    for doc in candidates_col.find({"duplicate_of": {"$exists": False}}).batch_size(args.batch_size):
+        batch[str(doc["_id"])] = doc
+        if len(batch) >= args.batch_size:
+            flush(batch)
+            synced += len(batch)
+            batch = {}
+            logging.info(f"{synced} candidates | {totals}")
+    if batch:
+        flush(batch)
+        synced += len(batch)
+    print(f"✓ Synced sections of {synced} candidates for {', '.join(specs)} in {time.perf_counter() - started:,.1f}s")
+    print(f"  embedded {totals['embedded']}, unchanged {totals['reused']}, deleted {totals['deleted']}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Fast response encoding for the API.
+
+FastAPI's default path runs every return value through `jsonable_encoder` and
+then `json.dumps`; for result pages and full resume documents that is most of
+the CPU spent per request. Endpoints here return bytes encoded in one pass by
+orjson (stdlib json if it isn't installed), or MessagePack when the client asks
+for it with `Accept: application/msgpack` and `msgpack` is installed.
+
+Large responses are gzip-compressed by the middleware set up in main.py
+(GZIP_MIN_SIZE, GZIP_LEVEL).
+"""
+
+import json
+from datetime import date, datetime
+from typing import Any
+
+from bson import ObjectId
+from fastapi import Request
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional: MessagePack is only offered when installed
+    msgpack = None
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _default(obj: Any):
+    """Types orjson/msgpack don't handle natively: pydantic models, ObjectIds, dates (for msgpack)."""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode to JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_msgpack(content: Any) -> bytes:
+    return msgpack.packb(content, default=_default, use_bin_type=True, datetime=False)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class MsgpackResponse(Response):
+    media_type = "application/msgpack"
+
+    def render(self, content: Any) -> bytes:
+        return dumps_msgpack(content)
+
+
+def wants_msgpack(request: Request) -> bool:
+    accept = request.headers.get("accept", "")
+    return msgpack is not None and any(t in accept for t in MSGPACK_TYPES)
+
+
+def respond(request: Request, content: Any, status_code: int = 200) -> Response:
+    """Encode `content` as MessagePack if the client accepts it, otherwise as JSON."""
+    if wants_msgpack(request):
+        return MsgpackResponse(content, status_code=status_code, headers={"Vary": "Accept"})
+    return FastJSONResponse(content, status_code=status_code, headers={"Vary": "Accept"})
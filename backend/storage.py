@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+"""
+Candidate storage behind one interface: documents, their vectors and vector search.
+
+main.py reads candidates through a CandidateRepository picked by STORAGE_BACKEND:
+
+  remote  (default) documents in MongoDB, vectors and search in PostgreSQL /
+          pgvector, new candidates indexed by the embedding worker (outbox)
+  local   everything in one directory (LOCAL_STORE_PATH): documents in SQLite,
+          each model's vectors in an append-only float32 file that is
+          memory-mapped for search; new candidates are embedded on upload
+
+The local backend needs no server, so small deployments, CI and benchmarks
+run with zero network hops (bench_storage.py compares the two). Search there
+is exact: one matrix product over the tenant's vectors per query batch, the
+same L2 distances pgvector returns. It has no tiers (include_archived changes
+nothing), and the features built on PostgreSQL or the outbox (dedup, section
+search, jobs, talent pools, saved searches) answer 503.
+
+Re-uploading a candidate appends its new vectors and marks the old ones dead;
+`python storage.py --compact` rewrites the vector files without them.
+
+  python synthetic_candidates.py --count 1000 --local ./local_store
+  python storage.py --status
+  STORAGE_BACKEND=local uvicorn main:app --port 8000
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from db import read_connection
+from embedding_index import (
+    CANDIDATES_TABLE,
+    DEFAULT_TENANT,
+    batch_search,
+    configured_spaces,
+    default_space,
+    document_tenant,
+    search,
+    similar,
+    validate_tenant,
+)
+from embedding_utils import encode, flatten_for_models, get_embedding_dimension
+from embedding_worker import enqueue_candidate
+from job_matching import top_k_matches
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "remote")
+LOCAL_STORE_PATH = os.getenv("LOCAL_STORE_PATH", os.path.join(os.path.dirname(__file__), "local_store"))
+# Vector rows per matrix product in local search
+LOCAL_SEARCH_CHUNK = int(os.getenv("LOCAL_SEARCH_CHUNK", "65536"))
+
+if STORAGE_BACKEND not in ("remote", "local"):
+    raise ValueError(f"Unknown STORAGE_BACKEND={STORAGE_BACKEND!r} (expected 'remote' or 'local')")
+
+
+class CandidateRepository(ABC):
+    """
+    Candidate documents, their vectors and vector search. Search rows are
+    (candidate_id, content, L2 distance), best first; documents come back
+    with `id` set and without `_id`.
+    """
+
+    backend = ""
+
+    @abstractmethod
+    def add(self, candidate: dict) -> Tuple[str, str]:
+        """Store a new candidate; returns (id, indexing status)."""
+
+    @abstractmethod
+    def get(self, candidate_id: str) -> Optional[dict]:
+        """A candidate document of any tenant by id; the caller checks the tenant."""
+
+    @abstractmethod
+    def iter_documents(self, candidate_ids: List[str]) -> Iterator[dict]:
+        """Yield the documents of `candidate_ids` that exist, in no particular order."""
+
+    @abstractmethod
+    def is_indexed(self, candidate_id: str, tenant: str = DEFAULT_TENANT) -> bool:
+        """Whether the candidate has searchable vectors in the tenant."""
+
+    def search(self, spec: str, dim: int, query_emb, top_k: int, tenant: str = DEFAULT_TENANT,
+               include_archived: bool = False) -> list:
+        return self.batch_search(spec, dim, [query_emb], [top_k], tenant, include_archived)[0]
+
+    @abstractmethod
+    def batch_search(self, spec: str, dim: int, query_embs, top_ks: List[int], tenant: str = DEFAULT_TENANT,
+                     include_archived: bool = False) -> List[list]:
+        """One list of search rows per query, the top_ks[i] best for query i."""
+
+    @abstractmethod
+    def similar(self, spec: str, dim: int, candidate_id: str, top_k: int, tenant: str = DEFAULT_TENANT,
+                include_archived: bool = False) -> Optional[list]:
+        """Nearest neighbours of a stored candidate, without it; None if it has no vector for `spec`."""
+
+    def stats(self) -> dict:
+        return {"backend": self.backend}
+
+
+# --- MongoDB + PostgreSQL ---
+def lookup_queries(candidate_id: str) -> List[dict]:
+    """Filters GET /candidates/{id} tries in turn: ObjectId `_id`, string `_id`, legacy `candidate_id`."""
+    queries = [{"_id": candidate_id}, {"candidate_id": candidate_id}]
+    if ObjectId.is_valid(candidate_id):
+        queries.insert(0, {"_id": ObjectId(candidate_id)})
+    return queries
+
+
+def hydration_query(candidate_ids: List[str]) -> dict:
+    """One filter for the documents of a page of search results, whatever type their `_id` has."""
+    object_ids = [ObjectId(cid) for cid in candidate_ids if ObjectId.is_valid(cid)]
+    string_ids = [cid for cid in candidate_ids if not ObjectId.is_valid(cid)]
+    return {
+        "$or": [
+            {"_id": {"$in": object_ids}},
+            {"_id": {"$in": string_ids}},
+            {"candidate_id": {"$in": candidate_ids}}
+        ]
+    }
+
+
+class RemoteRepository(CandidateRepository):
+    """Documents in MongoDB, vectors in PostgreSQL; reads go through db.read_connection() (replicas)."""
+
+    backend = "remote"
+
+    def __init__(self, mongo_client, candidates_col, outbox_col):
+        self.mongo_client = mongo_client
+        self.candidates_col = candidates_col
+        self.outbox_col = outbox_col
+
+    def add(self, candidate: dict) -> Tuple[str, str]:
+        return enqueue_candidate(self.mongo_client, self.candidates_col, self.outbox_col, candidate), "pending"
+
+    def get(self, candidate_id: str) -> Optional[dict]:
+        doc = None
+        for query in lookup_queries(candidate_id):
+            doc = self.candidates_col.find_one(query)
+            if doc:
+                break
+        if not doc:
+            return None
+        doc["id"] = str(doc.get("_id") or doc.get("candidate_id"))
+        doc.pop("_id", None)
+        return doc
+
+    def iter_documents(self, candidate_ids: List[str]) -> Iterator[dict]:
+        if not candidate_ids:
+            return
+        for doc in self.candidates_col.find(hydration_query(candidate_ids)):
+            doc["id"] = str(doc["_id"])
+            doc.pop("_id", None)
+            yield doc
+
+    def is_indexed(self, candidate_id: str, tenant: str = DEFAULT_TENANT) -> bool:
+        with read_connection() as conn:
+            return bool(conn.execute(text(f"""
+                SELECT 1 FROM {CANDIDATES_TABLE} WHERE tenant_id = :tenant AND candidate_id = :cid LIMIT 1
+            """), {"tenant": tenant, "cid": candidate_id}).scalar())
+
+    def search(self, spec: str, dim: int, query_emb, top_k: int, tenant: str = DEFAULT_TENANT,
+               include_archived: bool = False) -> list:
+        with read_connection() as conn:
+            return search(conn, spec, dim, query_emb, top_k, tenant, include_archived)
+
+    def batch_search(self, spec: str, dim: int, query_embs, top_ks: List[int], tenant: str = DEFAULT_TENANT,
+                     include_archived: bool = False) -> List[list]:
+        with read_connection() as conn:
+            return batch_search(conn, spec, dim, query_embs, top_ks, tenant, include_archived)
+
+    def similar(self, spec: str, dim: int, candidate_id: str, top_k: int, tenant: str = DEFAULT_TENANT,
+                include_archived: bool = False) -> Optional[list]:
+        with read_connection() as conn:
+            return similar(conn, spec, dim, candidate_id, top_k, tenant, include_archived)
+
+
+# --- SQLite + memory-mapped NumPy ---
+class StaticSpaces:
+    """SpaceCache's interface over the configured spaces (EMBEDDING_SPACES); there is no state table to follow."""
+
+    def __init__(self):
+        self._spaces = {space: (spec, get_embedding_dimension(spec)) for space, spec in configured_spaces().items()}
+
+    def all(self, refresh: bool = False) -> Dict[str, Tuple[str, int]]:
+        return dict(self._spaces)
+
+    def get(self, space: str = None, refresh: bool = False) -> Tuple[str, int]:
+        if space is None:
+            space = default_space()
+        if space not in self._spaces:
+            raise KeyError(space)
+        return self._spaces[space]
+
+    def models(self, refresh: bool = False) -> List[str]:
+        return sorted({spec for spec, _ in self._spaces.values()})
+
+
+class _VectorFile:
+    """One model's vectors: an append-only float32 file, memory-mapped for reads, and each row's owner."""
+
+    def __init__(self, path: str, dim: int, rows: List[tuple]):
+        self.path = path
+        self.dim = dim
+        self.ids = [row[0] for row in rows]
+        self._codes: Dict[str, int] = {}
+        self.tenants = np.array([self._code(row[1]) for row in rows], dtype=np.int32)
+        self.live = np.array([bool(row[2]) for row in rows], dtype=bool)
+        size = len(rows) * dim * 4
+        if not os.path.exists(path):
+            open(path, "wb").close()
+        elif os.path.getsize(path) > size:
+            os.truncate(path, size)  # vectors of a write whose rows never committed
+        self._map = None
+
+    def _code(self, tenant: str) -> int:
+        return self._codes.setdefault(tenant, len(self._codes))
+
+    def matrix(self) -> np.ndarray:
+        if not self.ids:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        if self._map is None or len(self._map) != len(self.ids):
+            self._map = np.memmap(self.path, dtype=np.float32, mode="r", shape=(len(self.ids), self.dim))
+        return self._map
+
+    def write(self, matrix: np.ndarray) -> int:
+        """
+        Write rows after the published ones (over those of an earlier write
+        that never committed); returns the first row number. Searches don't
+        see them until publish().
+        """
+        first = len(self.ids)
+        with open(self.path, "r+b") as fh:
+            fh.truncate(first * self.dim * 4)
+            fh.seek(0, os.SEEK_END)
+            fh.write(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+            fh.flush()
+            os.fsync(fh.fileno())
+        return first
+
+    def publish(self, ids: List[str], tenants: List[str], dead: List[int]):
+        """Make written rows searchable and retire the rows they replace, once their SQLite rows committed."""
+        self.live[dead] = False
+        self.ids.extend(ids)
+        self.tenants = np.concatenate([self.tenants, np.array([self._code(t) for t in tenants], dtype=np.int32)])
+        self.live = np.concatenate([self.live, np.ones(len(ids), dtype=bool)])
+
+    def chunks(self, tenant: str, chunk_size: int = LOCAL_SEARCH_CHUNK, skip: Optional[int] = None):
+        """Yield (ids, matrix) of the tenant's live rows (except row `skip`), chunk_size rows of the file at a time."""
+        code = self._codes.get(tenant)
+        if code is None:
+            return
+        matrix = self.matrix()
+        for start in range(0, len(self.ids), chunk_size):
+            mask = self.live[start:start + chunk_size] & (self.tenants[start:start + chunk_size] == code)
+            if skip is not None and start <= skip < start + chunk_size:
+                mask[skip - start] = False
+            rows = np.flatnonzero(mask)
+            if len(rows):
+                yield [self.ids[start + r] for r in rows], np.asarray(matrix[start + rows])
+
+
+def _file_name(spec: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", spec).strip("_")[:40]
+    return f"{slug}_{hashlib.sha1(spec.encode()).hexdigest()[:8]}.f32"
+
+
+class LocalRepository(CandidateRepository):
+    """
+    Documents in SQLite, vectors in memory-mapped files, all under `path`.
+    One process owns a store at a time; calls are serialized by a lock.
+    """
+
+    backend = "local"
+
+    def __init__(self, path: str = LOCAL_STORE_PATH, spaces: Optional[StaticSpaces] = None):
+        self.path = path
+        self.spaces = spaces or StaticSpaces()
+        os.makedirs(os.path.join(path, "vectors"), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(path, "candidates.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id TEXT PRIMARY KEY,
+                tenant_id TEXT NOT NULL,
+                doc TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS vectors (
+                spec TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                candidate_id TEXT NOT NULL,
+                tenant_id TEXT NOT NULL,
+                content TEXT NOT NULL,
+                live INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (spec, row)
+            );
+            CREATE INDEX IF NOT EXISTS vectors_candidate_idx ON vectors (candidate_id, spec);
+        """)
+        self._lock = threading.RLock()
+        self._files: Dict[str, _VectorFile] = {}
+
+    def _file(self, spec: str, dim: int) -> _VectorFile:
+        if spec not in self._files:
+            rows = self._db.execute(
+                "SELECT candidate_id, tenant_id, live FROM vectors WHERE spec = ? ORDER BY row", (spec,)).fetchall()
+            path = os.path.join(self.path, "vectors", _file_name(spec))
+            tmp = path + ".tmp"
+            if os.path.exists(tmp):
+                # Left by an interrupted compact(): it holds exactly the committed rows if the commit went through
+                if os.path.getsize(tmp) == len(rows) * dim * 4:
+                    os.replace(tmp, path)
+                else:
+                    os.remove(tmp)
+            self._files[spec] = _VectorFile(path, dim, rows)
+        return self._files[spec]
+
+    # --- Writes ---
+    def add(self, candidate: dict) -> Tuple[str, str]:
+        candidate_id = str(candidate.get("_id") or ObjectId())
+        self.add_many([(candidate_id, candidate)])
+        return candidate_id, "indexed"
+
+    def add_many(self, items: List[Tuple[str, dict]], batch_size: int = 64) -> int:
+        """Store (candidate_id, document) pairs and their vectors for every model; replaces existing ids."""
+        if not items:
+            return 0
+        docs = [(cid, {k: v for k, v in doc.items() if k != "_id"}) for cid, doc in items]
+        specs = self.spaces.models()
+        contents = [flatten_for_models(doc, specs) for _, doc in docs]  # each model's text fits its own budget
+        texts = {spec: [content[spec] for content in contents] for spec in specs}
+        tenants = [document_tenant(doc) for _, doc in docs]
+        ids = [cid for cid, _ in docs]
+        embeddings = {spec: encode(texts[spec], batch_size=batch_size, model_name=spec) for spec in specs}
+        with self._lock:
+            written = []
+            with self._db:
+                self._db.executemany("INSERT OR REPLACE INTO documents (id, tenant_id, doc) VALUES (?, ?, ?)",
+                                     [(cid, tenant, json.dumps(doc, default=str))
+                                      for (cid, doc), tenant in zip(docs, tenants)])
+                for spec, matrix in embeddings.items():
+                    vectors = self._file(spec, matrix.shape[1])
+                    dead = self._kill(spec, ids)
+                    first = vectors.write(matrix)
+                    self._db.executemany(
+                        "INSERT INTO vectors (spec, row, candidate_id, tenant_id, content) VALUES (?, ?, ?, ?, ?)",
+                        [(spec, first + i, cid, tenant, content)
+                         for i, (cid, tenant, content) in enumerate(zip(ids, tenants, texts[spec]))])
+                    written.append((vectors, dead))
+            # Searches only see the new vectors once the rows naming them have committed
+            for vectors, dead in written:
+                vectors.publish(ids, tenants, dead)
+        return len(items)
+
+    def _kill(self, spec: str, candidate_ids: List[str]) -> List[int]:
+        """Mark the candidates' current rows dead in SQLite; returns their row numbers."""
+        placeholders = ",".join("?" * len(candidate_ids))
+        rows = [r[0] for r in self._db.execute(
+            f"SELECT row FROM vectors WHERE spec = ? AND live = 1 AND candidate_id IN ({placeholders})",
+            (spec, *candidate_ids))]
+        if rows:
+            self._db.execute(f"UPDATE vectors SET live = 0 WHERE spec = ? AND row IN ({','.join('?' * len(rows))})",
+                             (spec, *rows))
+        return rows
+
+    def compact(self) -> Dict[str, int]:
+        """
+        Rewrite every vector file without dead rows; returns the rows dropped per model.
+
+        The new files are written next to the old ones and only swapped in
+        once the renumbered rows committed, so a failure leaves rows and files
+        as they were. A crash between the commit and the swap is finished
+        when the store is next opened (_file).
+        """
+        dropped = {}
+        with self._lock:
+            rewritten = []
+            try:
+                for spec, dim in set(self.spaces.all().values()):
+                    vectors = self._file(spec, dim)
+                    keep = np.flatnonzero(vectors.live)
+                    dropped[spec] = len(vectors.ids) - len(keep)
+                    if not dropped[spec]:
+                        continue
+                    tmp = vectors.path + ".tmp"
+                    rewritten.append((spec, vectors, tmp))
+                    with open(tmp, "wb") as fh:
+                        fh.write(np.ascontiguousarray(vectors.matrix()[keep]).tobytes())
+                        fh.flush()
+                        os.fsync(fh.fileno())
+                with self._db:
+                    for spec, _, _ in rewritten:
+                        kept = self._db.execute("""
+                            SELECT candidate_id, tenant_id, content FROM vectors WHERE spec = ? AND live = 1 ORDER BY row
+                        """, (spec,)).fetchall()
+                        self._db.execute("DELETE FROM vectors WHERE spec = ?", (spec,))
+                        self._db.executemany(
+                            "INSERT INTO vectors (spec, row, candidate_id, tenant_id, content) VALUES (?, ?, ?, ?, ?)",
+                            [(spec, i, *row) for i, row in enumerate(kept)])
+            except BaseException:
+                for _, _, tmp in rewritten:
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+                raise
+            for spec, vectors, tmp in rewritten:
+                vectors._map = None
+                os.replace(tmp, vectors.path)
+                del self._files[spec]
+        return dropped
+
+    # --- Reads ---
+    def get(self, candidate_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT doc FROM documents WHERE id = ?", (candidate_id,)).fetchone()
+        if not row:
+            return None
+        return {**json.loads(row[0]), "id": candidate_id}
+
+    def iter_documents(self, candidate_ids: List[str]) -> Iterator[dict]:
+        ids = list(dict.fromkeys(candidate_ids))
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            with self._lock:
+                rows = self._db.execute(f"SELECT id, doc FROM documents WHERE id IN ({','.join('?' * len(chunk))})",
+                                        chunk).fetchall()
+            for cid, doc in rows:
+                yield {**json.loads(doc), "id": cid}
+
+    def is_indexed(self, candidate_id: str, tenant: str = DEFAULT_TENANT) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM vectors WHERE candidate_id = ? AND tenant_id = ? AND live = 1",
+                                    (candidate_id, tenant)).fetchone() is not None
+
+    def _rows(self, spec: str, matches: List[List[Tuple[str, float]]]) -> List[list]:
+        ids = list({cid for hits in matches for cid, _ in hits})
+        content = {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            content.update(self._db.execute(
+                f"SELECT candidate_id, content FROM vectors WHERE spec = ? AND live = 1 "
+                f"AND candidate_id IN ({','.join('?' * len(chunk))})", (spec, *chunk)).fetchall())
+        return [[(cid, content.get(cid, ""), distance) for cid, distance in hits] for hits in matches]
+
+    def batch_search(self, spec: str, dim: int, query_embs, top_ks: List[int], tenant: str = DEFAULT_TENANT,
+                     include_archived: bool = False) -> List[list]:
+        queries = np.asarray(query_embs, dtype=np.float32).reshape(len(top_ks), dim)
+        with self._lock:
+            vectors = self._file(spec, dim)
+            matches = top_k_matches(queries, vectors.chunks(validate_tenant(tenant)), max(top_ks))
+            return self._rows(spec, [hits[:k] for hits, k in zip(matches, top_ks)])
+
+    def similar(self, spec: str, dim: int, candidate_id: str, top_k: int, tenant: str = DEFAULT_TENANT,
+                include_archived: bool = False) -> Optional[list]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT row FROM vectors WHERE spec = ? AND candidate_id = ? AND tenant_id = ? AND live = 1",
+                (spec, candidate_id, validate_tenant(tenant))).fetchone()
+            if row is None:
+                return None
+            vectors = self._file(spec, dim)
+            query = np.asarray(vectors.matrix()[row[0]])[None, :]
+            matches = top_k_matches(query, vectors.chunks(tenant, skip=row[0]), top_k)
+            return self._rows(spec, matches)[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            documents = self._db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            vectors = {}
+            for spec, dim in sorted(set(self.spaces.all().values())):
+                f = self._file(spec, dim)
+                vectors[spec] = {"rows": int(f.live.sum()), "dead": int(len(f.ids) - f.live.sum()),
+                                 "bytes": os.path.getsize(f.path)}
+        return {"backend": self.backend, "path": self.path, "documents": documents, "vectors": vectors}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="The local (SQLite + NumPy) candidate store.")
+    parser.add_argument("--path", default=LOCAL_STORE_PATH, help=f"store directory (default {LOCAL_STORE_PATH})")
+    parser.add_argument("--status", action="store_true", help="documents, vectors and file sizes")
+    parser.add_argument("--compact", action="store_true", help="drop the vectors of replaced candidates")
+    args = parser.parse_args(argv)
+    if not (args.status or args.compact):
+        parser.error("nothing to do (use --status or --compact)")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    store = LocalRepository(args.path)
+    if args.compact:
+        for spec, n in store.compact().items():
+            print(f"✓ {spec}: {n:,} dead rows dropped")
+    if args.status:
+        stats = store.stats()
+        print(f"✓ {stats['path']}: {stats['documents']:,} documents")
+        for spec, s in stats["vectors"].items():
+            print(f"  {spec:<40} {s['rows']:>10,} rows {s['dead']:>8,} dead  {s['bytes'] / 1048576:,.1f} MB")
+    store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
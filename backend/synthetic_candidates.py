@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic candidate generator for benchmarks and load tests.
+
+Every candidate is derived only from (seed, index), so any slice of the corpus
+can be regenerated identically, in any order or in parallel. Documents are
+schema-valid CandidateMongo dicts and can be streamed to NDJSON, MongoDB,
+PostgreSQL (with embeddings), a local store (storage.py) or any combination
+of those.
+
+Usage:
+  python synthetic_candidates.py --count 100000 --ndjson candidates.ndjson
+  python synthetic_candidates.py --count 50000 --seed 7 --mongo --postgres
+  python synthetic_candidates.py --count 1000 --start 50000 --mongo --postgres
+  python synthetic_candidates.py --count 50000 --seed 7 --local ./local_store
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from itertools import islice
+from typing import Dict, Iterator, List
+
+from bson import ObjectId
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
+
+# --- Vocabulary ---
+FIRST_NAMES = [
+    "James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda",
+    "David", "Elizabeth", "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica",
+    "Thomas", "Sarah", "Wei", "Li", "Priya", "Arjun", "Aisha", "Omar", "Sofia", "Mateo",
+    "Yuki", "Haruto", "Fatima", "Chen", "Ananya", "Rohan", "Olga", "Ivan", "Lucia",
+    "Kwame", "Amara", "Noah", "Emma", "Liam", "Olivia", "Lucas", "Mia", "Urvi", "Diego",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+    "Rodriguez", "Martinez", "Hernandez", "Lopez", "Wilson", "Anderson", "Taylor",
+    "Thomas", "Moore", "Lee", "Wang", "Zhang", "Patel", "Sharma", "Kumar", "Singh",
+    "Khan", "Ali", "Nguyen", "Kim", "Park", "Tanaka", "Sato", "Müller", "Schmidt",
+    "Rossi", "Silva", "Santos", "Okafor", "Mensah", "Ivanova", "Rashinkar", "Cohen",
+]
+CITIES = [
+    "San Francisco, USA", "New York, USA", "Seattle, USA", "Austin, USA", "Boston, USA",
+    "London, UK", "Berlin, Germany", "Amsterdam, Netherlands", "Toronto, Canada",
+    "Bangalore, India", "Pune, India", "Hyderabad, India", "Singapore, Singapore",
+    "Sydney, Australia", "Tokyo, Japan", "Paris, France", "Lagos, Nigeria", "Remote",
+]
+COMPANIES = [
+    "DataCorp", "TechNova", "CloudScale", "FinEdge", "HealthSync", "RetailHub",
+    "Streamly", "QuantumLeap Labs", "BrightPath", "Nimbus Systems", "PixelForge",
+    "SecureNet", "GreenGrid Energy", "Logistiq", "EduSpark", "Medisphere", "Fintrio",
+    "AdVantage", "Orbital Analytics", "ByteWorks", "Acme Corp", "Globex", "Initech",
+]
+UNIVERSITIES = [
+    "Tech University", "State University", "Institute of Technology", "City College",
+    "National University", "University of Engineering", "Metropolitan University",
+    "Polytechnic Institute", "Global Business School", "University of Design",
+]
+DEGREES = [("BSc", 0.45), ("BEng", 0.15), ("MSc", 0.25), ("MBA", 0.07), ("PhD", 0.08)]
+SOFT_SKILLS = [
+    "Communication", "Leadership", "Teamwork", "Problem Solving", "Time Management",
+    "Mentoring", "Stakeholder Management", "Critical Thinking", "Adaptability",
+    "Creativity", "Negotiation", "Presentation",
+]
+LANGUAGES = [("English", 0.95), ("Spanish", 0.15), ("Hindi", 0.15), ("Mandarin", 0.1),
+             ("German", 0.08), ("French", 0.1), ("Japanese", 0.05), ("Portuguese", 0.05)]
+INTERESTS = [
+    "Hiking", "Chess", "Photography", "Open Source", "Running", "Cooking", "Music",
+    "Reading", "Travel", "Basketball", "Gaming", "Cycling", "Painting", "Yoga",
+]
+ACHIEVEMENT_TEMPLATES = [
+    "Reduced {thing} latency by {pct}%",
+    "Grew {thing} adoption to {n}k users",
+    "Won {org} hackathon ({year})",
+    "Cut {thing} costs by {pct}%",
+    "Promoted twice in {n} years",
+]
+VERBS = [
+    "Designed", "Built", "Led", "Optimized", "Maintained", "Migrated", "Automated",
+    "Launched", "Scaled", "Refactored", "Mentored", "Owned", "Shipped", "Improved",
+]
+
+# Role archetypes: (weight, title ladder, core skills, secondary skills, domain nouns, cert issuers)
+ROLES = {
+    "data_scientist": (0.12, ["Data Analyst", "Data Scientist", "Senior Data Scientist", "Lead Data Scientist"],
+                       ["Python", "SQL", "Pandas", "scikit-learn", "Statistics"],
+                       ["TensorFlow", "PyTorch", "Spark", "Tableau", "R", "NLP", "XGBoost", "Airflow"],
+                       ["churn model", "forecasting pipeline", "recommendation engine", "A/B testing framework"],
+                       ["Google", "Coursera", "AWS"]),
+    "ml_engineer": (0.08, ["ML Engineer", "Senior ML Engineer", "Staff ML Engineer", "AI Researcher"],
+                    ["Python", "PyTorch", "Deep Learning", "MLOps"],
+                    ["TensorFlow", "Kubernetes", "CUDA", "Transformers", "ONNX", "Ray", "NLP", "Computer Vision"],
+                    ["model serving platform", "feature store", "training pipeline", "LLM evaluation harness"],
+                    ["NVIDIA", "Google", "AWS"]),
+    "frontend": (0.14, ["Frontend Developer", "Senior Frontend Engineer", "UI Engineer", "Frontend Lead"],
+                 ["JavaScript", "TypeScript", "React", "HTML", "CSS"],
+                 ["Next.js", "Redux", "Vue.js", "Tailwind CSS", "Jest", "Webpack", "GraphQL", "Figma"],
+                 ["design system", "checkout flow", "dashboard", "component library"],
+                 ["Meta", "Google"]),
+    "backend": (0.18, ["Backend Developer", "Software Engineer", "Senior Backend Engineer", "Principal Engineer"],
+                ["Java", "Python", "SQL", "REST APIs"],
+                ["Spring Boot", "Go", "Node.js", "PostgreSQL", "Kafka", "Redis", "gRPC", "FastAPI", "MongoDB"],
+                ["payments service", "order API", "event pipeline", "authentication service"],
+                ["Oracle", "AWS", "Google"]),
+    "fullstack": (0.12, ["Full Stack Developer", "Software Engineer", "Senior Full Stack Engineer", "Tech Lead"],
+                  ["JavaScript", "TypeScript", "Node.js", "React", "SQL"],
+                  ["PostgreSQL", "Express", "Docker", "AWS", "GraphQL", "Next.js", "MongoDB"],
+                  ["SaaS platform", "e-commerce site", "admin portal", "booking system"],
+                  ["AWS", "Google"]),
+    "devops": (0.09, ["Systems Administrator", "DevOps Engineer", "Site Reliability Engineer", "Platform Lead"],
+               ["Linux", "Docker", "Kubernetes", "AWS", "CI/CD"],
+               ["Terraform", "Ansible", "Prometheus", "Grafana", "Jenkins", "GCP", "Azure", "Bash", "Helm"],
+               ["deployment pipeline", "observability stack", "Kubernetes cluster", "cost dashboard"],
+               ["AWS", "CNCF", "HashiCorp", "Microsoft"]),
+    "mobile": (0.06, ["Mobile Developer", "iOS Engineer", "Android Engineer", "Mobile Lead"],
+               ["Swift", "Kotlin", "Mobile Development"],
+               ["React Native", "Flutter", "Firebase", "SwiftUI", "Jetpack Compose", "REST APIs"],
+               ["mobile app", "offline sync", "push notification service", "in-app purchases"],
+               ["Google", "Apple"]),
+    "product": (0.08, ["Associate Product Manager", "Product Manager", "Senior Product Manager", "Director of Product"],
+                ["Product Strategy", "Roadmapping", "Agile", "User Research"],
+                ["SQL", "Jira", "A/B Testing", "SaaS", "Analytics", "Figma", "OKRs"],
+                ["onboarding funnel", "pricing page", "mobile roadmap", "B2B analytics product"],
+                ["Scrum Alliance", "Pragmatic Institute"]),
+    "design": (0.05, ["UI Designer", "UX Designer", "Senior Product Designer", "Design Lead"],
+               ["Figma", "User Research", "Prototyping", "Wireframing"],
+               ["Sketch", "Adobe XD", "Design Systems", "Usability Testing", "Accessibility", "HTML", "CSS"],
+               ["onboarding redesign", "design system", "mobile app redesign", "accessibility audit"],
+               ["Google", "Nielsen Norman Group"]),
+    "data_engineer": (0.05, ["Data Engineer", "Senior Data Engineer", "Analytics Engineer", "Data Platform Lead"],
+                      ["Python", "SQL", "Spark", "Airflow"],
+                      ["dbt", "Kafka", "Snowflake", "BigQuery", "AWS", "Scala", "Databricks"],
+                      ["data warehouse", "streaming ingestion", "ELT pipeline", "data quality checks"],
+                      ["Databricks", "Snowflake", "Google"]),
+    "qa": (0.03, ["QA Analyst", "QA Engineer", "SDET", "QA Lead"],
+           ["Test Automation", "Selenium", "Python"],
+           ["Cypress", "Java", "JMeter", "Postman", "CI/CD", "Playwright"],
+           ["regression suite", "load testing framework", "release checklist", "test harness"],
+           ["ISTQB"]),
+}
+
+_ROLE_NAMES = list(ROLES)
+_ROLE_WEIGHTS = [ROLES[r][0] for r in _ROLE_NAMES]
+CURRENT_YEAR = 2025
+
+
+def _weighted(rng: random.Random, pairs):
+    values, weights = zip(*pairs)
+    return rng.choices(values, weights=weights, k=1)[0]
+
+
+def _count(rng: random.Random, weights: List[float]) -> int:
+    """Draw a small count where weights[i] is the relative probability of i."""
+    return rng.choices(range(len(weights)), weights=weights, k=1)[0]
+
+
+def _slug(*parts: str) -> str:
+    return "".join(ch for ch in "".join(parts).lower() if ch.isalnum())
+
+
+def _month(year: int, rng: random.Random) -> str:
+    return f"{year}-{rng.randint(1, 12):02d}"
+
+
+def candidate_object_id(seed: int, index: int) -> ObjectId:
+    """Stable Mongo _id for a synthetic candidate, so reloads address the same rows."""
+    return ObjectId(hashlib.sha1(f"{seed}:{index}".encode()).digest()[:12])
+
+
+def generate_candidate(seed: int, index: int) -> Dict:
+    """Build one schema-valid candidate document from (seed, index)."""
+    rng = random.Random(f"{seed}:{index}")
+    role = rng.choices(_ROLE_NAMES, weights=_ROLE_WEIGHTS, k=1)[0]
+    _, ladder, core, secondary, nouns, issuers = ROLES[role]
+
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    handle = _slug(first, last) + str(index)
+    city = rng.choice(CITIES)
+    years_exp = min(int(rng.expovariate(1 / 6.0)), 30)
+    seniority = min(years_exp // 4, len(ladder) - 1)
+
+    skills_technical = core[:] + rng.sample(secondary, k=rng.randint(2, min(6, len(secondary))))
+    rng.shuffle(skills_technical)
+
+    # Education: most have one degree, some two, a few none listed
+    education = []
+    grad_year = CURRENT_YEAR - years_exp
+    for _ in range(_count(rng, [0.05, 0.7, 0.22, 0.03])):
+        degree = _weighted(rng, DEGREES)
+        length = {"PhD": 5, "MSc": 2, "MBA": 2}.get(degree, 4)
+        education.append({
+            "degree": degree,
+            "major": rng.choice(["Computer Science", "Software Engineering", "Statistics", "Mathematics",
+                                 "Information Systems", "Electrical Engineering", "Design", "Business"]),
+            "university": rng.choice(UNIVERSITIES),
+            "location": rng.choice(CITIES),
+            "start_date": _month(grad_year - length, rng),
+            "end_date": _month(grad_year, rng),
+            "gpa": f"{rng.uniform(2.8, 4.0):.1f}" if rng.random() < 0.6 else "",
+        })
+        grad_year -= length
+
+    # Experience: walk the career backwards from today
+    experience = []
+    end_year = CURRENT_YEAR
+    n_jobs = max(1, min(1 + years_exp // 3, _count(rng, [0, 0.3, 0.3, 0.2, 0.12, 0.08]) + 1))
+    for j in range(n_jobs):
+        tenure = max(1, int(rng.gauss(2.5, 1.2)))
+        start_year = end_year - tenure
+        title = ladder[max(0, seniority - j)]
+        techs = rng.sample(skills_technical, k=min(len(skills_technical), rng.randint(2, 5)))
+        experience.append({
+            "job_title": title,
+            "company": rng.choice(COMPANIES),
+            "location": city if rng.random() < 0.7 else rng.choice(CITIES),
+            "start_date": _month(start_year, rng),
+            "end_date": "Present" if j == 0 else _month(end_year, rng),
+            "responsibilities": [
+                f"{rng.choice(VERBS)} {rng.choice(nouns)} using {rng.choice(techs)}"
+                for _ in range(rng.randint(2, 6))
+            ],
+            "technologies_used": techs,
+        })
+        end_year = start_year
+
+    projects = []
+    for _ in range(_count(rng, [0.3, 0.3, 0.25, 0.1, 0.05])):
+        noun = rng.choice(nouns)
+        techs = rng.sample(skills_technical, k=min(len(skills_technical), rng.randint(1, 4)))
+        projects.append({
+            "project_name": noun.title(),
+            "description": f"{rng.choice(VERBS)} a {noun} with {', '.join(techs)}.",
+            "technologies": techs,
+            "link": f"https://github.com/{handle}/{_slug(noun)}",
+        })
+
+    certifications = []
+    for k in range(_count(rng, [0.5, 0.3, 0.15, 0.05])):
+        issuer = rng.choice(issuers)
+        cid = f"{rng.randrange(10**6, 10**7)}"
+        year = rng.randint(CURRENT_YEAR - 6, CURRENT_YEAR)
+        certifications.append({
+            "name": f"{issuer} Certified {rng.choice(core)} {'Professional' if k else 'Associate'}",
+            "issuing_organization": issuer,
+            "issue_date": _month(year, rng),
+            "expiration_date": _month(year + 3, rng) if rng.random() < 0.5 else None,
+            "credential_id": cid,
+            "credential_url": f"https://certs.example.com/{_slug(issuer)}/{cid}",
+        })
+
+    achievements = [
+        rng.choice(ACHIEVEMENT_TEMPLATES).format(
+            thing=rng.choice(nouns), pct=rng.randint(10, 80), n=rng.randint(2, 500),
+            org=rng.choice(COMPANIES), year=rng.randint(CURRENT_YEAR - 10, CURRENT_YEAR))
+        for _ in range(_count(rng, [0.35, 0.35, 0.2, 0.1]))
+    ]
+
+    research_heavy = role in ("ml_engineer", "data_scientist") or any(e["degree"] == "PhD" for e in education)
+    publications = [
+        {
+            "title": f"On {rng.choice(core)} for {rng.choice(nouns)}s",
+            "journal": rng.choice(["NeurIPS", "ICML", "KDD", "ACL", "IEEE Access", "arXiv"]),
+            "date": _month(rng.randint(CURRENT_YEAR - 10, CURRENT_YEAR), rng),
+            "url": f"https://papers.example.com/{handle}/{p}",
+        }
+        for p in range(_count(rng, [0.4, 0.3, 0.2, 0.1] if research_heavy else [0.95, 0.05]))
+    ]
+
+    volunteer = [
+        {
+            "role": rng.choice(["Mentor", "Organizer", "Instructor", "Volunteer Developer"]),
+            "organization": rng.choice(["Code.org", "Girls Who Code", "Local Food Bank", "PyData", "Habitat"]),
+            "start_date": _month(CURRENT_YEAR - 3, rng),
+            "end_date": "Present",
+            "description": f"Helped with {rng.choice(nouns)} workshops.",
+        }
+        for _ in range(_count(rng, [0.75, 0.2, 0.05]))
+    ]
+
+    return {
+        "personal_info": {
+            "full_name": f"{first} {last}",
+            "email": f"{handle}@example.com",
+            "phone": f"+1{rng.randrange(10**9, 10**10)}",
+            "linkedin": f"https://linkedin.com/in/{handle}",
+            "github": f"https://github.com/{handle}" if role not in ("product", "design") or rng.random() < 0.2 else "",
+            "portfolio": f"https://{handle}.dev" if rng.random() < 0.3 else "",
+            "address": city,
+            "summary": f"{ladder[seniority]} with {years_exp}+ years of experience in "
+                       f"{', '.join(skills_technical[:3])}. Focused on {rng.choice(nouns)}s.",
+        },
+        "education": education,
+        "experience": experience,
+        "projects": projects,
+        "skills": {
+            "technical": skills_technical,
+            "soft": rng.sample(SOFT_SKILLS, k=rng.randint(2, 5)),
+            "languages": [lang for lang, p in LANGUAGES if rng.random() < p] or ["English"],
+        },
+        "certifications": certifications,
+        "achievements": achievements,
+        "publications": publications,
+        "additional_info": {
+            "interests": rng.sample(INTERESTS, k=rng.randint(0, 4)),
+            "volunteer_experience": volunteer,
+        },
+    }
+
+
+def generate_candidates(count: int, seed: int = 42, start: int = 0) -> Iterator[Dict]:
+    """Yield `count` candidates for indexes [start, start + count)."""
+    for index in range(start, start + count):
+        yield generate_candidate(seed, index)
+
+
+def _batches(iterable, size: int):
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+# --- Sinks ---
+def write_ndjson(batch: List[Dict], fh) -> None:
+    fh.write("".join(json.dumps(doc, ensure_ascii=False) + "\n" for doc in batch))
+
+
+def write_mongo(batch: List[Dict], ids: List[ObjectId], collection) -> int:
+    from pymongo.errors import BulkWriteError
+    from candidate_dedup import with_dedup_keys
+    docs = [{"_id": oid, **with_dedup_keys(doc)} for oid, doc in zip(ids, batch)]
+    try:
+        return len(collection.insert_many(docs, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        # Re-running a seed re-generates the same _ids; count those as already loaded
+        return e.details.get("nInserted", 0)
+
+
+def write_postgres(batch: List[Dict], ids: List[ObjectId], engine, models: List[str]) -> int:
+    from embedding_index import store_embeddings
+    from embedding_utils import flatten_for_models
+    items = [(str(oid), flatten_for_models(doc, models)) for oid, doc in zip(ids, batch)]
+    with engine.begin() as conn:
+        store_embeddings(conn, items, models)
+    return len(batch)
+
+
+def write_local(batch: List[Dict], ids: List[ObjectId], store) -> int:
+    return store.add_many([(str(oid), doc) for oid, doc in zip(ids, batch)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate deterministic synthetic candidates.")
+    parser.add_argument("--count", type=int, default=1000, help="number of candidates to generate")
+    parser.add_argument("--seed", type=int, default=42, help="corpus seed")
+    parser.add_argument("--start", type=int, default=0, help="first candidate index (for sharded runs)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--ndjson", metavar="PATH", help="write NDJSON to PATH ('-' for stdout)")
+    parser.add_argument("--mongo", action="store_true", help="insert documents into MongoDB")
+    parser.add_argument("--postgres", action="store_true", help="embed and insert into PostgreSQL")
+    parser.add_argument("--local", metavar="DIR", help="embed and insert into a local store (storage.py)")
+    parser.add_argument("--validate", action="store_true", help="validate each document against CandidateMongo")
+    args = parser.parse_args(argv)
+
+    if not (args.ndjson or args.mongo or args.postgres or args.local):
+        parser.error("choose at least one sink: --ndjson, --mongo, --postgres, --local")
+
+    collection = engine = store = None
+    models = []
+    if args.mongo:
+        from db import get_candidates_collection
+        collection = get_candidates_collection()
+    if args.postgres:
+        from db import get_engine
+        from embedding_index import prepare_index
+        engine = get_engine()
+        models = sorted({spec for spec, _ in prepare_index(engine).values()})
+    if args.local:
+        from storage import LocalRepository
+        store = LocalRepository(args.local)
+    validator = None
+    if args.validate:
+        from models import CandidateMongo
+        validator = CandidateMongo.model_validate
+
+    out = None
+    if args.ndjson:
+        out = sys.stdout if args.ndjson == "-" else open(args.ndjson, "w", encoding="utf-8")
+    log = sys.stderr if out is sys.stdout else sys.stdout
+
+    started = time.perf_counter()
+    done = mongo_rows = pg_rows = local_rows = 0
+    try:
+        index = args.start
+        for batch in _batches(generate_candidates(args.count, args.seed, args.start), args.batch_size):
+            if validator:
+                for doc in batch:
+                    validator(doc)
+            ids = [candidate_object_id(args.seed, i) for i in range(index, index + len(batch))]
+            index += len(batch)
+            if out:
+                write_ndjson(batch, out)
+            if collection is not None:
+                mongo_rows += write_mongo(batch, ids, collection)
+            if engine is not None:
+                pg_rows += write_postgres(batch, ids, engine, models)
+            if store is not None:
+                local_rows += write_local(batch, ids, store)
+            done += len(batch)
+            elapsed = time.perf_counter() - started
+            print(f"[{done}/{args.count}] {done / elapsed:,.0f} docs/s", file=log)
+    finally:
+        if out and out is not sys.stdout:
+            out.close()
+
+    print(f"Generated {done} candidates (seed={args.seed}, start={args.start}) "
+          f"in {time.perf_counter() - started:.1f}s", file=log)
+    if args.mongo:
+        print(f"  MongoDB: {mongo_rows} inserted", file=log)
+    if args.postgres:
+        print(f"  PostgreSQL: {pg_rows} inserted", file=log)
+    if args.local:
+        print(f"  Local store: {local_rows} inserted", file=log)
+
+
+if __name__ == "__main__":
+    main()
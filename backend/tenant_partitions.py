@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Tenant partitions of `candidates` and `candidate_sections`.
+
+Both tables are LIST-partitioned by tenant_id (CANDIDATE_PARTITIONS, see
+embedding_index.py), and with CANDIDATE_PARTITIONS=tenant,tier each tenant's
+candidates are split again into hot and cold tiers. Every search names its
+tenant as a literal, so the planner reads a single partition and its own
+HNSW index. Partitions of new tenants are created by the embedding worker on
+first ingest; --add-tenant creates them ahead of time.
+
+Tables created before partitioning (or, for `candidates`, partitioned by
+tenant only while CANDIDATE_PARTITIONS=tenant,tier) are converted with
+--migrate: in one transaction (searches and ingest wait on the table lock
+meanwhile) the rows are copied into a partitioned table of the same name and
+the vector indexes are rebuilt on every partition. Plan for the time an HNSW
+build of the whole table takes.
+
+  python tenant_partitions.py --status
+  python tenant_partitions.py --add-tenant acme
+  python tenant_partitions.py --migrate
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from embedding_index import (
+    CANDIDATE_PARTITIONS,
+    CANDIDATES_TABLE,
+    DEFAULT_TENANT,
+    create_candidates_table,
+    ensure_tenant_partitions,
+    ensure_unique_rows,
+    forget_partitions,
+    has_column,
+    model_index_sql,
+    partitions,
+    prepare_index,
+    read_spaces,
+    sql_literal,
+    table_layout,
+)
+from section_index import SECTIONS_TABLE, create_sections_table, ensure_sections_table, prepare_sections
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
+
+
+def status(conn) -> dict:
+    """{table: (layout, {(tenant, tier): rows}, partitions)} of the tenant tables that exist."""
+    report = {}
+    for table in (CANDIDATES_TABLE, SECTIONS_TABLE):
+        layout = table_layout(conn, table)
+        if layout is None:
+            continue
+        tenant = "tenant_id" if has_column(conn, "tenant_id", table) else sql_literal(DEFAULT_TENANT)
+        tier = "tier" if has_column(conn, "tier", table) else "''"
+        counts = {(row[0], row[1]): row[2] for row in conn.execute(text(f"""
+            SELECT {tenant}, {tier}, COUNT(*) FROM {table} GROUP BY 1, 2 ORDER BY 1, 2
+        """))}
+        report[table] = (layout, counts, partitions(conn, table))
+    return report
+
+
+def _rename_partitions(conn, table: str, suffix: str):
+    for child, partitioned in partitions(conn, table):
+        if partitioned:
+            _rename_partitions(conn, child, suffix)
+        conn.execute(text(f"ALTER TABLE {child} RENAME TO {child}{suffix}"))
+
+
+def migrate_table(conn, table: str, create, build_indexes, layout: str) -> int:
+    """
+    Replace a table by one partitioned with `layout` holding the same rows
+    (ids included). Returns the rows copied, or -1 if it has that layout already.
+    """
+    if table_layout(conn, table) in (None, layout):
+        return -1
+    old = f"{table}_unpartitioned"
+    conn.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(f"ALTER TABLE {table} RENAME TO {old}"))
+    # Free the partition names as well (a re-partitioning keeps the tenant partitions' names)
+    _rename_partitions(conn, old, "_old")
+    # Free the index, constraint and sequence names for the new table
+    for constraint in conn.execute(text("""
+        SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:old) AND contype IN ('p', 'u')
+    """), {"old": old}).scalars().all():
+        conn.execute(text(f'ALTER TABLE {old} DROP CONSTRAINT "{constraint}"'))
+    for index in conn.execute(text("""
+        SELECT c.relname FROM pg_index x JOIN pg_class c ON c.oid = x.indexrelid WHERE x.indrelid = to_regclass(:old)
+    """), {"old": old}).scalars().all():
+        conn.execute(text(f'DROP INDEX "{index}"'))
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence(:old, 'id')"), {"old": old}).scalar()
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO {old}_id_seq"))
+
+    create(conn, layout)
+    tenants = conn.execute(text(f"SELECT DISTINCT tenant_id FROM {old}")).scalars().all()
+    # The partition cache describes the old table until this commits (migrate() clears it then)
+    ensure_tenant_partitions(conn, {DEFAULT_TENANT, *tenants}, table, layout, cached=False)
+    columns = ", ".join(conn.execute(text("""
+        SELECT n.attname FROM pg_attribute n JOIN pg_attribute o ON o.attname = n.attname
+        WHERE n.attrelid = to_regclass(:table) AND o.attrelid = to_regclass(:old)
+          AND n.attnum > 0 AND NOT n.attisdropped AND NOT o.attisdropped
+        ORDER BY n.attnum
+    """), {"table": table, "old": old}).scalars().all())
+    copied = conn.execute(text(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {old}")).rowcount
+    conn.execute(text(f"""
+        SELECT setval(pg_get_serial_sequence(:table, 'id'), COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, FALSE)
+    """), {"table": table})
+    build_indexes(conn)
+    conn.execute(text(f"DROP TABLE {old} CASCADE"))
+    return copied
+
+
+def migrate(engine) -> dict:
+    """
+    Partition `candidates` by CANDIDATE_PARTITIONS (and `candidate_sections`,
+    if it exists, by tenant); returns {table: rows copied}.
+    """
+    if CANDIDATE_PARTITIONS == "none":
+        raise ValueError("CANDIDATE_PARTITIONS=none: nothing to migrate to")
+    # Adds tenant columns to tables from before tenants
+    spaces = prepare_index(engine)
+    with engine.connect() as conn:
+        has_sections = table_layout(conn, SECTIONS_TABLE) is not None
+    if has_sections:
+        prepare_sections(engine)
+
+    def candidate_indexes(conn):
+        ensure_unique_rows(conn)
+        for spec, dim in set(spaces.values()):
+            conn.execute(text(model_index_sql(spec, dim)))
+
+    copied = {}
+    with engine.begin() as conn:
+        copied[CANDIDATES_TABLE] = migrate_table(conn, CANDIDATES_TABLE, create_candidates_table, candidate_indexes,
+                                                 CANDIDATE_PARTITIONS)
+        if has_sections:
+            copied[SECTIONS_TABLE] = migrate_table(conn, SECTIONS_TABLE, create_sections_table,
+                                                   lambda c: ensure_sections_table(c, read_spaces(c)), "tenant")
+    for table in copied:
+        forget_partitions(table)
+    return copied
+
+
+def main(argv=None):
+    from db import get_engine
+
+    parser = argparse.ArgumentParser(description="Tenant partitions of the candidate tables.")
+    parser.add_argument("--status", action="store_true", help="layout, partitions and rows per tenant")
+    parser.add_argument("--add-tenant", action="append", default=[], metavar="TENANT",
+                        help="create a tenant's partitions (repeatable)")
+    parser.add_argument("--migrate", action="store_true",
+                        help="partition tables created before tenants (or before tiers)")
+    args = parser.parse_args(argv)
+    if not (args.status or args.add_tenant or args.migrate):
+        parser.error("nothing to do (use --status, --add-tenant or --migrate)")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    # The migration holds the table lock for the whole copy and index build
+    engine = get_engine(statement_timeout_ms=0)
+    if args.migrate:
+        started = time.perf_counter()
+        for table, copied in migrate(engine).items():
+            if copied < 0:
+                print(f"✓ {table} is already partitioned")
+            else:
+                layout = CANDIDATE_PARTITIONS if table == CANDIDATES_TABLE else "tenant"
+                print(f"✓ Partitioned {table} by {layout} ({copied:,} rows copied)")
+        print(f"  in {time.perf_counter() - started:,.1f}s")
+    if args.add_tenant:
+        prepare_index(engine)
+        with engine.begin() as conn:
+            for table in (CANDIDATES_TABLE, SECTIONS_TABLE):
+                added = ensure_tenant_partitions(conn, args.add_tenant, table)
+                if table_layout(conn, table) in (None, "none"):
+                    print(f"⚠ {table} is not partitioned; nothing to add")
+                else:
+                    print(f"✓ {table}: {len(added)} tenant(s) added"
+                          + (f" ({', '.join(added)})" if added else " (all existed)"))
+    if args.status:
+        with engine.connect() as conn:
+            for table, (layout, counts, children) in status(conn).items():
+                if layout == "none":
+                    print(f"⚠ {table}: not partitioned (run with --migrate)")
+                elif table == CANDIDATES_TABLE and layout != CANDIDATE_PARTITIONS:
+                    print(f"⚠ {table}: partitioned by {layout}, not {CANDIDATE_PARTITIONS} (run with --migrate)")
+                else:
+                    print(f"✓ {table}: partitioned by {layout}, {len(children)} tenant partition(s)")
+                for (tenant, tier), n in counts.items():
+                    print(f"  {tenant:<24} {tier or '':<6} {n:>10,} rows")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
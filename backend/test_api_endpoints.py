@@ -2,15 +2,28 @@
 """
 Test script for FastAPI endpoints
 Tests the RAG model through the API endpoints
+
+Also includes a concurrent load generator:
+  python test_api_endpoints.py load --rates 10,20,40,80 --duration 30 --out run.json
 """
 
-import requests
+import argparse
+import itertools
 import json
+import math
+import os
+import random
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict
 
+import requests
+from requests.adapters import HTTPAdapter
+
 # Configuration
-API_BASE_URL = "http://localhost:8000"
+API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 
 def print_section(title):
     """Print a formatted section header"""
@@ -131,6 +144,260 @@ def list_all_candidates():
     print("Note: This requires direct MongoDB access or a GET /candidates endpoint")
     print("For now, use the test_rag_and_data.py script to list candidates")
 
+# --- Load testing ---
+LOAD_QUERIES = [
+    "data scientist with machine learning experience",
+    "frontend developer React TypeScript",
+    "backend developer Java Spring Boot",
+    "product manager SaaS",
+    "DevOps engineer AWS Docker",
+    "Python developer",
+    "full stack developer",
+    "UX designer",
+    "AI researcher deep learning",
+]
+
+DEFAULT_MIX = "query=0.8,get=0.15,post=0.05"
+PERCENTILES = (50, 90, 95, 99)
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """Parse 'query=0.8,get=0.15,post=0.05' into normalized weights."""
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("query", "get", "post"):
+            raise ValueError(f"Unknown request type in mix: {name!r}")
+        mix[name] = float(weight or 1)
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("Request mix weights must sum to a positive number")
+    return {name: weight / total for name, weight in mix.items()}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class LoadRecorder:
+    """Thread-safe collector of (request type, latency, ok) samples."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+
+    def record(self, kind: str, latency: float, error: str = None):
+        with self._lock:
+            if error is None:
+                self.samples.setdefault(kind, []).append(latency)
+            else:
+                bucket = self.errors.setdefault(kind, {})
+                bucket[error] = bucket.get(error, 0) + 1
+
+    def summary(self, elapsed: float) -> Dict:
+        kinds = sorted(set(self.samples) | set(self.errors))
+        report = {}
+        all_latencies = []
+        total_ok = total_err = 0
+        for kind in kinds:
+            lat = sorted(self.samples.get(kind, []))
+            n_err = sum(self.errors.get(kind, {}).values())
+            all_latencies.extend(lat)
+            total_ok += len(lat)
+            total_err += n_err
+            report[kind] = _latency_block(lat, n_err, elapsed)
+            report[kind]["errors"] = dict(self.errors.get(kind, {}))
+        report["total"] = _latency_block(sorted(all_latencies), total_err, elapsed)
+        return report
+
+
+def _latency_block(lat: List[float], n_err: int, elapsed: float) -> Dict:
+    count = len(lat) + n_err
+    block = {
+        "requests": count,
+        "ok": len(lat),
+        "error_rate": round(n_err / count, 4) if count else 0.0,
+        "throughput_rps": round(len(lat) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(1000 * sum(lat) / len(lat), 2) if lat else 0.0,
+        "max_ms": round(1000 * lat[-1], 2) if lat else 0.0,
+    }
+    for pct in PERCENTILES:
+        block[f"p{pct}_ms"] = round(1000 * percentile(lat, pct), 2)
+    return block
+
+
+class LoadGenerator:
+    """Drives a weighted mix of API calls at a fixed arrival rate (or closed loop)."""
+
+    def __init__(self, base_url: str, concurrency: int, mix: Dict[str, float],
+                 top_k: int = 5, seed: int = 1234, timeout: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self.mix = mix
+        self.top_k = top_k
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.candidate_ids: List[str] = []
+        self._post_counter = itertools.count()
+        self._post_seed = seed
+        # New identities every run: re-posting a previous run's candidates would only hit the dedup check
+        self._post_offset = 10_000_000 + time.time_ns() // 1_000_000 * 1000
+        self._local = threading.local()
+        self._ids_lock = threading.Lock()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._local.session = session
+        return session
+
+    def discover_ids(self, limit: int = 200):
+        """Collect candidate ids for GET traffic by running each sample query once."""
+        for q in LOAD_QUERIES:
+            try:
+                r = self._session().get(f"{self.base_url}/chatbot/query",
+                                        params={"query": q, "top_k": 20}, timeout=self.timeout)
+                if r.ok:
+                    self.candidate_ids.extend(c["id"] for c in r.json().get("results", []))
+            except requests.RequestException:
+                pass
+            if len(self.candidate_ids) >= limit:
+                break
+        self.candidate_ids = sorted(set(self.candidate_ids))
+
+    def _request(self, kind: str, recorder: LoadRecorder, scheduled_at: float, pick: float):
+        session = self._session()
+        try:
+            if kind == "query":
+                q = LOAD_QUERIES[int(pick * len(LOAD_QUERIES))]
+                r = session.get(f"{self.base_url}/chatbot/query",
+                                params={"query": q, "top_k": self.top_k}, timeout=self.timeout)
+            elif kind == "get":
+                with self._ids_lock:
+                    ids = self.candidate_ids
+                    cid = ids[int(pick * len(ids))] if ids else "000000000000000000000000"
+                r = session.get(f"{self.base_url}/candidates/{cid}", timeout=self.timeout)
+            else:
+                from synthetic_candidates import generate_candidate
+                doc = generate_candidate(self._post_seed, self._post_offset + next(self._post_counter))
+                r = session.post(f"{self.base_url}/candidates", json={"candidate": doc}, timeout=self.timeout)
+                if r.ok and r.json().get("id"):
+                    with self._ids_lock:
+                        self.candidate_ids.append(r.json()["id"])
+            # Latency is measured from the scheduled send time so queueing behind a
+            # saturated pool counts against the server (no coordinated omission).
+            latency = time.perf_counter() - scheduled_at
+            recorder.record(kind, latency, None if r.ok else f"HTTP {r.status_code}")
+        except requests.RequestException as e:
+            recorder.record(kind, time.perf_counter() - scheduled_at, type(e).__name__)
+
+    def run_stage(self, duration: float, rate: float) -> Dict:
+        """Run one stage. rate > 0 is open loop (Poisson arrivals); rate == 0 is closed loop."""
+        recorder = LoadRecorder()
+        kinds, weights = zip(*self.mix.items())
+        started = time.perf_counter()
+        deadline = started + duration
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            if rate > 0:
+                next_at = started
+                while next_at < deadline:
+                    delay = next_at - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    kind = self.rng.choices(kinds, weights=weights, k=1)[0]
+                    pool.submit(self._request, kind, recorder, next_at, self.rng.random())
+                    next_at += self.rng.expovariate(rate)
+            else:
+                def worker(worker_seed):
+                    rng = random.Random(worker_seed)
+                    while time.perf_counter() < deadline:
+                        kind = rng.choices(kinds, weights=weights, k=1)[0]
+                        self._request(kind, recorder, time.perf_counter(), rng.random())
+                for w in range(self.concurrency):
+                    pool.submit(worker, self.rng.random())
+
+        elapsed = time.perf_counter() - started
+        return {"target_rps": rate, "duration_s": round(elapsed, 2), "results": recorder.summary(elapsed)}
+
+
+def print_stage(stage: Dict, baseline: Dict = None):
+    target = stage["target_rps"] or "closed loop"
+    print(f"\nTarget rate: {target} | elapsed {stage['duration_s']}s")
+    header = f"  {'type':<7} {'reqs':>7} {'rps':>8} {'err%':>6} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'max':>8}"
+    print(header)
+    print("  " + "-" * (len(header) - 2))
+    for kind, b in stage["results"].items():
+        print(f"  {kind:<7} {b['requests']:>7} {b['throughput_rps']:>8} {100 * b['error_rate']:>6.2f} "
+              f"{b['p50_ms']:>8} {b['p90_ms']:>8} {b['p95_ms']:>8} {b['p99_ms']:>8} {b['max_ms']:>8}")
+        if baseline and kind in baseline.get("results", {}):
+            base = baseline["results"][kind]
+            deltas = " ".join(
+                f"{key[:-3]} {100 * (b[key] - base[key]) / base[key]:+.1f}%"
+                for key in ("p50_ms", "p95_ms", "p99_ms") if base.get(key))
+            if base.get("throughput_rps"):
+                deltas += f" rps {100 * (b['throughput_rps'] - base['throughput_rps']) / base['throughput_rps']:+.1f}%"
+            print(f"  {'':<7} vs baseline: {deltas}")
+
+
+def run_load_test(argv: List[str]):
+    parser = argparse.ArgumentParser(prog="test_api_endpoints.py load",
+                                     description="Concurrent load test for the RecruitBot API")
+    parser.add_argument("--base-url", default=API_BASE_URL)
+    parser.add_argument("--concurrency", type=int, default=16, help="max in-flight requests")
+    parser.add_argument("--rates", default="0",
+                        help="comma-separated arrival rates (req/s) to step through; 0 = closed loop")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per stage")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"request mix (default: {DEFAULT_MIX})")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", help="write the JSON report to this path")
+    parser.add_argument("--compare", help="previous JSON report to diff against")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    rates = [float(r) for r in args.rates.split(",")]
+    gen = LoadGenerator(args.base_url, args.concurrency, mix, top_k=args.top_k, seed=args.seed)
+
+    print_section("LOAD TEST")
+    print(f"Target: {args.base_url} | concurrency {args.concurrency} | mix {args.mix}")
+    if "get" in mix:
+        gen.discover_ids()
+        print(f"Discovered {len(gen.candidate_ids)} candidate ids for GET traffic")
+
+    baseline_stages = {}
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline_stages = {s["target_rps"]: s for s in json.load(fh)["stages"]}
+
+    stages = []
+    for rate in rates:
+        stage = gen.run_stage(args.duration, rate)
+        stages.append(stage)
+        print_stage(stage, baseline_stages.get(rate))
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "stages": stages,
+    }
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"\nReport written to {args.out}")
+    return report
+
+
 def main():
     """Main test function"""
     print("\n" + "="*70)
@@ -152,7 +419,9 @@ def main():
     print("  python test_api_endpoints.py <candidate_id>")
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 1 and sys.argv[1] == "load":
+        run_load_test(sys.argv[2:])
+    elif len(sys.argv) > 1:
         # Test specific candidate
         candidate_id = sys.argv[1]
         print_section(f"TESTING CANDIDATE: {candidate_id}")
@@ -9,28 +9,24 @@ Comprehensive test script for:
 import os
 import sys
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from db import get_candidates_collection, get_engine
 from embedding_utils import flatten_candidate, get_embedding, get_model
+from embedding_index import default_space, prepare_index, read_spaces, search, store_embeddings
+from candidate_dedup import find_exact_duplicates, with_dedup_keys
 from dummy_candidate import dummy_candidates
+from check_embeddings import parse_vector
 
 # Load environment variables
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
 
-# Database connections
-MONGO_URI = os.getenv("MONGO_URI")
-MONGO_DB = os.getenv("MONGO_DB")
-MONGO_CANDIDATES_COLLECTION = os.getenv("MONGO_CANDIDATES_COLLECTION", "resumes")
-POSTGRES_URI = os.getenv("POSTGRES_URI")
-
-if not MONGO_URI or not POSTGRES_URI:
+# Database connections (pooled, see db.py)
+if not os.getenv("MONGO_URI") or not os.getenv("POSTGRES_URI"):
     print("ERROR: MONGO_URI and POSTGRES_URI must be set in .env file")
     sys.exit(1)
 
-mongo_client = MongoClient(MONGO_URI)
-mongo_db = mongo_client[MONGO_DB]
-candidates_col = mongo_db[MONGO_CANDIDATES_COLLECTION]
-pg_engine = create_engine(POSTGRES_URI)
+candidates_col = get_candidates_collection()
+pg_engine = get_engine()
 
 def print_section(title):
     """Print a formatted section header"""
@@ -44,34 +40,27 @@ def load_dummy_candidates():
     
     loaded_count = 0
     skipped_count = 0
+    models = sorted({spec for spec, _ in prepare_index(pg_engine).values()})
+    # One lookup for the whole batch (email, phone, profile URLs)
+    duplicates = find_exact_duplicates(candidates_col, dummy_candidates)
     
-    for i, candidate in enumerate(dummy_candidates, 1):
+    for i, (candidate, duplicate) in enumerate(zip(dummy_candidates, duplicates), 1):
         name = candidate.get("personal_info", {}).get("full_name", "Unknown")
         
-        # Check if candidate already exists (by email)
-        email = candidate.get("personal_info", {}).get("email", "")
-        existing = candidates_col.find_one({"personal_info.email": email})
-        
-        if existing:
-            print(f"[{i}/{len(dummy_candidates)}] SKIPPED: {name} (already exists)")
+        if duplicate:
+            print(f"[{i}/{len(dummy_candidates)}] SKIPPED: {name} (already exists, same {duplicate[0].split(':')[0]})")
             skipped_count += 1
             continue
         
         try:
             # Insert into MongoDB
-            result = candidates_col.insert_one(candidate)
+            result = candidates_col.insert_one(with_dedup_keys(candidate))
             mongo_id = str(result.inserted_id)
             
-            # Flatten and create embedding
+            # Flatten, embed with every active model and insert into PostgreSQL
             flat = flatten_candidate(candidate)
-            emb = get_embedding(flat)
-            
-            # Insert into PostgreSQL
             with pg_engine.begin() as conn:
-                conn.execute(text("""
-                    INSERT INTO candidates (candidate_id, content, embedding)
-                    VALUES (:cid, :content, :embedding)
-                """), {"cid": mongo_id, "content": flat, "embedding": emb})
+                store_embeddings(conn, [(mongo_id, flat)], models)
             
             print(f"[{i}/{len(dummy_candidates)}] ✓ Loaded: {name} (ID: {mongo_id[:8]}...)")
             loaded_count += 1
@@ -140,11 +129,7 @@ def verify_postgres_data():
                 emb = row[2]
                 # Get dimension from embedding in Python (works with all pgvector versions)
                 if emb is not None:
-                    # pgvector returns embeddings as array-like objects
-                    try:
-                        emb_dim = len(emb) if hasattr(emb, '__len__') else 768  # Default to 768 if can't determine
-                    except:
-                        emb_dim = 768  # Default for all-mpnet-base-v2
+                    emb_dim = len(parse_vector(emb))
                 else:
                     emb_dim = "NULL"
                 print(f"  {i}. ID: {cid[:8]}... | Content: {content_len} chars | Embedding: {emb_dim}D")
@@ -161,22 +146,14 @@ def test_rag_query(query_text, top_k=5):
     print("-" * 70)
     
     try:
-        # Get query embedding
-        query_emb = get_embedding(query_text)
+        # Get query embedding with the default space's model
+        with pg_engine.connect() as conn:
+            model_name, dim = read_spaces(conn)[default_space()]
+        query_emb = get_embedding(query_text, model_name)
         
-        # Perform vector search
+        # Perform vector search over that model's vectors only
         with pg_engine.connect() as conn:
-            # Convert embedding to string format for pgvector
-            emb_list = query_emb.tolist() if hasattr(query_emb, 'tolist') else list(query_emb)
-            emb_str = "[" + ",".join(map(str, emb_list)) + "]"
-            
-            result = conn.execute(text(f"""
-                SELECT candidate_id, content
-                FROM candidates
-                ORDER BY embedding <-> '{emb_str}'::vector
-                LIMIT {top_k}
-            """))
-            rows = result.fetchall()
+            rows = search(conn, model_name, dim, query_emb, top_k)
         
         if not rows:
             print("  No results found")
@@ -0,0 +1,22 @@
+"""
+Offline test setup: hash embeddings (EMBEDDING_BACKEND=hash) and the local
+store (STORAGE_BACKEND=local), so the suite needs no model weights, MongoDB
+or PostgreSQL. The environment is set before any backend module is imported;
+values set here win over backend/.env.
+"""
+
+import os
+import sys
+
+os.environ.update({
+    "EMBEDDING_BACKEND": "hash",
+    "EMBEDDING_DIM": "64",
+    "EMBEDDING_SPACES": "",
+    "FLATTEN_MAX_TOKENS": "",
+    "STORAGE_BACKEND": "local",
+    "POSTGRES_URI": "",
+    "DEDUP_POLICY": "skip",
+    "DEFAULT_TENANT": "default",
+})
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
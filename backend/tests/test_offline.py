@@ -0,0 +1,270 @@
+"""
+Pipeline behaviour that runs without model weights or remote services: hash
+embeddings, flattening, the embedding outbox's claims and leases, dedup keys
+and the local store's search.
+
+  pip install pytest mongomock
+  python -m pytest backend/tests -q
+
+The outbox and dedup-merge tests run against mongomock and are skipped
+without it.
+"""
+
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+import embedding_utils
+from candidate_dedup import dedup_keys, find_exact_duplicates, merge_into, with_dedup_keys
+from embedding_utils import (
+    HashEmbeddingModel,
+    encode,
+    estimate_tokens,
+    flatten_candidate,
+    flatten_for_models,
+    token_budget,
+)
+from storage import LocalRepository
+from synthetic_candidates import generate_candidate
+
+
+def _person(email="", phone="", tenant=None, **links):
+    doc = {"personal_info": {"email": email, "phone": phone, **links}}
+    if tenant:
+        doc["tenant_id"] = tenant
+    return doc
+
+
+# --- Hash embeddings ---
+def test_hash_vectors_are_deterministic_and_normalized():
+    texts = ["Senior Python engineer", "React frontend developer"]
+    first = encode(texts, model_name="hash:64")
+    again = HashEmbeddingModel(64).encode(texts, normalize_embeddings=True)
+    assert first.shape == (2, 64)
+    assert np.array_equal(first, again)
+    assert np.allclose(np.linalg.norm(first, axis=1), 1.0)
+
+
+def test_hash_vectors_score_shared_words_as_similar():
+    query, close, far = encode(["python backend engineer", "python backend developer", "pastry chef"],
+                               model_name="hash:64")
+    assert query @ close > query @ far
+
+
+def test_hash_backend_refuses_real_model_names():
+    with pytest.raises(ValueError, match="hash:<dim>"):
+        embedding_utils._load_model("all-mpnet-base-v2")
+
+
+# --- Flattening ---
+def test_flatten_writes_sections_in_priority_order():
+    candidate = {
+        "additional_info": {"interests": ["chess"]},
+        "education": [{"degree": "BSc", "major": "CS", "university": "MIT"}],
+        "experience": [{"job_title": "Engineer", "company": "Acme", "responsibilities": ["APIs"]}],
+        "skills": {"technical": ["Python", "SQL"], "soft": ["Mentoring"]},
+        "personal_info": {"full_name": "Ann Lee", "email": "ann@x.com", "summary": "Backend engineer"},
+    }
+    assert flatten_candidate(candidate, None).splitlines() == [
+        "Name: Ann Lee",
+        "Summary: Backend engineer",
+        "Technical Skills: Python, SQL",
+        "Experience: Engineer at Acme. APIs",
+        "Education: BSc in CS at MIT",
+        "Soft Skills: Mentoring",
+        "Interests: chess",
+    ]
+
+
+def test_flatten_stops_at_the_token_budget():
+    candidate = generate_candidate(1, 3)
+    full = flatten_candidate(candidate, None)
+    cut = flatten_candidate(candidate, 40)
+    assert full.startswith(cut.rsplit("\n", 1)[0])
+    assert estimate_tokens(cut) <= 40 < estimate_tokens(full)
+
+
+def test_flatten_for_models_cuts_each_model_to_its_budget(monkeypatch):
+    monkeypatch.setattr(embedding_utils, "token_budget", {"short": 40, "same": 40, "long": None}.get)
+    contents = flatten_for_models(generate_candidate(1, 3), ["short", "same", "long"])
+    assert contents["short"] is contents["same"]
+    assert contents["long"] == flatten_candidate(generate_candidate(1, 3), None)
+    assert len(contents["short"]) < len(contents["long"])
+
+
+def test_hash_models_have_no_token_budget():
+    assert token_budget("hash:64") is None
+
+
+# --- Dedup keys ---
+def test_dedup_keys_normalize_identity_fields():
+    keys = dedup_keys(_person(email=" Ann@X.com ", phone="+1 (555) 123-4567",
+                              linkedin="https://www.LinkedIn.com/in/ann/?trk=x", github="", portfolio="n/a"))
+    assert keys == ["email:ann@x.com", "phone:15551234567", "url:linkedin.com/in/ann", "url:n/a"]
+
+
+def test_dedup_keys_skip_short_phones_and_prefix_tenants():
+    assert dedup_keys(_person(email="no-at-sign", phone="12-34")) == []
+    assert dedup_keys(_person(email="ann@x.com", tenant="acme")) == ["acme|email:ann@x.com"]
+
+
+def test_documents_without_keys_stay_out_of_the_index():
+    assert "dedup_keys" not in with_dedup_keys({**_person(), "dedup_keys": ["stale"]})
+
+
+# --- MongoDB (mongomock) ---
+@pytest.fixture
+def mongo_db():
+    mongomock = pytest.importorskip("mongomock")
+    return mongomock.MongoClient().db
+
+
+def test_exact_duplicates_within_a_batch_and_against_stored(mongo_db):
+    col = mongo_db.resumes
+    stored = col.insert_one(with_dedup_keys(_person(email="ann@x.com"))).inserted_id
+    batch = [_person(email="ANN@x.com"), _person(phone="555 000 1111"), _person(phone="5550001111"), _person()]
+    assert find_exact_duplicates(col, batch) == [
+        ("email:ann@x.com", str(stored)), None, ("phone:5550001111", None), None]
+
+
+def test_merge_leaves_keys_owned_by_another_candidate(mongo_db):
+    from candidate_dedup import ensure_dedup_index
+
+    col = mongo_db.resumes
+    ensure_dedup_index(col)
+    ann = col.insert_one(with_dedup_keys(_person(email="ann@x.com"))).inserted_id
+    col.insert_one(with_dedup_keys(_person(email="bob@x.com", phone="5551234567")))
+    merge_into(col, str(ann), {**with_dedup_keys(_person(email="ann@x.com", phone="5551234567",
+                                                         github="github.com/ann")), "name": "Ann"})
+    merged = col.find_one({"_id": ann})
+    assert merged["name"] == "Ann"
+    assert merged["dedup_keys"] == ["email:ann@x.com", "url:github.com/ann"]
+
+
+@pytest.fixture
+def outbox(mongo_db, monkeypatch):
+    import embedding_worker
+
+    monkeypatch.setattr(embedding_worker, "_transactions_supported", False)  # standalone mongod
+    return mongo_db.embedding_outbox, mongo_db.resumes
+
+
+def _worker(outbox, **kwargs):
+    from embedding_worker import EmbeddingWorker
+
+    outbox_col, candidates_col = outbox
+    return EmbeddingWorker(outbox_col, candidates_col, None, None, **kwargs)
+
+
+def test_enqueue_writes_document_and_pending_record(outbox):
+    from embedding_worker import PENDING, enqueue_candidate, indexing_status
+
+    outbox_col, candidates_col = outbox
+    cid = enqueue_candidate(None, candidates_col, outbox_col, {**_person(email="ann@x.com"), "tenant_id": "acme"})
+    assert candidates_col.count_documents({}) == 1
+    assert indexing_status(outbox_col, cid, "acme")["status"] == PENDING
+    assert indexing_status(outbox_col, cid, "other") is None
+
+
+def test_concurrent_workers_never_claim_the_same_record(outbox):
+    from embedding_worker import enqueue_candidate
+
+    outbox_col, candidates_col = outbox
+    for i in range(5):
+        enqueue_candidate(None, candidates_col, outbox_col, _person(email=f"c{i}@x.com"))
+    first, second = _worker(outbox, batch_size=3), _worker(outbox, batch_size=3)
+    a, b = first.claim(), second.claim()
+    assert len(a) == 3 and len(b) == 2
+    assert not {r["_id"] for r in a} & {r["_id"] for r in b}
+    assert _worker(outbox).claim() == []  # all leased
+
+
+def test_expired_lease_is_claimed_again(outbox):
+    from embedding_worker import enqueue_candidate
+
+    outbox_col, candidates_col = outbox
+    enqueue_candidate(None, candidates_col, outbox_col, _person(email="ann@x.com"))
+    crashed = _worker(outbox).claim()[0]
+    outbox_col.update_one({"_id": crashed["_id"]}, {"$set": {"lease_expires": crashed["updated_at"] - timedelta(seconds=1)}})
+    reclaimed = _worker(outbox).claim()
+    assert [r["_id"] for r in reclaimed] == [crashed["_id"]]
+    assert reclaimed[0]["lease_id"] != crashed["lease_id"]
+
+
+def test_record_claimed_before_its_document_is_retried_not_dropped(outbox):
+    from bson import ObjectId
+    from embedding_worker import OUTBOX_ORPHAN_GRACE_SECONDS, PENDING, _now
+
+    outbox_col, _ = outbox
+    now = _now()
+    early, orphan = ObjectId(), ObjectId()
+    outbox_col.insert_many([
+        {"_id": early, "status": PENDING, "attempts": 0, "created_at": now, "next_attempt_at": now},
+        {"_id": orphan, "status": PENDING, "attempts": 0, "next_attempt_at": now,
+         "created_at": now - timedelta(seconds=OUTBOX_ORPHAN_GRACE_SECONDS + 60)},
+    ])
+    assert _worker(outbox).drain_once() == 2
+    record = outbox_col.find_one({"_id": early})
+    assert record["status"] == PENDING and record["attempts"] == 0 and "lease_id" not in record
+    assert outbox_col.find_one({"_id": orphan}) is None
+    assert _worker(outbox).claim() == []  # backs off before looking again
+
+
+# --- Local store ---
+@pytest.fixture
+def store(tmp_path):
+    store = LocalRepository(str(tmp_path))
+    yield store
+    store.close()
+
+
+def _load(store, tenant, start, count):
+    docs = [(f"{tenant}-{i}", {**generate_candidate(7, i), "tenant_id": tenant}) for i in range(start, start + count)]
+    store.add_many(docs)
+    return [cid for cid, _ in docs]
+
+
+def _query(store, text):
+    spec, dim = store.spaces.get()
+    return spec, dim, encode([text], model_name=spec)[0]
+
+
+def test_local_search_finds_a_candidate_by_its_own_text(store):
+    ids = _load(store, "default", 0, 8)
+    spec, dim = store.spaces.get()
+    target = store.get(ids[3])
+    query = encode([flatten_candidate(target)], model_name=spec)[0]
+    hits = store.search(spec, dim, query, 3)
+    assert hits[0][0] == ids[3] and hits[0][2] == pytest.approx(0.0, abs=1e-5)
+    assert [h[2] for h in hits] == sorted(h[2] for h in hits)
+
+
+def test_local_search_stays_within_the_tenant(store):
+    acme = _load(store, "acme", 0, 5)
+    other = _load(store, "other", 5, 5)
+    spec, dim, query = _query(store, "python engineer")
+    assert {h[0] for h in store.search(spec, dim, query, 20, tenant="acme")} == set(acme)
+    assert {h[0] for h in store.search(spec, dim, query, 20, tenant="other")} == set(other)
+    assert store.search(spec, dim, query, 20, tenant="nobody") == []
+    assert store.similar(spec, dim, acme[0], 20, tenant="other") is None
+    assert store.is_indexed(acme[0], "acme") and not store.is_indexed(acme[0], "other")
+
+
+def test_similar_leaves_the_candidate_out(store):
+    ids = _load(store, "default", 0, 6)
+    spec, dim = store.spaces.get()
+    similar = [h[0] for h in store.similar(spec, dim, ids[0], 10)]
+    assert ids[0] not in similar and set(similar) == set(ids[1:])
+
+
+def test_reupload_replaces_vectors_and_compact_keeps_results(store):
+    ids = _load(store, "default", 0, 6)
+    spec, dim, query = _query(store, "data scientist machine learning")
+    before = store.search(spec, dim, query, 6)
+    store.add_many([(ids[0], generate_candidate(7, 0))])
+    assert store.stats()["vectors"][spec]["dead"] == 1
+    assert [h[0] for h in store.search(spec, dim, query, 6)] == [h[0] for h in before]
+    assert store.compact() == {spec: 1}
+    assert store.stats()["vectors"][spec] == {"rows": 6, "dead": 0, "bytes": 6 * dim * 4}
+    assert store.search(spec, dim, query, 6) == before